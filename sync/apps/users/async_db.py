@@ -0,0 +1,76 @@
+import asyncio
+import weakref
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import AsyncMongoClient
+
+from .jwt_utils import decode_jwt_token
+from .models import UserProfile, Activity, Notification
+
+# AsyncMongoClient is bound to the event loop it was first used on
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_db():
+    """Return the async database handle for the running event loop.
+
+    Meant for ASGI deployments, where each worker runs a single long-lived
+    loop and therefore a single connection pool. A client is never closed,
+    so a loop per request (async views under WSGI) would leak a pool per
+    request; the async routes are only mounted under ASGI (ASYNC_ROUTES).
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+
+    if client is None:
+        client = AsyncMongoClient(host=settings.MONGO_DB_HOST)
+        _clients[loop] = client
+
+    if settings.MONGO_DB_NAME:
+        return client[settings.MONGO_DB_NAME]
+    return client.get_default_database()
+
+
+def users_collection():
+    return get_async_db()[UserProfile._get_collection_name()]
+
+
+def activities_collection():
+    return get_async_db()[Activity._get_collection_name()]
+
+
+def notifications_collection():
+    return get_async_db()[Notification._get_collection_name()]
+
+
+def token_user_id(request):
+    """Return the user id carried by the request's bearer token, without any query"""
+    auth_header = request.headers.get('Authorization', '')
+    parts = auth_header.split()
+
+    if len(parts) != 2 or parts[0].lower() != 'bearer':
+        return None
+
+    payload = decode_jwt_token(parts[1])
+    if not payload or not ObjectId.is_valid(payload.get('user_id', '')):
+        return None
+
+    return ObjectId(payload['user_id'])
+
+
+async def authenticate(request):
+    """Async counterpart of JWTAuthentication, returning the raw user document or None"""
+    user_id = token_user_id(request)
+    if user_id is None:
+        return None
+
+    return await users_collection().find_one({'_id': user_id})
+
+
+async def load_profiles(profile_ids, projection):
+    if not profile_ids:
+        return {}
+
+    cursor = users_collection().find({'_id': {'$in': list(profile_ids)}}, projection)
+    return {doc['_id']: doc async for doc in cursor}
@@ -0,0 +1,354 @@
+"""
+Async variants of the heaviest I/O-bound read endpoints.
+
+They run natively on the ASGI event loop with pymongo's AsyncMongoClient
+instead of bouncing blocking mongoengine calls to a thread, and issue
+independent queries concurrently. Responses have the same shape as the
+sync views (they share the fast_serializers plans). The long-lived endpoints
+(live activity stream, notification long-poll) live here too, since under
+WSGI each open connection would hold a worker thread.
+"""
+
+import asyncio
+import inspect
+import math
+import re
+
+from bson import ObjectId
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+
+from config.metrics import timed
+
+from .async_db import (
+    authenticate, token_user_id, activities_collection, users_collection, notifications_collection,
+    load_profiles
+)
+from .fast_serializers import (
+    ACTIVITY_PLAN, ACTIVITY_SUMMARY_PLAN, USER_PROFILE_BASIC_PLAN, LIVE_DATA_POINT_PLAN, NOTIFICATION_PLAN,
+    PROFILE_PROJECTION
+)
+from .friendships import to_object_id
+from .live import get_channel_layer, activity_group
+from .notifications import inbox_group, seq_cache_key, SEQ_CACHE_TTL, NOTIFICATIONS_PAGE_SIZE
+from .renderers import ORJSONRenderer
+from .search import search_cache, normalize_query, SEARCH_RESULT_LIMIT
+from .throttling import SearchUserThrottle, SearchIPThrottle
+
+FRIENDS_FEED_LIMIT = 50
+# above this many friends, prefetching every friend's profile costs more than it saves
+FRIEND_PROFILES_PREFETCH_MAX = 200
+# points sent on (re)connect before switching to pushed updates
+LIVE_CATCHUP_MAX = 10000
+
+
+def json_response(data, status=200):
+    return HttpResponse(ORJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def unauthorized(request):
+    """401 with the same body and challenge as JWTAuthentication in the sync views"""
+    parts = request.headers.get('Authorization', '').split()
+    if not parts:
+        detail = "Authentication credentials were not provided."
+    elif len(parts) != 2 or parts[0].lower() != 'bearer':
+        detail = "Authentication fail: Invalid authorization header"
+    else:
+        detail = "Authentication fail: Invalid or expired token"
+
+    response = json_response({"detail": detail}, status=401)
+    response['WWW-Authenticate'] = 'Bearer realm="api"'
+    return response
+
+
+class AsyncAPIView(View):
+    """Plain async Django view with the API's JWT authentication and error format.
+
+    With load_user = False only the token is checked and the handler gets
+    request.user_id instead of request.user_doc. throttle_classes are
+    apps.users.throttling throttles, checked after authentication.
+    """
+    load_user = True
+    throttle_classes = ()
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            return json_response(
+                {"detail": f'Method "{request.method}" not allowed.'}, status=405
+            )
+
+        if request.method.lower() == 'options':
+            # answered before authentication; View.options returns a coroutine only when view_is_async
+            response = self.options(request, *args, **kwargs)
+            return await response if inspect.isawaitable(response) else response
+
+        with timed('auth'):
+            if self.load_user:
+                request.user_doc = await authenticate(request)
+                authenticated = request.user_doc is not None
+            else:
+                request.user_id = token_user_id(request)
+                authenticated = request.user_id is not None
+
+        if not authenticated:
+            return unauthorized(request)
+
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not await throttle.aallow_request(request, self):
+                wait = math.ceil(throttle.wait())
+                response = json_response(
+                    {"detail": f"Request was throttled. Expected available in {wait} seconds."}, status=429
+                )
+                response['Retry-After'] = str(wait)
+                return response
+
+        return await handler(request, *args, **kwargs)
+
+
+async def render_activities(docs, profiles=None, plan=ACTIVITY_SUMMARY_PLAN):
+    profiles = dict(profiles or {})
+    missing = plan.referenced_ids(docs) - profiles.keys()
+    profiles.update(await load_profiles(missing, PROFILE_PROJECTION))
+    return plan.render_many(docs, profiles)
+
+
+class AsyncActivitiesListView(AsyncAPIView):
+    async def get(self, request):
+        cursor = activities_collection().find(
+            {'user_id': request.user_doc['_id']}, ACTIVITY_SUMMARY_PLAN.projection
+        ).sort('created_at', -1)
+        docs = await cursor.to_list(None)
+
+        return json_response(await render_activities(docs))
+
+
+class AsyncActivityDetailView(AsyncAPIView):
+    async def get(self, request, activity_id):
+        doc = None
+        if ObjectId.is_valid(activity_id):
+            doc = await activities_collection().find_one({'_id': ObjectId(activity_id)}, ACTIVITY_PLAN.projection)
+
+        if not doc:
+            return json_response({"error": "Activity not found"}, status=404)
+
+        return json_response((await render_activities([doc], plan=ACTIVITY_PLAN))[0])
+
+
+class AsyncFriendsActivitiesView(AsyncAPIView):
+    async def get(self, request):
+        friend_ids = [to_object_id(value) for value in request.user_doc.get('friends', [])]
+        feed_query = activities_collection().find(
+            {'user_id': {'$in': friend_ids}}, ACTIVITY_SUMMARY_PLAN.projection
+        ).sort('created_at', -1).limit(FRIENDS_FEED_LIMIT).to_list(None)
+
+        if len(friend_ids) > FRIEND_PROFILES_PREFETCH_MAX:
+            return json_response(await render_activities(await feed_query))
+
+        # the feed owners are all friends, so their profiles load alongside the feed itself
+        feed, friend_profiles = await asyncio.gather(
+            feed_query, load_profiles(friend_ids, PROFILE_PROJECTION)
+        )
+
+        return json_response(await render_activities(feed, friend_profiles))
+
+
+class AsyncSearchUsersView(AsyncAPIView):
+    throttle_classes = (SearchUserThrottle, SearchIPThrottle)
+
+    async def get(self, request):
+        query = request.GET.get('q', '').strip()
+
+        if not query:
+            return json_response({"error": "Search query required"}, status=400)
+
+        key = normalize_query(query)
+        cached_ids = await search_cache.aget(key)
+        users = users_collection()
+
+        # the ID lookup and the text search are independent, so run them together
+        lookups = []
+        if ObjectId.is_valid(query):
+            lookups.append(users.find_one({'_id': ObjectId(query)}, USER_PROFILE_BASIC_PLAN.projection))
+
+        if cached_ids is None:
+            pattern = {'$regex': re.escape(key), '$options': 'i'}
+            lookups.append(users.find(
+                {'$or': [{'username': pattern}, {'email': pattern}, {'full_name': pattern}]},
+                USER_PROFILE_BASIC_PLAN.projection
+            ).limit(SEARCH_RESULT_LIMIT).to_list(None))
+        else:
+            lookups.append(users.find(
+                {'_id': {'$in': cached_ids}}, USER_PROFILE_BASIC_PLAN.projection
+            ).to_list(None))
+
+        results = await asyncio.gather(*lookups)
+        if ObjectId.is_valid(query) and results[0]:
+            return json_response(USER_PROFILE_BASIC_PLAN.render_many([results[0]]))
+
+        docs = results[-1]
+        if cached_ids is None:
+            await search_cache.aset(key, [doc['_id'] for doc in docs])
+        else:
+            docs_by_id = {doc['_id']: doc for doc in docs}
+            docs = [docs_by_id[user_id] for user_id in cached_ids if user_id in docs_by_id]
+
+        return json_response(USER_PROFILE_BASIC_PLAN.render_many(docs))
+
+
+def sse_event(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + ORJSONRenderer().render(data).decode())
+    return "\n".join(lines) + "\n\n"
+
+
+def can_watch(user_doc, activity):
+    """Owners, participants and the owner's friends may follow an activity"""
+    user_id = user_doc['_id']
+    return (
+        activity['user_id'] == user_id
+        or user_id in activity.get('participants', [])
+        or activity['user_id'] in [to_object_id(value) for value in user_doc.get('friends', [])]
+    )
+
+
+class AsyncActivityLiveStreamView(AsyncAPIView):
+    """Server-sent events carrying only the live data points appended after ?since (or Last-Event-ID)"""
+
+    async def get(self, request, activity_id):
+        activity = None
+        if ObjectId.is_valid(activity_id):
+            activity = await activities_collection().find_one(
+                {'_id': ObjectId(activity_id)}, {'user_id': 1, 'participants': 1}
+            )
+
+        if not activity:
+            return json_response({"error": "Activity not found"}, status=404)
+
+        if not can_watch(request.user_doc, activity):
+            return json_response({"error": "Not authorized to watch this activity"}, status=403)
+
+        since = request.GET.get('since') or request.headers.get('Last-Event-ID') or '0'
+        if not since.isdigit():
+            return json_response({"error": "since must be a point index"}, status=400)
+
+        response = StreamingHttpResponse(
+            self.stream(activity['_id'], int(since)), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # ask nginx not to buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, activity_id, next_index):
+        layer = get_channel_layer()
+        group = activity_group(activity_id)
+        keepalive = getattr(settings, 'LIVE_KEEPALIVE_SECONDS', 15)
+
+        # subscribe before reading the catch-up, so nothing falls in between
+        subscription = layer.subscribe(group)
+        try:
+            snapshot = await activities_collection().find_one(
+                {'_id': activity_id},
+                {'status': 1, 'live_data': {'$slice': [next_index, LIVE_CATCHUP_MAX]}}
+            )
+            if snapshot is None:
+                return
+
+            event = {
+                'start': next_index,
+                'points': LIVE_DATA_POINT_PLAN.render_many(snapshot.get('live_data', []))
+            }
+            if snapshot.get('status') != 'in_progress':
+                event['status'] = snapshot.get('status')
+
+            while True:
+                if event is None:
+                    yield ": keepalive\n\n"
+                elif event.get('reset'):
+                    # the owner replaced the whole track; a start above 0 means its first points were dropped
+                    start, points = event.get('start', 0), event.get('points', [])
+                    next_index = start + len(points)
+                    yield sse_event('reset', {'start': start, 'points': points}, next_index)
+                else:
+                    # pushed points may overlap what the catch-up already sent
+                    skip = next_index - event.get('start', next_index)
+                    if event.get('points') and skip > 0:
+                        event['points'] = event['points'][skip:]
+                        event['start'] = next_index
+                    if event.get('points'):
+                        next_index = event['start'] + len(event['points'])
+                        yield sse_event('points', {'start': event['start'], 'points': event['points']}, next_index)
+
+                if event is not None and 'status' in event:
+                    yield sse_event('status', {'status': event['status']})
+                    if event['status'] != 'in_progress':
+                        return
+
+                event = await subscription.get(timeout=keepalive)
+        finally:
+            layer.unsubscribe(group, subscription)
+
+
+async def latest_seq(user_id):
+    seq = await cache.aget(seq_cache_key(user_id))
+    if seq is None:
+        user = await users_collection().find_one({'_id': user_id}, {'notification_seq': 1})
+        seq = (user or {}).get('notification_seq', 0)
+        # add, not set: a notify since our read has cached a newer seq
+        await cache.aadd(seq_cache_key(user_id), seq, SEQ_CACHE_TTL)
+    return seq
+
+
+class AsyncNotificationsPollView(AsyncAPIView):
+    """Long-poll returning the notifications after ?since as soon as there are any.
+
+    Waiting costs no query: the token is checked without loading the user and
+    the latest sequence number comes from the cache.
+    """
+    load_user = False
+
+    async def get(self, request):
+        since = request.GET.get('since', '0')
+        timeout = request.GET.get('timeout', '')
+
+        if not since.isdigit():
+            return json_response({"error": "since must be a sequence number"}, status=400)
+
+        max_timeout = getattr(settings, 'NOTIFICATIONS_LONG_POLL_TIMEOUT', 25)
+        timeout = min(int(timeout), max_timeout) if timeout.isdigit() else max_timeout
+        since = int(since)
+
+        layer = get_channel_layer()
+        group = inbox_group(request.user_id)
+
+        # subscribe before reading the sequence, so a notification in between still wakes us
+        subscription = layer.subscribe(group)
+        try:
+            seq = await latest_seq(request.user_id)
+            if seq <= since:
+                event = await subscription.get(timeout=timeout)
+                if event is not None:
+                    seq = event['seq']
+                else:
+                    # a notify in another process only wakes us through a shared broker (LIVE_REDIS_URL)
+                    seq = await latest_seq(request.user_id)
+                    if seq <= since:
+                        return json_response({"seq": seq, "notifications": []})
+        finally:
+            layer.unsubscribe(group, subscription)
+
+        docs = await notifications_collection().find(
+            {'user': request.user_id, 'seq': {'$gt': since}}, NOTIFICATION_PLAN.projection
+        ).sort('seq', 1).limit(NOTIFICATIONS_PAGE_SIZE).to_list(None)
+        if len(docs) == NOTIFICATIONS_PAGE_SIZE:
+            # a full page: the client continues from its last notification
+            seq = docs[-1]['seq']
+        profiles = await load_profiles(NOTIFICATION_PLAN.referenced_ids(docs), PROFILE_PROJECTION)
+
+        return json_response({"seq": seq, "notifications": NOTIFICATION_PLAN.render_many(docs, profiles)})
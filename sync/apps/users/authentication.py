@@ -1,5 +1,6 @@
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from config.metrics import timed
 from .jwt_utils import get_user_from_token
 
 class JWTAuthentication(BaseAuthentication):
@@ -17,7 +18,8 @@ class JWTAuthentication(BaseAuthentication):
                 raise AuthenticationFailed('Invalid authorization header')
             
             token = parts[1]
-            user = get_user_from_token(token)
+            with timed('auth'):
+                user = get_user_from_token(token)
             
             if not user:
                 raise AuthenticationFailed('Invalid or expired token')
@@ -0,0 +1,91 @@
+import hashlib
+
+from django.core.cache import caches
+
+
+class SharedCache:
+    """A namespace in a Django cache (settings.CACHES), so entries are shared by every worker and node.
+
+    Keys can be any value with a stable str(); they are hashed, so they may hold
+    spaces or be arbitrarily long. clear() bumps the namespace's generation
+    instead of enumerating entries: every entry is stored with the generation
+    it was written in, and reads fetch the current generation in the same
+    get_many as the entries, so a hit costs a single round trip.
+    """
+
+    def __init__(self, namespace, ttl=30, alias='default'):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @property
+    def generation_key(self):
+        return f"{self.namespace}:generation"
+
+    def generation(self):
+        generation = self.backend.get(self.generation_key)
+        if generation is None:
+            self.backend.add(self.generation_key, 1, None)
+            generation = self.backend.get(self.generation_key, 1)
+        return generation
+
+    def make_key(self, key):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=16).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def current_entries(self, names, found):
+        """{key: value} of the entries in found written in the generation found alongside them"""
+        # a missing generation is the one generation() would create
+        generation = found.pop(self.generation_key, 1)
+        return {
+            names[name]: value for name, (entry_generation, value) in found.items()
+            if entry_generation == generation
+        }
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys found, in one round trip"""
+        names = {self.make_key(key): key for key in keys}
+        return self.current_entries(names, self.backend.get_many([self.generation_key, *names]))
+
+    def set(self, key, value):
+        self.backend.set(self.make_key(key), (self.generation(), value), self.ttl)
+
+    def set_many(self, data):
+        generation = self.generation()
+        self.backend.set_many({self.make_key(key): (generation, value) for key, value in data.items()}, self.ttl)
+
+    def delete(self, key):
+        self.backend.delete(self.make_key(key))
+
+    def delete_many(self, keys):
+        self.backend.delete_many([self.make_key(key) for key in keys])
+
+    def clear(self):
+        """Invalidate every entry of the namespace; old entries expire on their own"""
+        try:
+            self.backend.incr(self.generation_key)
+        except ValueError:
+            self.backend.add(self.generation_key, 2, None)
+
+    async def aget(self, key, default=None):
+        name = self.make_key(key)
+        found = await self.backend.aget_many([self.generation_key, name])
+        return self.current_entries({name: key}, found).get(key, default)
+
+    async def aset(self, key, value):
+        generation = await self.ageneration()
+        await self.backend.aset(self.make_key(key), (generation, value), self.ttl)
+
+    async def ageneration(self):
+        generation = await self.backend.aget(self.generation_key)
+        if generation is None:
+            await self.backend.aadd(self.generation_key, 1, None)
+            generation = await self.backend.aget(self.generation_key, 1)
+        return generation
@@ -0,0 +1,55 @@
+import hashlib
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import UserProfile
+
+
+def make_etag(*parts):
+    """Build a strong ETag from cheap validator parts (ids, versions, timestamps)"""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+
+    if header.strip() == '*':
+        return True
+
+    # weak comparison, as RFC 9110 requires for If-None-Match
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+def conditional_response(request, etag, build_response):
+    """Answer 304 when the client already has etag, otherwise call build_response().
+
+    build_response is only called on a miss, so the serializer and any
+    dereferencing it does are skipped entirely for unchanged resources.
+    """
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = build_response()
+
+    # an error (e.g. 404 for a missing resource) is not the representation etag validates
+    if response.status_code == status.HTTP_304_NOT_MODIFIED or 200 <= response.status_code < 300:
+        response['ETag'] = etag
+    # clients may store it but must revalidate before reuse
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def profile_versions(user_ids):
+    """Return [(user_id, version), ...] in the given order with a single projection query"""
+    if not user_ids:
+        return []
+
+    versions = {
+        doc['_id']: doc.get('version', 0)
+        for doc in UserProfile._get_collection().find({'_id': {'$in': list(user_ids)}}, {'version': 1})
+    }
+    return [(user_id, versions.get(user_id)) for user_id in user_ids]
@@ -0,0 +1,202 @@
+"""
+Opt-in fast path for the hot read endpoints.
+
+Instead of loading mongoengine documents and running DRF serializers field by
+field, documents are read with as_pymongo() and converted by a plan compiled
+once per serializer: a flat list of (output name, transform) pairs that calls
+each DRF field's own to_representation. Referenced profiles are resolved for a
+whole page with a single query. The output is identical to the regular
+serializers (see FastSerializerParityTest).
+"""
+
+from rest_framework import serializers
+
+from .friendships import to_object_id
+from .models import UserProfile, Activity, LiveDataPoint, Notification
+from .serializers import (
+    UserProfileBasicSerializer, UserProfileSerializer, ActivitySerializer, ActivitySummarySerializer,
+    LiveDataPointSerializer, NotificationSerializer
+)
+
+PROFILE_PROJECTION = {'username': 1, 'full_name': 1, 'profile_picture': 1}
+
+MISSING = object()
+
+
+def _field_transform(mongo_key, field, default):
+    to_representation = field.to_representation
+
+    def transform(doc, profiles):
+        value = doc.get(mongo_key, MISSING)
+        if value is MISSING:
+            value = default() if callable(default) else default
+        return None if value is None else to_representation(value)
+
+    return transform
+
+
+def _nested_transform(mongo_key, plan):
+    def transform(doc, profiles):
+        return [plan.render(item, profiles) for item in doc.get(mongo_key) or []]
+
+    return transform
+
+
+class SerializationPlan:
+    """Precompiled conversion of raw documents into a serializer's output shape.
+
+    method_fields maps each SerializerMethodField name to a (refs, render)
+    pair: refs(doc) yields the profile ids the field needs and
+    render(doc, profiles) builds its value.
+    """
+
+    def __init__(self, serializer_class, document_class, method_fields=None):
+        method_fields = method_fields or {}
+        self.transforms = []
+        self.ref_getters = []
+        self.only_fields = []
+        self.projection = {}
+
+        for name, field in serializer_class().fields.items():
+            if name in method_fields:
+                refs, render = method_fields[name]
+                self.transforms.append((name, render))
+                if refs:
+                    self.ref_getters.append(refs)
+                continue
+
+            if isinstance(field, serializers.SerializerMethodField):
+                raise ValueError(f"{serializer_class.__name__}.{name} needs a method field transform")
+
+            document_field = document_class._fields[field.source]
+            self.only_fields.append(field.source)
+            self.projection[document_field.db_field] = 1
+
+            if isinstance(field, serializers.ListSerializer):
+                child_plan = SerializationPlan(type(field.child), document_field.field.document_type)
+                self.transforms.append((name, _nested_transform(document_field.db_field, child_plan)))
+            else:
+                self.transforms.append(
+                    (name, _field_transform(document_field.db_field, field, document_field.default))
+                )
+
+        for refs, _ in method_fields.values():
+            if refs:
+                self.only_fields.extend(refs.only_fields)
+                self.projection.update({key: 1 for key in refs.only_fields})
+
+    def referenced_ids(self, docs):
+        ids = set()
+        for doc in docs:
+            for refs in self.ref_getters:
+                ids.update(refs(doc))
+        return ids
+
+    def render(self, doc, profiles=None):
+        return {name: transform(doc, profiles) for name, transform in self.transforms}
+
+    def render_many(self, docs, profiles=None):
+        return [self.render(doc, profiles) for doc in docs]
+
+
+def _object_id(doc, profiles):
+    return str(doc['_id'])
+
+
+def _refs(mongo_key, many=False):
+    if many:
+        def refs(doc):
+            return [to_object_id(value) for value in doc.get(mongo_key) or []]
+    else:
+        def refs(doc):
+            return [to_object_id(doc[mongo_key])] if doc.get(mongo_key) else []
+
+    refs.only_fields = [mongo_key]
+    return refs
+
+
+def _profile_summary(profile_id, profile, with_picture=True):
+    summary = {
+        '_id': str(profile_id),
+        'username': profile.get('username'),
+        'full_name': profile.get('full_name'),
+    }
+    if with_picture:
+        summary['profile_picture'] = profile.get('profile_picture')
+    return summary
+
+
+def _profile_list(mongo_key):
+    def render(doc, profiles):
+        summaries = []
+        for value in doc.get(mongo_key) or []:
+            profile_id = to_object_id(value)
+            if profile_id in profiles:
+                summaries.append(_profile_summary(profile_id, profiles[profile_id]))
+        return summaries
+
+    return render
+
+
+def _activity_owner(doc, profiles):
+    if not doc.get('user_id'):
+        return None
+    owner_id = to_object_id(doc['user_id'])
+    if owner_id not in profiles:
+        return None
+    return _profile_summary(owner_id, profiles[owner_id], with_picture=False)
+
+
+def _notification_actor(doc, profiles):
+    actor_id = to_object_id(doc['actor'])
+    return _profile_summary(actor_id, profiles[actor_id]) if actor_id in profiles else None
+
+
+USER_PROFILE_BASIC_PLAN = SerializationPlan(UserProfileBasicSerializer, UserProfile, {
+    '_id': (None, _object_id),
+})
+
+USER_PROFILE_PLAN = SerializationPlan(UserProfileSerializer, UserProfile, {
+    '_id': (None, _object_id),
+    'friends': (_refs('friends', many=True), _profile_list('friends')),
+})
+
+ACTIVITY_PLAN = SerializationPlan(ActivitySerializer, Activity, {
+    '_id': (None, _object_id),
+    'user_id': (_refs('user_id'), _activity_owner),
+    'participants': (_refs('participants', many=True), _profile_list('participants')),
+})
+
+ACTIVITY_SUMMARY_PLAN = SerializationPlan(ActivitySummarySerializer, Activity, {
+    '_id': (None, _object_id),
+    'user_id': (_refs('user_id'), _activity_owner),
+    'participants': (_refs('participants', many=True), _profile_list('participants')),
+})
+
+LIVE_DATA_POINT_PLAN = SerializationPlan(LiveDataPointSerializer, LiveDataPoint)
+
+NOTIFICATION_PLAN = SerializationPlan(NotificationSerializer, Notification, {
+    '_id': (None, _object_id),
+    'actor': (_refs('actor'), _notification_actor),
+})
+
+
+def load_profiles(profile_ids):
+    """Fetch the summary fields of every referenced profile in a single query"""
+    if not profile_ids:
+        return {}
+
+    return {
+        doc['_id']: doc
+        for doc in UserProfile._get_collection().find({'_id': {'$in': list(profile_ids)}}, PROFILE_PROJECTION)
+    }
+
+
+def render_documents(plan, docs):
+    """Serialize raw documents (e.g. from as_pymongo() or to_mongo())"""
+    return plan.render_many(docs, load_profiles(plan.referenced_ids(docs)))
+
+
+def render_queryset(plan, queryset):
+    """Serialize a queryset, reading only the fields plan needs as raw documents"""
+    return render_documents(plan, list(queryset.only(*plan.only_fields).as_pymongo()))
@@ -0,0 +1,174 @@
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+from bson import DBRef, ObjectId
+from django.conf import settings
+from mongoengine import Q
+from pymongo import MongoClient, ReturnDocument
+
+from .cache import SharedCache
+from .models import UserProfile, FriendRequest
+
+# client -> whether its deployment runs transactions, once a server has answered
+_transactional = weakref.WeakKeyDictionary()
+
+EMPTY_FRIEND_IDS = np.array([], dtype='S12')
+
+# user id -> bytes of the sorted array of 12-byte friend ids
+friend_ids_cache = SharedCache('friend_ids', ttl=getattr(settings, 'FRIEND_IDS_CACHE_TTL', 300))
+
+
+def to_object_id(value):
+    """Normalize a stored friends entry (ObjectId, DBRef or document) to its ObjectId"""
+    if isinstance(value, DBRef):
+        return value.id
+    return getattr(value, 'id', value)
+
+
+def friend_ids(user):
+    """Return the ObjectIds in user.friends without dereferencing them"""
+    return [to_object_id(value) for value in user.to_mongo().get('friends', [])]
+
+
+def are_friends(user, other_id):
+    return to_object_id(other_id) in friend_ids(user)
+
+
+def pack_friend_ids(ids):
+    """Pack ObjectIds into a sorted fixed-width byte array for fast intersection"""
+    return np.sort(np.array([to_object_id(value).binary for value in ids], dtype='S12'))
+
+
+def sorted_friend_ids(user_ids):
+    """Return {user_id: packed friend ids}, loading every cache miss in a single query"""
+    packed = {
+        user_id: np.frombuffer(cached, dtype='S12')
+        for user_id, cached in friend_ids_cache.get_many(user_ids).items()
+    }
+    missing = [user_id for user_id in user_ids if user_id not in packed]
+
+    if missing:
+        loaded = {}
+        for doc in UserProfile._get_collection().find({'_id': {'$in': missing}}, {'friends': 1}):
+            packed[doc['_id']] = pack_friend_ids(doc.get('friends', []))
+            loaded[doc['_id']] = packed[doc['_id']].tobytes()
+        friend_ids_cache.set_many(loaded)
+
+    return packed
+
+
+def count_common_friends(packed, other_packed):
+    """Size of the intersection of two packed friend id arrays"""
+    if not len(packed) or not len(other_packed):
+        return 0
+
+    # binary search the smaller array's ids in the larger one
+    if len(packed) > len(other_packed):
+        packed, other_packed = other_packed, packed
+
+    positions = np.searchsorted(other_packed, packed)
+    positions[positions == len(other_packed)] = 0
+    return int(np.count_nonzero(other_packed[positions] == packed))
+
+
+def _update_friend_lists(operator, user_id, friend_id, session=None):
+    # the version bump invalidates ETags of both serialized profiles
+    collection = UserProfile._get_collection()
+    collection.update_one(
+        {'_id': user_id},
+        {operator: {'friends': friend_id}, '$inc': {'version': 1}},
+        session=session
+    )
+    collection.update_one(
+        {'_id': friend_id},
+        {operator: {'friends': user_id}, '$inc': {'version': 1}},
+        session=session
+    )
+    friend_ids_cache.delete_many([user_id, friend_id])
+
+
+def add_friendship(user_id, friend_id, session=None):
+    # $addToSet keeps it idempotent and avoids a read-modify-write of the whole profile
+    _update_friend_lists('$addToSet', user_id, friend_id, session)
+
+
+def remove_friendship(user_id, friend_id, session=None):
+    _update_friend_lists('$pull', user_id, friend_id, session)
+
+
+def supports_transactions(client):
+    """Whether client is connected to a replica set or sharded cluster.
+
+    The topology description only knows the deployment type once a server
+    has been contacted, so the server is asked (hello) on first use and the
+    answer is kept; a failed hello is not cached.
+    """
+    if not isinstance(client, MongoClient):
+        # e.g. mongomock
+        return False
+    if client not in _transactional:
+        hello = client.admin.command('hello')
+        _transactional[client] = 'setName' in hello or hello.get('msg') == 'isdbgrid'
+    return _transactional[client]
+
+
+@contextmanager
+def atomic():
+    """Yield a session inside a transaction, or None on a standalone mongod"""
+    client = UserProfile._get_db().client
+    if not supports_transactions(client):
+        yield None
+        return
+
+    with client.start_session() as session:
+        with session.start_transaction():
+            yield session
+
+
+def accept_friend_request(request_id, receiver_id):
+    """Move a pending request addressed to receiver_id to accepted and link both users.
+
+    Returns the updated raw document, or None if no such pending request exists.
+    """
+    if not ObjectId.is_valid(request_id):
+        return None
+
+    with atomic() as session:
+        # the status condition makes retries and concurrent accepts no-ops
+        accepted = FriendRequest._get_collection().find_one_and_update(
+            {'_id': ObjectId(request_id), 'receiver': receiver_id, 'status': 'pending'},
+            {'$set': {'status': 'accepted', 'updated_at': datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if accepted:
+            add_friendship(accepted['sender'], receiver_id, session=session)
+
+    return accepted
+
+
+def reject_friend_request(request_id, receiver_id):
+    """Drop a pending request addressed to receiver_id along with any other request between the pair.
+
+    Returns the rejected raw document, or None if no such pending request exists.
+    """
+    if not ObjectId.is_valid(request_id):
+        return None
+
+    rejected = FriendRequest._get_collection().find_one(
+        {'_id': ObjectId(request_id), 'receiver': receiver_id, 'status': 'pending'},
+        {'sender': 1}
+    )
+    if rejected:
+        delete_friend_requests(rejected['sender'], receiver_id)
+
+    return rejected
+
+
+def delete_friend_requests(user_id, other_id):
+    # no delete rules or signals on FriendRequest, so this is a single delete_many
+    FriendRequest.objects(
+        Q(sender=user_id, receiver=other_id) | Q(sender=other_id, receiver=user_id)
+    ).delete()
@@ -0,0 +1,115 @@
+"""
+Activity geometry and nearby-activity discovery.
+
+Each activity with a GPS track stores its start as a GeoJSON Point
+(start_point, in the activities' 2dsphere index) and the track's bounding box
+as a GeoJSON Polygon (bbox). The start point is set by the first located
+live data point; the bounding box when the track is replaced or the
+activity completes.
+
+Nearby results come from a $geoNear aggregation, nearest first, and are
+paged by distance: the cursor holds the last distance returned and the ids
+at exactly that distance, so a page never skips over earlier results.
+"""
+
+from bson import ObjectId
+
+NEARBY_DEFAULT_RADIUS = 5000
+NEARBY_MAX_RADIUS = 50000
+NEARBY_PAGE_SIZE = 20
+
+
+def _coordinates(point):
+    if isinstance(point, dict):
+        return point.get('longitude'), point.get('latitude')
+    return point.longitude, point.latitude
+
+
+def located(points):
+    """(longitude, latitude) of the points that have both"""
+    return [
+        (longitude, latitude) for longitude, latitude in map(_coordinates, points)
+        if longitude is not None and latitude is not None
+    ]
+
+
+def start_point(points):
+    """GeoJSON Point of the first located point, or None"""
+    for longitude, latitude in located(points):
+        return {'type': 'Point', 'coordinates': [longitude, latitude]}
+    return None
+
+
+def track_geometry(points):
+    """{'start_point': Point, 'bbox': Polygon} of a track (dicts or LiveDataPoints), None values without GPS"""
+    coordinates = located(points)
+    if not coordinates:
+        return {'start_point': None, 'bbox': None}
+
+    longitudes = [longitude for longitude, _ in coordinates]
+    latitudes = [latitude for _, latitude in coordinates]
+    west, east = min(longitudes), max(longitudes)
+    south, north = min(latitudes), max(latitudes)
+    return {
+        'start_point': {'type': 'Point', 'coordinates': list(coordinates[0])},
+        'bbox': {'type': 'Polygon', 'coordinates': [[
+            [west, south], [east, south], [east, north], [west, north], [west, south]
+        ]]},
+    }
+
+
+def encode_cursor(distance, activity_ids):
+    return f"{distance!r}:{','.join(str(activity_id) for activity_id in activity_ids)}"
+
+
+def parse_cursor(cursor):
+    """(distance, [activity ids]) from encode_cursor(); raises ValueError on anything else"""
+    distance, _, ids = cursor.partition(':')
+    activity_ids = [value for value in ids.split(',') if value]
+    if not all(ObjectId.is_valid(value) for value in activity_ids):
+        raise ValueError("invalid activity id in cursor")
+    return float(distance), [ObjectId(value) for value in activity_ids]
+
+
+def nearby_pipeline(longitude, latitude, radius, query, after=None, limit=NEARBY_PAGE_SIZE):
+    """$geoNear pipeline over the activities' start points within radius meters, matching query"""
+    geo_near = {
+        'near': {'type': 'Point', 'coordinates': [longitude, latitude]},
+        'key': 'start_point',
+        'distanceField': 'meters_away',
+        'maxDistance': radius,
+        'query': dict(query),
+        'spherical': True,
+    }
+    if after is not None:
+        distance, seen_ids = after
+        geo_near['minDistance'] = distance
+        if seen_ids:
+            geo_near['query']['_id'] = {'$nin': seen_ids}
+
+    return [
+        {'$geoNear': geo_near},
+        {'$limit': limit},
+        {'$project': {
+            'activity_name': 1,
+            'type': 1,
+            'status': 1,
+            'start_time': 1,
+            'user_id': 1,
+            'start_point': 1,
+            'meters_away': 1,
+        }},
+    ]
+
+
+def next_cursor(docs, after, limit):
+    """Cursor for the page after docs, or None when it was the last one"""
+    if len(docs) < limit:
+        return None
+
+    distance = docs[-1]['meters_away']
+    boundary_ids = [doc['_id'] for doc in docs if doc['meters_away'] == distance]
+    if after is not None and after[0] == distance:
+        # the whole page sat at the previous boundary
+        boundary_ids = after[1] + boundary_ids
+    return encode_cursor(distance, boundary_ids)
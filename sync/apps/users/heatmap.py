@@ -0,0 +1,255 @@
+"""
+Heatmaps of where people train, stored as per-user count grids per map tile.
+
+Completed tracks are rasterized with numpy onto Web Mercator tiles at every
+zoom from HEATMAP_MIN_ZOOM to HEATMAP_MAX_ZOOM. A tile is a grid of
+TILE_CELLS x TILE_CELLS cells, and a cell counts the user's activities that
+crossed it, once per activity. The grids are sparse ({cell index: count}),
+and an activity's tiles are updated with one $inc per tile, in one bulk
+write, when it is completed, deleted or its track replaced. Nothing reads
+live_data at request time: a tile request reads the user's (or their
+friends') stored grid for that tile and renders it as a PNG.
+
+UserProfile.heatmap_version counts the changes to a user's tiles. Tile URLs
+carry it (see HeatmapView), so a tile can be cached for a long time and a
+new version simply changes the URL.
+"""
+
+import hashlib
+import struct
+import zlib
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from pymongo import DeleteMany, InsertOne, UpdateOne
+
+from .geo import located
+from .models import Activity, HeatmapTile, UserProfile
+
+TILE_SIZE = 256
+TILE_CELLS = 64
+# longer jumps between consecutive points (GPS glitches, paused recording) are not drawn
+MAX_GAP_CELLS = TILE_CELLS
+# counts at which a cell is drawn fully opaque
+SATURATION = 20
+MAX_LATITUDE = 85.05112878
+
+
+def zoom_levels():
+    return range(getattr(settings, 'HEATMAP_MIN_ZOOM', 8), getattr(settings, 'HEATMAP_MAX_ZOOM', 15) + 1)
+
+
+def track_coordinates(points):
+    """(n, 2) array of the located (longitude, latitude) of a track (dicts or LiveDataPoints)"""
+    return np.asarray(located(points), dtype=np.float64).reshape(-1, 2)
+
+
+def cell_positions(coordinates, zoom):
+    """Fractional global cell positions (x, y) of coordinates at zoom"""
+    cells = TILE_CELLS * 2 ** zoom
+    longitude = coordinates[:, 0]
+    latitude = np.radians(np.clip(coordinates[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+    x = (longitude + 180) / 360 * cells
+    y = (1 - np.log(np.tan(latitude) + 1 / np.cos(latitude)) / np.pi) / 2 * cells
+    return np.clip(x, 0, cells - 1e-9), np.clip(y, 0, cells - 1e-9)
+
+
+def densify(x, y):
+    """Sample the polyline at least once per cell, so fast segments leave no holes"""
+    if len(x) < 2:
+        return x, y
+
+    dx, dy = np.diff(x), np.diff(y)
+    steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64)
+    # a gap is drawn as its two ends only
+    steps = np.where(steps > MAX_GAP_CELLS, 1, np.maximum(steps, 1))
+
+    segment = np.repeat(np.arange(len(dx)), steps)
+    offsets = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)
+    fraction = offsets / np.repeat(steps, steps)
+    fraction[np.repeat(steps == 1, steps)] = 0
+    return (
+        np.append(x[segment] + dx[segment] * fraction, x[-1]),
+        np.append(y[segment] + dy[segment] * fraction, y[-1]),
+    )
+
+
+def rasterize(coordinates, zoom):
+    """{(tile x, tile y): sorted cell indices} crossed by a track at zoom, each cell once"""
+    if not len(coordinates):
+        return {}
+
+    x, y = densify(*cell_positions(coordinates, zoom))
+    cells = TILE_CELLS * 2 ** zoom
+    unique = np.unique(x.astype(np.int64) * cells + y.astype(np.int64))
+    cell_x, cell_y = unique // cells, unique % cells
+
+    tile_x, tile_y = cell_x // TILE_CELLS, cell_y // TILE_CELLS
+    local = (cell_y % TILE_CELLS) * TILE_CELLS + cell_x % TILE_CELLS
+    tile_keys = tile_x * 2 ** zoom + tile_y
+    order = np.argsort(tile_keys, kind='stable')
+    tile_keys, local = tile_keys[order], local[order]
+    boundaries = np.flatnonzero(np.diff(tile_keys)) + 1
+
+    tiles = {}
+    for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(tile_keys)]):
+        key = int(tile_keys[start])
+        tiles[(key // 2 ** zoom, key % 2 ** zoom)] = np.sort(local[start:end])
+    return tiles
+
+
+def track_tiles(points):
+    """{(z, x, y): cell indices} of a track over every heatmap zoom"""
+    coordinates = track_coordinates(points)
+    return {
+        (zoom, x, y): cells
+        for zoom in zoom_levels()
+        for (x, y), cells in rasterize(coordinates, zoom).items()
+    }
+
+
+def tile_increments(before_points, after_points):
+    """{(z, x, y): {cell: delta}} moving a track from before to after (either may be None)"""
+    increments = {}
+    for points, sign in ((before_points, -1), (after_points, 1)):
+        if points is None:
+            continue
+        for tile, cells in track_tiles(points).items():
+            deltas = increments.setdefault(tile, {})
+            for cell in cells.tolist():
+                deltas[cell] = deltas.get(cell, 0) + sign
+
+    # a replaced track only touches the cells it changed
+    changed = {}
+    for tile, deltas in increments.items():
+        deltas = {cell: delta for cell, delta in deltas.items() if delta}
+        if deltas:
+            changed[tile] = deltas
+    return changed
+
+
+def completed_track(activity):
+    """The track an activity adds to its owner's heatmap: its live data once completed, else None"""
+    return list(activity.live_data) if activity.status == 'completed' else None
+
+
+def apply_heatmap_change(user_id, before_points, after_points):
+    """Update the user's tiles for a completed track added (before None), removed (after None) or replaced"""
+    increments = tile_increments(before_points, after_points)
+    if not increments:
+        return
+
+    now = datetime.utcnow()
+    HeatmapTile._get_collection().bulk_write([
+        UpdateOne(
+            {'user': user_id, 'z': z, 'x': x, 'y': y},
+            {'$inc': {f"cells.{cell}": delta for cell, delta in deltas.items()}, '$set': {'updated_at': now}},
+            upsert=True
+        )
+        for (z, x, y), deltas in increments.items()
+    ], ordered=False)
+    UserProfile._get_collection().update_one({'_id': user_id}, {'$inc': {'heatmap_version': 1}})
+
+
+def rebuild_heatmaps(batch_size=100):
+    """Recompute every user's tiles from their completed activities; returns the number of tiles written"""
+    users = UserProfile._get_collection()
+    activities = Activity._get_collection()
+    tiles_collection = HeatmapTile._get_collection()
+    last_id = None
+    written = 0
+
+    while True:
+        # keyset pagination, as in rebuild_suggestions
+        batch_filter = {'_id': {'$gt': last_id}} if last_id else {}
+        batch = [doc['_id'] for doc in users.find(batch_filter, {'_id': 1}).sort('_id', 1).limit(batch_size)]
+        if not batch:
+            break
+        last_id = batch[-1]
+
+        grids = {}
+        tracks = activities.find(
+            {'user_id': {'$in': batch}, 'status': 'completed', 'live_data.0': {'$exists': True}},
+            {'user_id': 1, 'live_data.latitude': 1, 'live_data.longitude': 1}
+        )
+        for doc in tracks:
+            for tile, cells in track_tiles(doc['live_data']).items():
+                grid = grids.get((doc['user_id'],) + tile)
+                if grid is None:
+                    grid = grids[(doc['user_id'],) + tile] = np.zeros(TILE_CELLS * TILE_CELLS, dtype=np.int64)
+                grid[cells] += 1
+
+        now = datetime.utcnow()
+        operations = [DeleteMany({'user': {'$in': batch}})]
+        for (user_id, z, x, y), grid in grids.items():
+            occupied = np.flatnonzero(grid)
+            operations.append(InsertOne({
+                'user': user_id, 'z': z, 'x': x, 'y': y,
+                'cells': {str(cell): int(count) for cell, count in zip(occupied.tolist(), grid[occupied].tolist())},
+                'updated_at': now,
+            }))
+        tiles_collection.bulk_write(operations, ordered=True)
+        users.update_many({'_id': {'$in': batch}}, {'$inc': {'heatmap_version': 1}})
+        written += len(operations) - 1
+
+    return written
+
+
+def heatmap_version(user_ids):
+    """Short digest of the users' heatmap versions, changing whenever any of their tiles (or the set of users) does"""
+    versions = sorted(
+        (str(doc['_id']), doc.get('heatmap_version', 0))
+        for doc in UserProfile._get_collection().find({'_id': {'$in': list(user_ids)}}, {'heatmap_version': 1})
+    ) if user_ids else []
+    return hashlib.blake2b(repr(versions).encode(), digest_size=8).hexdigest()
+
+
+def load_grid(user_ids, z, x, y):
+    """Summed counts of the users' tile as a (TILE_CELLS, TILE_CELLS) array, in one query"""
+    grid = np.zeros(TILE_CELLS * TILE_CELLS, dtype=np.int64)
+    query = {'z': z, 'x': x, 'y': y}
+    query['user'] = user_ids[0] if len(user_ids) == 1 else {'$in': list(user_ids)}
+    for doc in HeatmapTile._get_collection().find(query, {'cells': 1, '_id': 0}):
+        cells = doc.get('cells') or {}
+        if cells:
+            indices = np.fromiter(map(int, cells), dtype=np.int64, count=len(cells))
+            grid[indices] += np.fromiter(cells.values(), dtype=np.int64, count=len(cells))
+    return grid.reshape(TILE_CELLS, TILE_CELLS)
+
+
+def encode_png(rgba):
+    """A (height, width, 4) uint8 array as an RGBA PNG"""
+    height, width, _ = rgba.shape
+    # filter type 0 (none) before every row
+    rows = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    rows[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)),
+        chunk(b'IEND', b''),
+    ))
+
+
+def render_tile(grid):
+    """PNG of a count grid: transparent where empty, from orange to opaque red as counts grow"""
+    intensity = np.clip(np.log1p(np.maximum(grid, 0)) / np.log1p(SATURATION), 0, 1)
+    rgba = np.empty(grid.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = (160 * (1 - intensity)).astype(np.uint8)
+    rgba[..., 2] = 0
+    rgba[..., 3] = np.where(grid > 0, 80 + 175 * intensity, 0).astype(np.uint8)
+
+    scale = TILE_SIZE // TILE_CELLS
+    return encode_png(rgba.repeat(scale, axis=0).repeat(scale, axis=1))
+
+
+@lru_cache(maxsize=1)
+def empty_tile():
+    return render_tile(np.zeros((TILE_CELLS, TILE_CELLS), dtype=np.int64))
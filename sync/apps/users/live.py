@@ -0,0 +1,249 @@
+"""
+Push channel for live activity data and inbox notifications.
+
+Publishers (the sync append view, running in any thread) send messages to a
+group, one group per activity; every subscriber (an SSE stream on the ASGI
+event loop) owns a bounded buffer. A subscriber that falls behind has its
+pending messages coalesced into a single event, and once the buffer holds
+more than max_pending_points the oldest points are dropped (never a reset
+or status); the gap is visible to the client through the "start" index of
+the next event.
+
+InProcessChannelLayer only reaches subscribers in the publishing process.
+With several worker processes or hosts, a message published by one worker
+never reaches a stream held open by another, so set LIVE_REDIS_URL: the
+default layer is then a BrokerChannelLayer publishing through RedisBroker.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_layer = None
+_broker = None
+
+
+def activity_group(activity_id):
+    return f"activity.{activity_id}"
+
+
+def coalesce(messages):
+    """Merge consecutive messages into one event.
+
+    Points messages look like {'start': index, 'points': [...]}, and their
+    points are concatenated; a reset message (the whole track was replaced)
+    discards earlier points. Any other key, e.g. {'status': 'completed'} or
+    {'seq': 12}, keeps its latest value.
+    """
+    event = {}
+    for message in messages:
+        if message.get('reset'):
+            event = {'reset': True}
+        if 'points' in message:
+            if 'points' not in event:
+                event['start'] = message['start']
+                event['points'] = []
+            event['points'].extend(message['points'])
+        event.update(
+            (key, value) for key, value in message.items() if key not in ('reset', 'start', 'points')
+        )
+    return event
+
+
+class Subscription:
+    def __init__(self, max_pending_points):
+        self.loop = asyncio.get_running_loop()
+        self.max_pending_points = max_pending_points
+        self.pending = deque()
+        self.pending_points = 0
+        self.dropped_points = 0
+        self.event = asyncio.Event()
+
+    def push(self, message):
+        """Queue message for delivery; must run on the subscriber's loop"""
+        self.pending.append(message)
+        self.pending_points += len(message.get('points', ()))
+
+        # backpressure: keep the newest points, the client can refetch the rest
+        while self.pending_points > self.max_pending_points and len(self.pending) > 1:
+            oldest = self.pending.popleft()
+            dropped = len(oldest.get('points', ()))
+            self.pending_points -= dropped
+            self.dropped_points += dropped
+
+            # only points are dropped: reset, status and the like move to the next message
+            flags = {key: value for key, value in oldest.items() if key not in ('start', 'points')}
+            if flags:
+                self.pending[0] = coalesce([flags, self.pending[0]])
+
+        self.event.set()
+
+    async def get(self, timeout=None):
+        """Wait for pending messages and return them as one coalesced event, or None on timeout"""
+        if not self.pending:
+            self.event.clear()
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        messages = list(self.pending)
+        self.pending.clear()
+        self.pending_points = 0
+        return coalesce(messages)
+
+
+class ChannelLayer(ABC):
+    """Interface for group fan-out; see InProcessChannelLayer and BrokerChannelLayer"""
+
+    @abstractmethod
+    def publish(self, group, message):
+        """Send message to every subscription of group, from any thread"""
+
+    @abstractmethod
+    def subscribe(self, group):
+        """Return a new Subscription to group, bound to the running event loop"""
+
+    @abstractmethod
+    def unsubscribe(self, group, subscription):
+        """Stop delivering group's messages to subscription"""
+
+
+class InProcessChannelLayer(ChannelLayer):
+    """Fan-out between the threads and event loops of a single process (single-node deployments)"""
+
+    def __init__(self, max_pending_points=None):
+        self.max_pending_points = max_pending_points or getattr(settings, 'LIVE_MAX_PENDING_POINTS', 1000)
+        self.groups = {}
+        self.lock = threading.Lock()
+
+    def publish(self, group, message):
+        with self.lock:
+            subscriptions = list(self.groups.get(group, ()))
+
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.push, message)
+
+        return len(subscriptions)
+
+    def subscribe(self, group):
+        subscription = Subscription(self.max_pending_points)
+        with self.lock:
+            self.groups.setdefault(group, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, group, subscription):
+        with self.lock:
+            subscriptions = self.groups.get(group)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.groups[group]
+
+
+class LocalBroker:
+    """In-memory stand-in for an external pub/sub broker.
+
+    Several BrokerChannelLayer instances sharing one LocalBroker behave like
+    nodes sharing e.g. a Redis pub/sub channel; a real broker only needs the
+    same publish/listen pair.
+    """
+
+    def __init__(self):
+        self.listeners = []
+
+    def publish(self, group, message):
+        for listener in list(self.listeners):
+            listener(group, message)
+
+    def listen(self, callback):
+        self.listeners.append(callback)
+
+
+default_broker = LocalBroker()
+
+
+class RedisBroker:
+    """Redis pub/sub broker, shared by every process and host using the same server.
+
+    A group is published as JSON on the channel prefix + group. Each broker
+    holds one pattern subscription to all of them, read by a daemon thread
+    that passes every message to the listeners; the listeners (the local
+    fan-out) skip groups nobody in this process subscribes to.
+    """
+
+    def __init__(self, url=None, prefix=None, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url or settings.LIVE_REDIS_URL)
+        self.client = client
+        self.prefix = prefix or getattr(settings, 'LIVE_REDIS_PREFIX', 'live:')
+        self.listeners = []
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def publish(self, group, message):
+        self.client.publish(self.prefix + group, json.dumps(message, cls=DjangoJSONEncoder))
+
+    def listen(self, callback):
+        with self.lock:
+            self.listeners.append(callback)
+            if self.thread is None:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(**{self.prefix + '*': self.receive})
+                self.thread = pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=self.reconnect)
+
+    def receive(self, item):
+        channel = item['channel']
+        group = (channel.decode() if isinstance(channel, bytes) else channel)[len(self.prefix):]
+        message = json.loads(item['data'])
+        for listener in list(self.listeners):
+            listener(group, message)
+
+    def reconnect(self, error, pubsub, thread):
+        # the next read reconnects and subscribes again; messages published meanwhile are lost
+        logger.warning("live broker connection lost: %s", error)
+        time.sleep(1)
+
+
+def get_broker():
+    """RedisBroker on LIVE_REDIS_URL when it is set, else the in-memory default_broker"""
+    global _broker
+    if not getattr(settings, 'LIVE_REDIS_URL', None):
+        return default_broker
+    if _broker is None:
+        _broker = RedisBroker()
+    return _broker
+
+
+class BrokerChannelLayer(InProcessChannelLayer):
+    """Publishes through a broker and fans out locally what the broker delivers (multi-node)"""
+
+    def __init__(self, broker=None, max_pending_points=None):
+        super().__init__(max_pending_points)
+        self.broker = broker or get_broker()
+        self.broker.listen(self.deliver)
+
+    def publish(self, group, message):
+        self.broker.publish(group, message)
+
+    def deliver(self, group, message):
+        return super().publish(group, message)
+
+
+def get_channel_layer():
+    global _layer
+    if _layer is None:
+        backend = getattr(settings, 'LIVE_CHANNEL_LAYER', 'apps.users.live.InProcessChannelLayer')
+        _layer = import_string(backend)()
+    return _layer
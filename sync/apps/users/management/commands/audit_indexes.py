@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.query_registry import CANONICAL_QUERIES, Sample, propose_indexes
+from config.slow_queries import plan_summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Explain every canonical query (apps.users.query_registry) against the configured database "
+        "and report collection scans and in-memory sorts, with the compound indexes that would fix them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--create', action='store_true', help="create the proposed indexes")
+        parser.add_argument(
+            '--strict', action='store_true', help="exit with an error when an unexpected scan or sort remains"
+        )
+        parser.add_argument('--query', action='append', help="only audit these queries (repeatable)")
+
+    def handle(self, *args, **options):
+        queries = CANONICAL_QUERIES
+        if options['query']:
+            queries = [query for query in queries if query.name in options['query']]
+            if not queries:
+                raise CommandError("No canonical query matches --query")
+
+        sample = Sample()
+        problems = 0
+
+        for query in queries:
+            summary = plan_summary(query.cursor(sample).explain())
+            in_memory_sort = 'SORT' in summary['stages']
+            plan = ' <- '.join(summary['stages'])
+            if summary['indexes']:
+                plan += f" ({', '.join(summary['indexes'])})"
+
+            if not summary['collscan'] and not in_memory_sort:
+                self.stdout.write(self.style.SUCCESS(f"ok    {query.name}: {plan}"))
+                continue
+
+            if query.expect_scan:
+                self.stdout.write(f"scan  {query.name}: {plan} (expected: {query.note})")
+                continue
+
+            problems += 1
+            reasons = [reason for reason, found in (
+                ("collection scan", summary['collscan']), ("in-memory sort", in_memory_sort)
+            ) if found]
+            self.stdout.write(self.style.WARNING(f"FIX   {query.name}: {plan} ({', '.join(reasons)})"))
+
+            collection = query.document_class._get_collection()
+            for keys in propose_indexes(query.build(sample), query.sort):
+                if options['create']:
+                    name = collection.create_index(keys)
+                    self.stdout.write(f"      created {collection.name}.{name}")
+                else:
+                    self.stdout.write(f"      propose {collection.name}: {keys}")
+
+        if problems and options['strict'] and not options['create']:
+            raise CommandError(f"{problems} queries are not served by an index")
+
+        self.stdout.write(f"Audited {len(queries)} queries, {problems} need an index")
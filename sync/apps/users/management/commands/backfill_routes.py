@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from apps.users.geo import track_geometry
+from apps.users.models import Activity
+from apps.users.routes import route_polyline
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the route polyline, start point and bounding box of completed activities "
+        "that were finished before they were computed on completion"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        collection = Activity._get_collection()
+        last_id = None
+        updated = 0
+
+        while True:
+            batch_filter = {'status': 'completed', 'route': None, 'live_data.0': {'$exists': True}}
+            if last_id:
+                batch_filter['_id'] = {'$gt': last_id}
+            # coordinates only, traces can hold thousands of points
+            batch = list(collection.find(
+                batch_filter, {'live_data.latitude': 1, 'live_data.longitude': 1}
+            ).sort('_id', 1).limit(options['batch_size']))
+            if not batch:
+                break
+            last_id = batch[-1]['_id']
+
+            operations = []
+            for doc in batch:
+                route = route_polyline(doc['live_data'])
+                if route is None:
+                    continue
+                operations.append(UpdateOne({'_id': doc['_id']}, {'$set': {
+                    **track_geometry(doc['live_data']), 'route': route
+                }}))
+            if operations:
+                collection.bulk_write(operations, ordered=False)
+                updated += len(operations)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Stored {updated} routes in {elapsed:.1f}s"))
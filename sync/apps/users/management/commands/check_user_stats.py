@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.users.stats import check_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare every user's materialized stats with a full aggregation over their activities "
+        "and report the ones that drifted (run periodically; --fix rewrites them)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--fix', action='store_true', help="replace drifted stats with the recomputed ones")
+        parser.add_argument('--show', type=int, default=20, help="drifted users to list")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        checked, mismatches = check_stats(batch_size=options['batch_size'], fix=options['fix'])
+        elapsed = time.perf_counter() - started
+
+        for user_id, differences in mismatches[:options['show']]:
+            self.stdout.write(f"{user_id}: {', '.join(differences)}")
+
+        summary = f"Checked {checked} users in {elapsed:.1f}s, {len(mismatches)} out of date"
+        if options['fix'] and mismatches:
+            summary += " (fixed)"
+        style = self.style.SUCCESS if not mismatches or options['fix'] else self.style.WARNING
+        self.stdout.write(style(summary))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.users.suggestions import rebuild_suggestions, SUGGESTIONS_PER_USER, SUGGESTIONS_MAX_FANOUT
+
+
+class Command(BaseCommand):
+    help = "Recompute friend-of-friend suggestions with mutual counts for every user (run periodically)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=SUGGESTIONS_PER_USER)
+        parser.add_argument('--max-fanout', type=int, default=SUGGESTIONS_MAX_FANOUT)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_suggestions(
+            batch_size=options['batch_size'],
+            limit=options['limit'],
+            max_fanout=options['max_fanout']
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} suggestions in {elapsed:.1f}s"))
@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from apps.users.friendships import to_object_id
+from apps.users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Normalize UserProfile.friends into deduplicated, symmetric ObjectId arrays "
+        "so they can be maintained with $addToSet/$pull"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        collection = UserProfile._get_collection()
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        existing_ids = {doc['_id'] for doc in collection.find({}, {'_id': 1})}
+        adjacency = {}
+
+        # pass 1: normalize each array (DBRefs -> ObjectIds, no duplicates, no self or dangling refs)
+        rewritten = 0
+        operations = []
+        for doc in collection.find({}, {'friends': 1}):
+            user_id = doc['_id']
+            stored = doc.get('friends', [])
+
+            friends = []
+            seen = set()
+            for value in stored:
+                friend_id = to_object_id(value)
+                if friend_id == user_id or friend_id in seen or friend_id not in existing_ids:
+                    continue
+                seen.add(friend_id)
+                friends.append(friend_id)
+
+            adjacency[user_id] = seen
+            if friends != stored:
+                rewritten += 1
+                operations.append(UpdateOne({'_id': user_id}, {'$set': {'friends': friends}}))
+
+            if len(operations) >= batch_size:
+                self._flush(collection, operations, dry_run)
+
+        self._flush(collection, operations, dry_run)
+
+        # pass 2: add the missing reverse edge for one-sided friendships
+        repaired = 0
+        for user_id, friends in adjacency.items():
+            for friend_id in friends:
+                if friend_id not in adjacency:
+                    continue
+                if user_id not in adjacency[friend_id]:
+                    repaired += 1
+                    adjacency[friend_id].add(user_id)
+                    operations.append(
+                        UpdateOne({'_id': friend_id}, {'$addToSet': {'friends': user_id}})
+                    )
+
+                if len(operations) >= batch_size:
+                    self._flush(collection, operations, dry_run)
+
+        self._flush(collection, operations, dry_run)
+
+        if not dry_run:
+            UserProfile.ensure_indexes()
+
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Normalized {rewritten} friend lists and repaired {repaired} one-sided friendships "
+            f"across {len(adjacency)} users"
+        ))
+
+    def _flush(self, collection, operations, dry_run):
+        if operations and not dry_run:
+            collection.bulk_write(operations, ordered=False)
+        operations.clear()
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.users.heatmap import rebuild_heatmaps
+
+
+class Command(BaseCommand):
+    help = (
+        "Rasterize every completed activity into the users' heatmap tiles "
+        "(backfill, after changing the zoom levels, or repair after writes that bypassed the views)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="users per batch")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_heatmaps(options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} heatmap tiles in {elapsed:.1f}s"))
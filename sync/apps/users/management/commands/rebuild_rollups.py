@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.users.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the weekly activity rollups behind the leaderboard from every completed activity "
+        "(backfill, or repair after writes that bypassed the views)"
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_rollups()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} weekly rollups in {elapsed:.1f}s"))
@@ -1,7 +1,8 @@
 from mongoengine import (
     Document, StringField, EmailField, IntField, 
     DateTimeField, ListField, ReferenceField, FloatField,
-    DictField, EmbeddedDocument, EmbeddedDocumentField
+    DictField, EmbeddedDocument, EmbeddedDocumentField, ObjectIdField,
+    BooleanField, PointField, PolygonField
 )
 from datetime import datetime
 from django.contrib.auth.hashers import make_password, check_password
@@ -18,13 +19,20 @@ class UserProfile(Document):
     join_date = DateTimeField(default=datetime.utcnow)
     friends = ListField(ReferenceField('self'))
     challenges = ListField(StringField())
+    # bumped on every change visible in serialized profiles, used for ETags
+    version = IntField(default=0)
+    # sequence number of the latest notification in the user's inbox
+    notification_seq = IntField(default=0)
+    # bumped whenever the user's heatmap tiles change, part of the tile URLs
+    heatmap_version = IntField(default=0)
 
     meta = {
         'collection': 'users',
         'indexes': [
             {'fields': ['username'], 'unique': True},
             {'fields': ['email'], 'unique': True},
-            {'fields': ['auth0_id'], 'unique': True}
+            {'fields': ['auth0_id'], 'unique': True},
+            'friends'
         ]
     }
 
@@ -49,10 +57,43 @@ class FriendRequest(Document):
     meta = {
         'collection': 'friend_requests',
         'indexes': [
-            'sender',
-            'receiver',
             'status',
-            ('sender', 'receiver')
+            ('sender', 'receiver'),
+            # pending lists, newest first (also serve sender/receiver lookups)
+            ('receiver', 'status', '-created_at'),
+            ('sender', 'status', '-created_at')
+        ]
+    }
+
+
+class Notification(Document):
+    user = ReferenceField('UserProfile', required=True)
+    seq = IntField(required=True)
+    type = StringField(required=True, choices=['friend_request', 'friend_request_accepted'])
+    actor = ReferenceField('UserProfile', required=True)
+    # plain id, rejected requests are deleted
+    friend_request = ObjectIdField()
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'notifications',
+        'indexes': [
+            {'fields': ['user', 'seq'], 'unique': True}
+        ]
+    }
+
+
+class FriendSuggestion(Document):
+    user = ReferenceField('UserProfile', required=True)
+    candidate = ReferenceField('UserProfile', required=True)
+    mutual_count = IntField(default=0)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'friend_suggestions',
+        'indexes': [
+            {'fields': ['user', 'candidate'], 'unique': True},
+            ('user', '-mutual_count')
         ]
     }
 
@@ -84,16 +125,90 @@ class Activity(Document):
     avg_time = FloatField(default=0.0)
     live_data = ListField(EmbeddedDocumentField(LiveDataPoint))
     participants = ListField(ReferenceField('UserProfile'))
+    # listed in nearby discovery
+    public = BooleanField(default=False)
+    # GeoJSON, from live_data (apps.users.geo)
+    start_point = PointField(auto_index=False)
+    bbox = PolygonField(auto_index=False)
+    # simplified track as an encoded polyline, set on completion (apps.users.routes)
+    route = StringField()
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
     
     meta = {
         'collection': 'activities',
         'indexes': [
-            'user_id',
+            # a user's activities, newest first (also serves user_id lookups)
+            ('user_id', '-created_at'),
+            # nearby public activities ($geoNear on start_point), optionally by status
+            ('public', 'status', '(start_point'),
+            # a user's longest completed run (apps.users.stats.find_longest_run)
+            ('user_id', 'type', 'status', '-distance'),
             'status',
             'type',
             'start_time',
             '-created_at'
         ]
-    }
\ No newline at end of file
+    }
+
+
+class WeeklyRollup(Document):
+    """Totals of a user's completed activities of one type in one ISO week (apps.users.rollups)"""
+    user = ReferenceField('UserProfile', required=True)
+    week = StringField(required=True)
+    type = StringField(required=True)
+    distance = FloatField(default=0.0)
+    # seconds
+    duration = FloatField(default=0.0)
+    calories = FloatField(default=0.0)
+    count = IntField(default=0)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'weekly_rollups',
+        'indexes': [
+            # also serves the leaderboard: friends' ids ($in), then the week
+            {'fields': ['user', 'week', 'type'], 'unique': True}
+        ]
+    }
+
+
+class UserStats(Document):
+    """A user's completed-activity totals, kept up to date by apps.users.stats.
+
+    totals holds {type: totals} for all time; weeks, months and years hold
+    {period: totals} over every type, keyed '2025-W23', '2025-06' and '2025'.
+    """
+    user = ReferenceField('UserProfile', required=True, unique=True)
+    totals = DictField()
+    weeks = DictField()
+    months = DictField()
+    years = DictField()
+    # {'activity', 'distance', 'duration', 'date'} of the user's longest run
+    longest_run = DictField(null=True)
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'user_stats'
+    }
+
+
+class HeatmapTile(Document):
+    """Counts of a user's completed activities per cell of one map tile (apps.users.heatmap).
+
+    cells is sparse: {cell index: count}, the index being row * TILE_CELLS + column.
+    """
+    user = ReferenceField('UserProfile', required=True)
+    z = IntField(required=True)
+    x = IntField(required=True)
+    y = IntField(required=True)
+    cells = DictField()
+    updated_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'heatmap_tiles',
+        'indexes': [
+            # also serves friends' tiles: their ids ($in), then the tile
+            {'fields': ['user', 'z', 'x', 'y'], 'unique': True}
+        ]
+    }
@@ -0,0 +1,85 @@
+"""
+Per-user notification inbox.
+
+Every notification gets the recipient's next sequence number and is stored
+before notification_seq is raised to it; the latest value is kept in the
+Django cache and announced on the live channel layer. Long-polling clients pass the last sequence they saw, so an
+idle poll only reads the cache and waits for the announcement, without
+touching MongoDB.
+
+The announcement reaches pollers in other worker processes only through a
+shared broker (LIVE_REDIS_URL, see apps.users.live). Without one, a poll
+held by another process finds the new seq in the shared cache when it
+times out, so the notification arrives late but is not lost.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from mongoengine import NotUniqueError
+
+from .live import get_channel_layer
+from .models import UserProfile, Notification
+
+NOTIFICATIONS_PAGE_SIZE = 50
+
+SEQ_CACHE_TTL = getattr(settings, 'NOTIFICATION_SEQ_CACHE_TTL', 300)
+
+
+def inbox_group(user_id):
+    return f"inbox.{user_id}"
+
+
+def seq_cache_key(user_id):
+    return f"notification_seq:{user_id}"
+
+
+def notify(user_id, type, actor_id, friend_request_id=None):
+    """Append a notification to user_id's inbox and wake up their pollers.
+
+    The notification is stored before its seq is published (notification_seq,
+    the cache, the channel layer), so a reader that sees seq N can always
+    read notification N. Seqs are claimed through the unique (user, seq)
+    index: a concurrent notify that took the same one moves on to the next.
+    """
+    users = UserProfile._get_collection()
+    user = users.find_one({'_id': user_id}, {'notification_seq': 1})
+    if user is None:
+        return None
+
+    seq = user.get('notification_seq', 0) + 1
+    while True:
+        try:
+            Notification(
+                user=user_id, seq=seq, type=type, actor=actor_id, friend_request=friend_request_id
+            ).save()
+            break
+        except NotUniqueError:
+            seq += 1
+
+    users.update_one({'_id': user_id}, {'$max': {'notification_seq': seq}})
+    raise_cached_seq(user_id, seq)
+    get_channel_layer().publish(inbox_group(user_id), {'seq': seq})
+    return seq
+
+
+def raise_cached_seq(user_id, seq):
+    # never lower it: a concurrent notify or a reader may have cached a newer value
+    key = seq_cache_key(user_id)
+    if not cache.add(key, seq, SEQ_CACHE_TTL):
+        cached = cache.get(key)
+        if cached is None or cached < seq:
+            cache.set(key, seq, SEQ_CACHE_TTL)
+
+
+def latest_seq(user_id):
+    seq = cache.get(seq_cache_key(user_id))
+    if seq is None:
+        user = UserProfile._get_collection().find_one({'_id': user_id}, {'notification_seq': 1})
+        seq = (user or {}).get('notification_seq', 0)
+        # add, not set: a notify since our read has cached a newer seq
+        cache.add(seq_cache_key(user_id), seq, SEQ_CACHE_TTL)
+    return seq
+
+
+def notifications_since(user_id, since):
+    return Notification.objects(user=user_id, seq__gt=since).order_by('seq').limit(NOTIFICATIONS_PAGE_SIZE)
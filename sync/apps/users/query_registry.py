@@ -0,0 +1,179 @@
+"""
+Canonical query shapes of the app, checked by the audit_indexes command.
+
+Each entry mirrors a query issued by a view or helper: when adding or
+changing a hot query, add or update its entry here so the audit can tell
+whether an index serves it.
+"""
+
+from bson import ObjectId
+
+from .models import UserProfile, FriendRequest, Activity, Notification, FriendSuggestion, WeeklyRollup, UserStats, HeatmapTile
+from .search import SEARCH_RESULT_LIMIT
+
+RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte', '$ne', '$nin'}
+
+
+class CanonicalQuery:
+    """A query shape: build(sample) returns the filter, sort is a list of (field, direction)"""
+
+    def __init__(self, name, document_class, build, sort=None, limit=None, expect_scan=False, note=None):
+        self.name = name
+        self.document_class = document_class
+        self.build = build
+        self.sort = sort or []
+        self.limit = limit
+        # e.g. case-insensitive substring regexes, which no index can serve
+        self.expect_scan = expect_scan
+        self.note = note
+
+    def cursor(self, sample):
+        cursor = self.document_class._get_collection().find(self.build(sample))
+        if self.sort:
+            cursor = cursor.sort(self.sort)
+        if self.limit:
+            cursor = cursor.limit(self.limit)
+        return cursor
+
+
+class Sample:
+    """Real ids from the seeded database, so the planner sees realistic values"""
+
+    def __init__(self):
+        users = UserProfile._get_collection()
+        user = users.find_one({'friends.0': {'$exists': True}}, {'friends': 1}) or users.find_one({}, {'friends': 1})
+        user = user or {'_id': ObjectId(), 'friends': []}
+
+        self.user_id = user['_id']
+        self.friend_ids = user.get('friends', [])[:500] or [ObjectId()]
+        self.other_id = self.friend_ids[0]
+
+
+def _is_equality(condition):
+    if not isinstance(condition, dict):
+        return True
+    return set(condition) <= {'$eq', '$in'}
+
+
+def propose_indexes(query_filter, sort):
+    """Propose compound indexes following the equality, sort, range rule.
+
+    Each $or branch is planned on its own, so it gets its own index.
+    """
+    branches = query_filter.get('$or')
+    if branches:
+        shared = {key: value for key, value in query_filter.items() if key != '$or'}
+        proposals = []
+        for branch in branches:
+            for proposal in propose_indexes({**shared, **branch}, sort):
+                if proposal not in proposals:
+                    proposals.append(proposal)
+        return proposals
+
+    equality, ranges = [], []
+    for field, condition in query_filter.items():
+        if field.startswith('$'):
+            continue
+        if _is_equality(condition):
+            equality.append((field, 1))
+        elif set(condition) & RANGE_OPERATORS:
+            ranges.append((field, 1))
+        # regexes and other operators gain nothing from a key position
+
+    keys = equality + [(field, direction) for field, direction in sort if field not in dict(equality)]
+    keys += [key for key in ranges if key[0] not in dict(keys)]
+    return [keys] if keys else []
+
+
+CANONICAL_QUERIES = [
+    CanonicalQuery(
+        'activities_list', Activity,
+        lambda sample: {'user_id': sample.user_id},
+        sort=[('created_at', -1)]
+    ),
+    CanonicalQuery(
+        'friends_activities', Activity,
+        lambda sample: {'user_id': {'$in': sample.friend_ids}},
+        sort=[('created_at', -1)], limit=50
+    ),
+    CanonicalQuery(
+        'pending_friend_requests', FriendRequest,
+        lambda sample: {'$or': [
+            {'receiver': sample.user_id, 'status': 'pending'},
+            {'sender': sample.user_id, 'status': 'pending'},
+        ]},
+        sort=[('created_at', -1)]
+    ),
+    CanonicalQuery(
+        'existing_friend_request', FriendRequest,
+        lambda sample: {
+            '$or': [
+                {'sender': sample.user_id, 'receiver': sample.other_id},
+                {'sender': sample.other_id, 'receiver': sample.user_id},
+            ],
+            'status': 'pending',
+        },
+        limit=1
+    ),
+    CanonicalQuery(
+        'friend_suggestions', FriendSuggestion,
+        lambda sample: {'user': sample.user_id, 'candidate': {'$nin': sample.friend_ids}},
+        sort=[('mutual_count', -1)], limit=20
+    ),
+    CanonicalQuery(
+        'notifications_since', Notification,
+        lambda sample: {'user': sample.user_id, 'seq': {'$gt': 0}},
+        sort=[('seq', 1)], limit=50
+    ),
+    CanonicalQuery(
+        'leaderboard', WeeklyRollup,
+        lambda sample: {'user': {'$in': sample.friend_ids}, 'week': '2025-W23'}
+    ),
+    CanonicalQuery(
+        # $geoNear in the view; $nearSphere is the find() equivalent for explain
+        'nearby_activities', Activity,
+        lambda sample: {
+            'public': True,
+            'status': 'in_progress',
+            'start_point': {'$nearSphere': {
+                '$geometry': {'type': 'Point', 'coordinates': [-74.0, 40.7]}, '$maxDistance': 5000
+            }},
+        },
+        limit=20
+    ),
+    CanonicalQuery(
+        'profile_stats', UserStats,
+        lambda sample: {'user': sample.user_id}
+    ),
+    CanonicalQuery(
+        'longest_run', Activity,
+        lambda sample: {'user_id': sample.user_id, 'type': 'running', 'status': 'completed', 'distance': {'$gt': 0}},
+        sort=[('distance', -1)], limit=1
+    ),
+    CanonicalQuery(
+        'heatmap_tile_friends', HeatmapTile,
+        lambda sample: {'user': {'$in': sample.friend_ids}, 'z': 12, 'x': 2048, 'y': 1362}
+    ),
+    CanonicalQuery(
+        'profiles_by_id', UserProfile,
+        lambda sample: {'_id': {'$in': sample.friend_ids}}
+    ),
+    CanonicalQuery(
+        'user_by_username', UserProfile,
+        lambda sample: {'username': 'runner'}, limit=1
+    ),
+    CanonicalQuery(
+        'user_by_email', UserProfile,
+        lambda sample: {'email': 'runner@example.com'}, limit=1
+    ),
+    CanonicalQuery(
+        'search_users', UserProfile,
+        lambda sample: {'$or': [
+            {'username': {'$regex': 'run', '$options': 'i'}},
+            {'email': {'$regex': 'run', '$options': 'i'}},
+            {'full_name': {'$regex': 'run', '$options': 'i'}},
+        ]},
+        limit=SEARCH_RESULT_LIMIT, expect_scan=True,
+        note="case-insensitive substring search, results are cached (apps.users.search)"
+    ),
+]
@@ -0,0 +1,49 @@
+import orjson
+from bson import ObjectId
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from config.metrics import timed
+
+_fallback_encoder = JSONEncoder()
+
+
+def default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    # datetimes, lazy strings, UUIDs, Decimals, querysets... same rules as DRF's encoder
+    return _fallback_encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON renderer backed by orjson, with ObjectId support.
+
+    For finite values the output is byte for byte DRF's compact renderer:
+    UTF-8 without escaping, and dates and times formatted by DRF's own
+    encoder (naive datetimes without an offset, UTC as Z, microseconds
+    kept). Unlike DRF, which refuses them, NaN and Infinity render as null.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        options = self.options
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+
+        with timed('render'):
+            return orjson.dumps(data, default=default, option=options)
+
+
+class PNGRenderer(BaseRenderer):
+    """Lets image/png requests through content negotiation; views return the PNG bytes themselves"""
+    media_type = 'image/png'
+    format = 'png'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # error responses to an image request carry only their status
+        return data if isinstance(data, bytes) else b''
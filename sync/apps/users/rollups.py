@@ -0,0 +1,164 @@
+"""
+Weekly rollups of completed activities: (user, ISO week, type) -> distance,
+duration, calories and count.
+
+They are kept up to date incrementally from the activity write paths:
+call activity_contribution() on the activity before and after the change
+and pass both to apply_contribution_change(). rebuild_rollups() recomputes
+the whole collection from the activities, for backfills and repairs.
+"""
+
+from datetime import datetime, timezone
+
+from .friendships import to_object_id
+from .models import Activity, WeeklyRollup
+
+METRICS = ('distance', 'duration', 'calories', 'count')
+
+LEADERBOARD_LIMIT = 100
+
+
+def iso_week(moment):
+    """'2025-W23' for any day of ISO week 23 of 2025"""
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def as_utc(moment):
+    """Naive UTC, as MongoDB returns them; request data may carry an offset"""
+    if moment is not None and moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def activity_contribution(activity):
+    """What an activity (document or raw dict) adds to its owner's rollups and stats, or None"""
+    if isinstance(activity, dict):
+        get = activity.get
+    else:
+        # raw field values: reading user_id through the document would dereference it
+        get = activity._data.get
+
+    if get('status') != 'completed':
+        return None
+
+    start, end = as_utc(get('start_time')), as_utc(get('end_time'))
+    moment = start or as_utc(get('created_at'))
+    if moment is None:
+        return None
+
+    return {
+        # documents keep their primary key as 'id', raw documents as '_id'
+        'activity': get('_id', get('id')),
+        'user': to_object_id(get('user_id')),
+        'date': moment,
+        'week': iso_week(moment),
+        'type': get('type'),
+        'distance': get('distance') or 0.0,
+        'duration': max((end - start).total_seconds(), 0.0) if start and end else 0.0,
+        'calories': get('calories') or 0.0,
+        'count': 1,
+    }
+
+
+def _increment(contribution, sign):
+    key = {field: contribution[field] for field in ('user', 'week', 'type')}
+    WeeklyRollup._get_collection().update_one(
+        key,
+        {
+            '$inc': {metric: sign * contribution[metric] for metric in METRICS},
+            '$set': {'updated_at': datetime.utcnow()},
+        },
+        upsert=True
+    )
+    return key
+
+
+def apply_contribution_change(before, after):
+    """Move an activity's contribution from before to after (either may be None)"""
+    if before == after:
+        return
+
+    if before is not None:
+        key = _increment(before, -1)
+        # the last activity of the week and type is gone
+        WeeklyRollup._get_collection().delete_one({**key, 'count': {'$lte': 0}})
+    if after is not None:
+        _increment(after, 1)
+
+
+def leaderboard(user_ids, week, metric, activity_type=None, limit=LEADERBOARD_LIMIT):
+    """Rank user_ids by their week's total of metric: [(user_id, totals), ...], best first"""
+    query = {'user': {'$in': list(user_ids)}, 'week': week}
+    if activity_type:
+        query['type'] = activity_type
+
+    totals = {}
+    projection = {'user': 1, **{field: 1 for field in METRICS}}
+    for doc in WeeklyRollup._get_collection().find(query, projection):
+        user_totals = totals.setdefault(doc['user'], dict.fromkeys(METRICS, 0))
+        for field in METRICS:
+            user_totals[field] += doc.get(field, 0)
+
+    ranked = sorted(totals.items(), key=lambda item: item[1][metric], reverse=True)
+    return ranked[:limit]
+
+
+def contribution_pipeline(match=None, sort=None, limit=None):
+    """Aggregation stages yielding activity_contribution()'s fields (as user_id and date) per activity
+
+    sort and limit apply to the stored fields before the projection, so an
+    index on the match and sort keys serves them.
+    """
+    stages = [{'$match': {**(match or {}), 'status': 'completed'}}]
+    if sort:
+        stages.append({'$sort': sort})
+    if limit:
+        stages.append({'$limit': limit})
+    return stages + [
+        {'$project': {
+            'user_id': 1,
+            'type': 1,
+            'date': {'$ifNull': ['$start_time', '$created_at']},
+            'distance': {'$ifNull': ['$distance', 0.0]},
+            'calories': {'$ifNull': ['$calories', 0.0]},
+            'duration': {'$cond': [
+                {'$and': ['$start_time', '$end_time']},
+                {'$max': [{'$divide': [{'$subtract': ['$end_time', '$start_time']}, 1000]}, 0.0]},
+                0.0
+            ]},
+        }},
+        {'$match': {'date': {'$ne': None}}},
+    ]
+
+
+def rebuild_rollups():
+    """Recompute every rollup from the completed activities and swap the collection's contents"""
+    Activity._get_collection().aggregate(contribution_pipeline() + [
+        {'$group': {
+            '_id': {
+                'user': '$user_id',
+                'week': {'$dateToString': {'format': '%G-W%V', 'date': '$date'}},
+                'type': '$type',
+            },
+            'distance': {'$sum': '$distance'},
+            'duration': {'$sum': '$duration'},
+            'calories': {'$sum': '$calories'},
+            'count': {'$sum': 1},
+        }},
+        {'$project': {
+            '_id': 0,
+            'user': '$_id.user',
+            'week': '$_id.week',
+            'type': '$_id.type',
+            'distance': 1,
+            'duration': 1,
+            'calories': 1,
+            'count': 1,
+            'updated_at': '$$NOW',
+        }},
+        # replaces the contents in one step and keeps the collection's indexes
+        {'$out': WeeklyRollup._get_collection_name()},
+    ], allowDiskUse=True)
+
+    return WeeklyRollup._get_collection().estimated_document_count()
@@ -0,0 +1,101 @@
+"""
+Route thumbnails: a completed activity's track, simplified with
+Douglas-Peucker and stored as an encoded polyline (Google's format, 1e-5
+degree precision) on Activity.route.
+
+List and feed responses carry the route instead of live_data, so a map
+thumbnail costs a few hundred bytes per item whatever the track length.
+Simplification works in meters on a local equirectangular projection; a
+track that still has more than ROUTE_MAX_POINTS points is simplified
+further, at the tolerance that leaves that many.
+"""
+
+import numpy as np
+from django.conf import settings
+
+from .geo import located
+
+EARTH_RADIUS_M = 6_371_000
+
+
+def project(coordinates):
+    """(longitude, latitude) degrees -> (x, y) meters around the track's mean latitude"""
+    radians = np.radians(np.asarray(coordinates, dtype=np.float64))
+    scale = np.cos(radians[:, 1].mean())
+    return np.column_stack((radians[:, 0] * scale, radians[:, 1])) * EARTH_RADIUS_M
+
+
+def significance(xy, tolerance):
+    """Largest Douglas-Peucker tolerance at which each point is still kept (0 below tolerance, inf at the ends).
+
+    Each segment's distances are computed in one vectorized pass. A split
+    point never outranks the split that exposed it, so keeping the points
+    above any t >= tolerance is exactly the simplification at t.
+    """
+    count = len(xy)
+    ranks = np.zeros(count)
+    ranks[0] = ranks[-1] = np.inf
+    pending = [(0, count - 1, np.inf)]
+    while pending:
+        first, last, bound = pending.pop()
+        if last - first < 2:
+            continue
+
+        start = xy[first]
+        dx, dy = xy[last] - start
+        offsets = xy[first + 1:last] - start
+        length = np.hypot(dx, dy)
+        if length:
+            distances = np.abs(dx * offsets[:, 1] - dy * offsets[:, 0]) / length
+        else:
+            # closed loop: distance from the shared endpoint
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            ranks[split] = min(distances[farthest], bound)
+            pending.append((first, split, ranks[split]))
+            pending.append((split, last, ranks[split]))
+
+    return ranks
+
+
+def simplify(xy, tolerance):
+    """Indices of the points Douglas-Peucker keeps at tolerance"""
+    if len(xy) < 3:
+        return np.arange(len(xy))
+    return np.flatnonzero(significance(xy, tolerance) > tolerance)
+
+
+def encode_polyline(coordinates, precision=5):
+    """Encode (longitude, latitude) pairs in the polyline algorithm format (latitude first)"""
+    values = np.round(np.asarray(coordinates, dtype=np.float64)[:, ::-1] * 10 ** precision).astype(np.int64)
+    # deltas of the rounded values, so rounding errors do not accumulate
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    shifted = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    chars = []
+    for value in shifted.tolist():
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return ''.join(chars)
+
+
+def route_polyline(points, tolerance=None, max_points=None):
+    """Encoded simplified route of a track (dicts or LiveDataPoints), or None without two located points"""
+    tolerance = tolerance or getattr(settings, 'ROUTE_SIMPLIFY_TOLERANCE_M', 10)
+    max_points = max_points or getattr(settings, 'ROUTE_MAX_POINTS', 60)
+
+    coordinates = np.asarray(located(points), dtype=np.float64)
+    if len(coordinates) < 2:
+        return None
+
+    ranks = significance(project(coordinates), tolerance)
+    kept = np.flatnonzero(ranks > tolerance)
+    if len(kept) > max_points:
+        # the same as simplifying again at the tolerance that leaves max_points
+        kept = np.sort(np.argsort(ranks, kind='stable')[-max_points:])
+    return encode_polyline(coordinates[kept])
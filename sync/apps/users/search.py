@@ -0,0 +1,86 @@
+from bson import ObjectId
+from django.conf import settings
+from mongoengine import Q
+
+from .cache import SharedCache
+from .models import UserProfile
+
+SEARCH_RESULT_LIMIT = 20
+
+search_cache = SharedCache('search', ttl=getattr(settings, 'SEARCH_CACHE_TTL', 30))
+
+SEARCHED_FIELDS = ('username', 'email', 'full_name')
+
+# above this many affected queries, invalidating the whole namespace is cheaper
+SEARCH_INVALIDATE_MAX_KEYS = getattr(settings, 'SEARCH_INVALIDATE_MAX_KEYS', 5000)
+
+
+def normalize_query(query):
+    # icontains is case insensitive, so case variants share one entry
+    return query.strip().lower()
+
+
+def search_users(query):
+    """Return the profiles matching query by ID, username, email or full name"""
+    query = query.strip()
+
+    # only well-formed ObjectIds can hit the _id index
+    if ObjectId.is_valid(query):
+        user_by_id = UserProfile.objects(id=query).first()
+        if user_by_id:
+            return [user_by_id]
+
+    key = normalize_query(query)
+    user_ids = search_cache.get(key)
+
+    if user_ids is None:
+        user_ids = list(
+            UserProfile.objects.filter(
+                Q(username__icontains=key) |
+                Q(email__icontains=key) |
+                Q(full_name__icontains=key)
+            ).limit(SEARCH_RESULT_LIMIT).scalar('id')
+        )
+        search_cache.set(key, user_ids)
+
+    if not user_ids:
+        return []
+
+    users_by_id = {
+        user.id: user
+        for user in UserProfile.objects(id__in=user_ids).only(
+            'id', 'username', 'full_name', 'profile_picture'
+        )
+    }
+    return [users_by_id[user_id] for user_id in user_ids if user_id in users_by_id]
+
+
+def matching_queries(value):
+    """Every normalized query that matches value: its lowercase substrings without surrounding spaces"""
+    value = (value or '').lower()
+    return {
+        value[start:end]
+        for start in range(len(value)) if not value[start].isspace()
+        for end in range(start + 1, len(value) + 1) if not value[end - 1].isspace()
+    }
+
+
+def invalidate_profile(profile, previous=None):
+    """Drop the cached searches which may now miss profile or wrongly contain it.
+
+    Those are the queries matching a changed field before or after the
+    change. previous maps the fields that may have changed to their old
+    values; None means a new profile, so every query matching it is dropped.
+    """
+    queries = set()
+    for field in SEARCHED_FIELDS:
+        value = getattr(profile, field, None)
+        if previous is None:
+            queries |= matching_queries(value)
+        elif field in previous and previous[field] != value:
+            queries |= matching_queries(previous[field]) | matching_queries(value)
+
+    if len(queries) > SEARCH_INVALIDATE_MAX_KEYS:
+        search_cache.clear()
+    elif queries:
+        search_cache.delete_many(queries)
@@ -54,6 +54,30 @@ class UserProfileSerializer(serializers.Serializer):
         return friends_data
 
 
+class FriendSuggestionSerializer(serializers.Serializer):
+    _id = serializers.SerializerMethodField()
+    username = serializers.SerializerMethodField()
+    full_name = serializers.SerializerMethodField()
+    profile_picture = serializers.SerializerMethodField()
+    mutual_count = serializers.SerializerMethodField()
+
+    # obj is a (profile, mutual_count) pair
+    def get__id(self, obj):
+        return str(obj[0].id)
+
+    def get_username(self, obj):
+        return obj[0].username
+
+    def get_full_name(self, obj):
+        return obj[0].full_name
+
+    def get_profile_picture(self, obj):
+        return obj[0].profile_picture
+
+    def get_mutual_count(self, obj):
+        return obj[1]
+
+
 class FriendRequestSerializer(serializers.Serializer):
     _id = serializers.SerializerMethodField()
     sender = serializers.SerializerMethodField()
@@ -82,6 +106,26 @@ class FriendRequestSerializer(serializers.Serializer):
         }
 
 
+class NotificationSerializer(serializers.Serializer):
+    _id = serializers.SerializerMethodField()
+    seq = serializers.IntegerField()
+    type = serializers.CharField()
+    actor = serializers.SerializerMethodField()
+    friend_request = serializers.CharField(allow_null=True)
+    created_at = serializers.DateTimeField(read_only=True)
+
+    def get__id(self, obj):
+        return str(obj.id)
+
+    def get_actor(self, obj):
+        return {
+            '_id': str(obj.actor.id),
+            'username': obj.actor.username,
+            'full_name': obj.actor.full_name,
+            'profile_picture': obj.actor.profile_picture
+        }
+
+
 class LiveDataPointSerializer(serializers.Serializer):
     timestamp = serializers.DateTimeField()
     latitude = serializers.FloatField(required=False, allow_null=True)
@@ -107,6 +151,7 @@ class ActivitySerializer(serializers.Serializer):
         choices=['running', 'cycling', 'walking', 'swimming', 'gym', 'other']
     )
     avg_time = serializers.FloatField(default=0.0)
+    public = serializers.BooleanField(default=False)
     live_data = LiveDataPointSerializer(many=True, required=False)
     participants = serializers.SerializerMethodField()
     created_at = serializers.DateTimeField(read_only=True)
@@ -136,12 +181,19 @@ class ActivitySerializer(serializers.Serializer):
         return participants_data
 
 
+class ActivitySummarySerializer(ActivitySerializer):
+    """List and feed items: the encoded route polyline instead of the live_data points"""
+    live_data = None
+    route = serializers.CharField(required=False, allow_null=True)
+
+
 class ActivityCreateSerializer(serializers.Serializer):
     activity_name = serializers.CharField(max_length=200)
     type = serializers.ChoiceField(
         choices=['running', 'cycling', 'walking', 'hiking', 'swimming', 'gym', 'other']
     )
     start_time = serializers.DateTimeField(required=False, allow_null=True)
+    public = serializers.BooleanField(required=False)
     participant_ids = serializers.ListField(
         child=serializers.CharField(),
         required=False,
@@ -159,4 +211,8 @@ class ActivityUpdateSerializer(serializers.Serializer):
     distance = serializers.FloatField(required=False)
     calories = serializers.FloatField(required=False)
     avg_time = serializers.FloatField(required=False)
-    live_data = LiveDataPointSerializer(many=True, required=False)
\ No newline at end of file
+    public = serializers.BooleanField(required=False)
+    live_data = LiveDataPointSerializer(many=True, required=False)
+
+class LiveDataAppendSerializer(serializers.Serializer):
+    points = LiveDataPointSerializer(many=True, allow_empty=False)
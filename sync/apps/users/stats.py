@@ -0,0 +1,245 @@
+"""
+Per-user activity statistics, materialized in one user_stats document each.
+
+A stats read is a single lookup by user that projects only the current
+week, month and year, so it costs the same whatever the history size.
+Writes go through the same before/after contributions as the weekly rollups
+(apps.users.rollups): apply_stats_change() moves an activity's contribution
+with one $inc, and looks up the longest run again only when the edited
+activity was it. check_stats() recomputes the documents from the activities
+with an aggregation and reports, or fixes, the ones that drifted.
+"""
+
+import math
+from datetime import datetime
+
+from pymongo import DeleteMany, InsertOne, ReturnDocument
+
+from .models import Activity, UserProfile, UserStats
+from .rollups import METRICS, iso_week, contribution_pipeline
+
+LONGEST_TYPE = 'running'
+
+SECTIONS = ('totals', 'weeks', 'months', 'years')
+
+
+def period_keys(moment):
+    """The weeks, months and years keys of the periods moment falls in"""
+    return {'weeks': iso_week(moment), 'months': moment.strftime('%Y-%m'), 'years': str(moment.year)}
+
+
+def _buckets(contribution):
+    # every totals object one activity counts towards
+    yield f"totals.{contribution['type']}"
+    for section, key in period_keys(contribution['date']).items():
+        yield f"{section}.{key}"
+
+
+def _longest_run(contribution):
+    return {field: contribution[field] for field in ('activity', 'distance', 'duration', 'date')}
+
+
+def _is_run(contribution):
+    return contribution is not None and contribution['type'] == LONGEST_TYPE and contribution['distance'] > 0
+
+
+def find_longest_run(user_id):
+    """The user's longest completed run, from the activities"""
+    docs = Activity._get_collection().aggregate(contribution_pipeline(
+        {'user_id': user_id, 'type': LONGEST_TYPE, 'distance': {'$gt': 0}},
+        sort={'distance': -1}, limit=1
+    ))
+    for doc in docs:
+        return {'activity': doc['_id'], 'distance': doc['distance'], 'duration': doc['duration'], 'date': doc['date']}
+    return None
+
+
+def apply_stats_change(before, after):
+    """Move an activity's contribution (apps.users.rollups.activity_contribution) from before to after"""
+    if before == after:
+        return
+
+    increments = {}
+    for contribution, sign in ((before, -1), (after, 1)):
+        if contribution is None:
+            continue
+        for bucket in _buckets(contribution):
+            for metric in METRICS:
+                path = f"{bucket}.{metric}"
+                increments[path] = increments.get(path, 0) + sign * contribution[metric]
+
+    user_id = (after or before)['user']
+    collection = UserStats._get_collection()
+    stats = collection.find_one_and_update(
+        {'user': user_id},
+        {'$inc': increments, '$set': {'updated_at': datetime.utcnow()}},
+        projection={'longest_run': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+    longest = stats.get('longest_run')
+    if _is_run(before) and longest and longest['activity'] == before['activity']:
+        # the record run got shorter or is gone: another run may hold it now
+        collection.update_one({'user': user_id}, {'$set': {'longest_run': find_longest_run(user_id)}})
+    elif _is_run(after) and (not longest or after['distance'] > longest['distance']):
+        # conditional, so a concurrent longer run is not overwritten
+        collection.update_one(
+            {'user': user_id, '$or': [
+                {'longest_run': None},
+                {'longest_run.distance': {'$lt': after['distance']}}
+            ]},
+            {'$set': {'longest_run': _longest_run(after)}}
+        )
+
+
+def load_stats(user_id, now=None):
+    """The stats screen for a user: all-time totals per type, this week/month/year and the longest run"""
+    keys = period_keys(now or datetime.utcnow())
+    projection = {'_id': 0, 'totals': 1, 'longest_run': 1}
+    projection.update((f"{section}.{key}", 1) for section, key in keys.items())
+    stats = UserStats._get_collection().find_one({'user': user_id}, projection) or {}
+
+    def period(section):
+        totals = stats.get(section, {}).get(keys[section], {})
+        return {metric: totals.get(metric, 0) for metric in METRICS}
+
+    longest = stats.get('longest_run')
+    return {
+        'totals': {
+            activity_type: {metric: totals.get(metric, 0) for metric in METRICS}
+            for activity_type, totals in stats.get('totals', {}).items()
+            if totals.get('count')
+        },
+        'this_week': period('weeks'),
+        'this_month': period('months'),
+        'this_year': period('years'),
+        'longest_run': {
+            'activity_id': str(longest['activity']),
+            'distance': longest['distance'],
+            'duration': longest['duration'],
+            'date': longest['date'].isoformat(),
+        } if longest else None,
+    }
+
+
+def compute_stats(user_ids):
+    """{user_id: stats document} recomputed from the users' activities with a full aggregation"""
+    collection = Activity._get_collection()
+    stats = {}
+
+    rows = collection.aggregate(contribution_pipeline({'user_id': {'$in': user_ids}}) + [
+        {'$group': {
+            '_id': {
+                'user': '$user_id',
+                'type': '$type',
+                'weeks': {'$dateToString': {'format': '%G-W%V', 'date': '$date'}},
+                'months': {'$dateToString': {'format': '%Y-%m', 'date': '$date'}},
+                'years': {'$dateToString': {'format': '%Y', 'date': '$date'}},
+            },
+            'distance': {'$sum': '$distance'},
+            'duration': {'$sum': '$duration'},
+            'calories': {'$sum': '$calories'},
+            'count': {'$sum': 1},
+        }},
+    ], allowDiskUse=True)
+    for row in rows:
+        key = row.pop('_id')
+        doc = stats.setdefault(key['user'], {'user': key['user'], **{section: {} for section in SECTIONS}})
+        for section, bucket in [('totals', key['type'])] + [(section, key[section]) for section in SECTIONS[1:]]:
+            totals = doc[section].setdefault(bucket, dict.fromkeys(METRICS, 0))
+            for metric in METRICS:
+                totals[metric] += row[metric]
+
+    longest_runs = collection.aggregate(contribution_pipeline(
+        {'user_id': {'$in': user_ids}, 'type': LONGEST_TYPE, 'distance': {'$gt': 0}},
+        sort={'distance': -1}
+    ) + [
+        {'$group': {
+            '_id': '$user_id',
+            'activity': {'$first': '$_id'},
+            'distance': {'$first': '$distance'},
+            'duration': {'$first': '$duration'},
+            'date': {'$first': '$date'},
+        }},
+    ], allowDiskUse=True)
+    for run in longest_runs:
+        stats[run.pop('_id')]['longest_run'] = run
+
+    return stats
+
+
+def stats_differences(stored, expected):
+    """Paths ('weeks.2025-W23', 'longest_run', ...) where a stored stats document disagrees"""
+    def buckets(doc):
+        # emptied buckets are left at zero by the decrements
+        return {
+            f"{section}.{key}": totals
+            for section in SECTIONS
+            for key, totals in doc.get(section, {}).items()
+            if totals.get('count')
+        }
+
+    stored_buckets, expected_buckets = buckets(stored), buckets(expected)
+    differences = [
+        path for path in sorted(stored_buckets.keys() | expected_buckets.keys())
+        if not all(
+            # sums accumulated in a different order differ in the last digits
+            math.isclose(
+                stored_buckets.get(path, {}).get(metric, 0),
+                expected_buckets.get(path, {}).get(metric, 0),
+                rel_tol=1e-9, abs_tol=1e-6
+            )
+            for metric in METRICS
+        )
+    ]
+
+    # ties between runs of the same distance are not a difference
+    stored_longest = (stored.get('longest_run') or {}).get('distance')
+    expected_longest = (expected.get('longest_run') or {}).get('distance')
+    if stored_longest != expected_longest:
+        differences.append('longest_run')
+
+    return differences
+
+
+def check_stats(batch_size=500, fix=False):
+    """Compare every user's stats document with a full recomputation.
+
+    Returns (users checked, [(user_id, differing paths), ...]); with fix the
+    documents that differ are replaced by the recomputed ones.
+    """
+    collection = UserStats._get_collection()
+    users = UserProfile._get_collection()
+    last_id = None
+    checked = 0
+    mismatches = []
+
+    while True:
+        # keyset pagination, as in rebuild_suggestions
+        batch_filter = {'_id': {'$gt': last_id}} if last_id else {}
+        batch = [doc['_id'] for doc in users.find(batch_filter, {'_id': 1}).sort('_id', 1).limit(batch_size)]
+        if not batch:
+            break
+        last_id = batch[-1]
+
+        expected = compute_stats(batch)
+        stored = {doc['user']: doc for doc in collection.find({'user': {'$in': batch}})}
+
+        stale = []
+        for user_id in batch:
+            differences = stats_differences(stored.get(user_id, {}), expected.get(user_id, {}))
+            if differences:
+                mismatches.append((user_id, differences))
+                stale.append(user_id)
+        checked += len(batch)
+
+        if fix and stale:
+            now = datetime.utcnow()
+            operations = [DeleteMany({'user': {'$in': stale}})]
+            operations.extend(
+                InsertOne({**expected[user_id], 'updated_at': now}) for user_id in stale if user_id in expected
+            )
+            collection.bulk_write(operations, ordered=True)
+
+    return checked, mismatches
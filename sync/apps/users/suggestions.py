@@ -0,0 +1,171 @@
+import heapq
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from pymongo import UpdateOne, InsertOne, DeleteMany
+
+from .friendships import to_object_id
+from .models import UserProfile, FriendSuggestion
+
+SUGGESTIONS_PER_USER = getattr(settings, 'FRIEND_SUGGESTIONS_PER_USER', 50)
+# friends with more connections than this (celebrity accounts) are skipped when counting mutuals
+SUGGESTIONS_MAX_FANOUT = getattr(settings, 'FRIEND_SUGGESTIONS_MAX_FANOUT', 5000)
+
+
+def compute_suggestions(user_ids, adjacency, limit=SUGGESTIONS_PER_USER, max_fanout=SUGGESTIONS_MAX_FANOUT):
+    """Rank friends-of-friends by mutual friend count.
+
+    adjacency maps every user id in user_ids, and each of their friends, to a set of friend ids.
+    Returns {user_id: [(candidate_id, mutual_count), ...]} ordered by descending count.
+    """
+    suggestions = {}
+
+    for user_id in user_ids:
+        friends = adjacency.get(user_id, set())
+        counts = Counter()
+
+        for friend_id in friends:
+            friends_of_friend = adjacency.get(friend_id, ())
+            if len(friends_of_friend) <= max_fanout:
+                counts.update(friends_of_friend)
+
+        counts.pop(user_id, None)
+        for friend_id in friends:
+            counts.pop(friend_id, None)
+
+        suggestions[user_id] = heapq.nlargest(limit, counts.items(), key=lambda item: item[1])
+
+    return suggestions
+
+
+def load_adjacency(user_ids, adjacency=None):
+    """Fetch the friend id sets of user_ids in a single query, skipping ids already loaded"""
+    adjacency = {} if adjacency is None else adjacency
+    missing = [user_id for user_id in user_ids if user_id not in adjacency]
+
+    if missing:
+        for doc in UserProfile._get_collection().find({'_id': {'$in': missing}}, {'friends': 1}):
+            adjacency[doc['_id']] = {to_object_id(value) for value in doc.get('friends', [])}
+
+    return adjacency
+
+
+def rebuild_suggestions(batch_size=500, limit=SUGGESTIONS_PER_USER, max_fanout=SUGGESTIONS_MAX_FANOUT):
+    """Recompute every user's suggestions, one batch of users and their two-hop neighbourhood at a time"""
+    collection = FriendSuggestion._get_collection()
+    users = UserProfile._get_collection()
+    last_id = None
+    written = 0
+
+    while True:
+        # keyset pagination keeps each batch an index range scan with no long-lived cursor
+        batch_filter = {'_id': {'$gt': last_id}} if last_id else {}
+        batch = [doc['_id'] for doc in users.find(batch_filter, {'_id': 1}).sort('_id', 1).limit(batch_size)]
+        if not batch:
+            break
+        last_id = batch[-1]
+
+        adjacency = load_adjacency(batch)
+        second_hop = set()
+        for user_id in batch:
+            second_hop.update(adjacency.get(user_id, ()))
+        load_adjacency(list(second_hop), adjacency)
+
+        now = datetime.utcnow()
+        operations = [DeleteMany({'user': {'$in': batch}})]
+        for user_id, candidates in compute_suggestions(batch, adjacency, limit, max_fanout).items():
+            for candidate_id, mutual_count in candidates:
+                operations.append(InsertOne({
+                    'user': user_id,
+                    'candidate': candidate_id,
+                    'mutual_count': mutual_count,
+                    'updated_at': now
+                }))
+
+        collection.bulk_write(operations, ordered=True)
+        written += len(operations) - 1
+
+    return written
+
+
+def _mutual_count_operations(user_id, friend_id, adjacency, delta):
+    # every friend x of user_id gains (or loses) user_id as a mutual friend with friend_id
+    now = datetime.utcnow()
+    operations = []
+    user_friends = adjacency.get(user_id, set())
+    friend_friends = adjacency.get(friend_id, set())
+
+    if len(user_friends) > SUGGESTIONS_MAX_FANOUT:
+        return operations
+
+    for other_id in user_friends:
+        if other_id == friend_id or other_id in friend_friends:
+            continue
+        for owner_id, candidate_id in ((other_id, friend_id), (friend_id, other_id)):
+            operations.append(UpdateOne(
+                {'user': owner_id, 'candidate': candidate_id},
+                {'$inc': {'mutual_count': delta}, '$set': {'updated_at': now}},
+                upsert=delta > 0
+            ))
+
+    return operations
+
+
+def friendship_added(user_id, friend_id):
+    """Incrementally update suggestions after user_id and friend_id became friends"""
+    adjacency = load_adjacency([user_id, friend_id])
+
+    operations = [DeleteMany({'$or': [
+        {'user': user_id, 'candidate': friend_id},
+        {'user': friend_id, 'candidate': user_id}
+    ]})]
+    operations += _mutual_count_operations(user_id, friend_id, adjacency, 1)
+    operations += _mutual_count_operations(friend_id, user_id, adjacency, 1)
+
+    FriendSuggestion._get_collection().bulk_write(operations, ordered=True)
+
+
+def friendship_removed(user_id, friend_id):
+    """Incrementally update suggestions after user_id and friend_id stopped being friends"""
+    adjacency = load_adjacency([user_id, friend_id])
+    mutual_count = len(adjacency.get(user_id, set()) & adjacency.get(friend_id, set()))
+    now = datetime.utcnow()
+
+    operations = _mutual_count_operations(user_id, friend_id, adjacency, -1)
+    operations += _mutual_count_operations(friend_id, user_id, adjacency, -1)
+    operations.append(DeleteMany({'mutual_count': {'$lte': 0}, 'user': {'$in': [
+        user_id, friend_id, *adjacency.get(user_id, ()), *adjacency.get(friend_id, ())
+    ]}}))
+
+    # the former friends now suggest each other through whatever friends they still share
+    if mutual_count:
+        for owner_id, candidate_id in ((user_id, friend_id), (friend_id, user_id)):
+            operations.append(UpdateOne(
+                {'user': owner_id, 'candidate': candidate_id},
+                {'$set': {'mutual_count': mutual_count, 'updated_at': now}},
+                upsert=True
+            ))
+
+    FriendSuggestion._get_collection().bulk_write(operations, ordered=True)
+
+
+def get_suggestions(user, exclude_ids=(), limit=20):
+    """Return [(profile, mutual_count), ...] for user, best first"""
+    rows = FriendSuggestion._get_collection().find(
+        {'user': user.id, 'candidate': {'$nin': list(exclude_ids)}},
+        {'candidate': 1, 'mutual_count': 1}
+    ).sort('mutual_count', -1).limit(limit)
+
+    counts = {row['candidate']: row['mutual_count'] for row in rows}
+
+    profiles = UserProfile.objects(id__in=list(counts)).only(
+        'id', 'username', 'full_name', 'profile_picture'
+    )
+    profiles_by_id = {profile.id: profile for profile in profiles}
+
+    return [
+        (profiles_by_id[candidate_id], mutual_count)
+        for candidate_id, mutual_count in counts.items()
+        if candidate_id in profiles_by_id
+    ]
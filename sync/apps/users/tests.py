@@ -7,6 +7,7 @@ class UserProfileModelTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         # Connect to an in-memory MongoDB mock
+        disconnect(alias="default")
         connect(
             "test_db",
             host="mongodb://localhost",
@@ -23,8 +24,8 @@ class UserProfileModelTest(unittest.TestCase):
         # Clear data before each test
         UserProfile.objects.delete()
         # Create some sample users
-        self.user1 = UserProfile(auth0_id="auth0|12345", email="john@example.com", name="John Doe").save()
-        self.user2 = UserProfile(auth0_id="auth0|67890", email="jane@example.com", name="Jane Roe").save()
+        self.user1 = UserProfile(auth0_id="auth0|12345", username="john", email="john@example.com", full_name="John Doe").save()
+        self.user2 = UserProfile(auth0_id="auth0|67890", username="jane", email="jane@example.com", full_name="Jane Roe").save()
 
     def tearDown(self):
         # Clean up after each test (important when using MongoDB)
@@ -33,10 +34,1793 @@ class UserProfileModelTest(unittest.TestCase):
     def test_userprofile_creation(self):
         user = UserProfile.objects.get(auth0_id="auth0|12345")
         self.assertEqual(user.email, "john@example.com")
-        self.assertEqual(user.name, "John Doe")
+        self.assertEqual(user.full_name, "John Doe")
 
     def test_unique_auth0_id(self):
         with self.assertRaises(Exception):
             # Try to create another user with same auth0_id — should raise an error
-            UserProfile(auth0_id="auth0|12345", email="duplicate@example.com").save()
+            UserProfile(auth0_id="auth0|12345", username="duplicate", email="duplicate@example.com").save()
+
+    def test_profile_update_bumps_version_in_the_same_write(self):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from config.instrumentation import instrument_mongomock, track_queries
+        from .views import ProfileView
+        instrument_mongomock()
+
+        request = APIRequestFactory().put('/', {'full_name': 'John Smith'}, format='json')
+        force_authenticate(request, user=UserProfile.objects.get(id=self.user1.id))
+        with track_queries() as stats:
+            response = ProfileView.as_view()(request)
+
+        self.assertEqual(response.data['full_name'], 'John Smith')
+        # one write to the profile (the search cache invalidation goes to the cache collection)
+        writes = [shape for shape, _, _ in stats.commands if shape[1] == 'users' and shape[0] != 'find']
+        self.assertEqual(writes, [('update', 'users', ('_id',))])
+        stored = UserProfile.objects.get(id=self.user1.id)
+        self.assertEqual((stored.full_name, stored.version), ('John Smith', 1))
+
+
+
+class SearchUsersCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        from .search import search_cache
+        search_cache.clear()
+        UserProfile.objects.delete()
+        self.john = UserProfile(auth0_id="auth0|1", username="john_runner", email="john@example.com", full_name="John Doe").save()
+        self.jane = UserProfile(auth0_id="auth0|2", username="jane_cyclist", email="jane@example.com", full_name="Jane Roe").save()
+
+    def tearDown(self):
+        UserProfile.objects.delete()
+
+    def test_search_by_id(self):
+        from .search import search_users
+        self.assertEqual(search_users(str(self.jane.id)), [self.jane])
+
+    def test_search_is_cached_per_normalized_query(self):
+        from .search import search_users, search_cache
+        self.assertEqual(search_users("JO"), [self.john])
+        self.assertEqual(search_cache.get("jo"), [self.john.id])
+        self.assertEqual(search_users(" jo "), [self.john])
+
+    def test_profile_change_invalidates_matching_queries(self):
+        from .search import search_users, search_cache, invalidate_profile
+        self.assertEqual(search_users("ro"), [self.jane])
+        self.assertEqual(search_users("doe"), [self.john])
+        self.assertEqual(search_users("cycl"), [self.jane])
+
+        previous = {'username': self.john.username, 'full_name': self.john.full_name}
+        self.john.full_name = "John Rogers"
+        self.john.save()
+        invalidate_profile(self.john, previous)
+
+        # queries matching the old or the new name are dropped, the others stay cached
+        self.assertEqual(search_cache.get_many(["ro", "doe", "cycl"]), {"cycl": [self.jane.id]})
+        self.assertEqual(search_users("ro"), [self.john, self.jane])
+        self.assertEqual(search_users("doe"), [])
+
+        # a new profile drops every query matching it
+        search_users("ali")
+        alice = UserProfile(auth0_id="auth0|3", username="alice", email="al@example.com").save()
+        invalidate_profile(alice)
+        self.assertEqual(search_users("ali"), [alice])
+        self.assertEqual(search_cache.get("cycl"), [self.jane.id])
+
+    def test_matching_queries(self):
+        from .search import matching_queries
+        self.assertEqual(matching_queries("Jo D"), {"j", "o", "d", "jo", "o d", "jo d"})
+        self.assertEqual(matching_queries(None), set())
+
+    def test_clear_invalidates_namespace(self):
+        from .cache import SharedCache
+        cache = SharedCache("test", ttl=60)
+        other = SharedCache("other", ttl=60)
+        cache.set_many({"a": 1, "b b": 2})
+        other.set("a", 3)
+
+        self.assertEqual(cache.get_many(["a", "b b", "c"]), {"a": 1, "b b": 2})
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(other.get("a"), 3)
+
+    def test_hit_reads_generation_and_entry_together(self):
+        from config.instrumentation import instrument_mongomock, track_queries
+        from .cache import SharedCache
+        instrument_mongomock()
+        cache = SharedCache("test", ttl=60)
+        cache.set("a", [1, 2])
+
+        with track_queries() as stats:
+            self.assertEqual(cache.get("a"), [1, 2])
+        self.assertEqual(stats.count, 1)
+
+        # written before the clear, so stale even though it is still stored
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", [3])
+        self.assertEqual(cache.get("a"), [3])
+
+
+class MongoCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        from config.cache import MongoCache
+        self.cache = MongoCache("test_cache", {})
+        self.cache.clear()
+
+    def test_set_get_and_expiry(self):
+        from datetime import datetime
+        self.cache.set("profile", {"name": "John"}, 60)
+        self.cache.set("expired", "x", 60)
+        self.cache.collection.update_one(
+            {"_id": self.cache.make_key("expired")}, {"$set": {"expires_at": datetime(2000, 1, 1)}}
+        )
+
+        self.assertEqual(self.cache.get("profile"), {"name": "John"})
+        self.assertIsNone(self.cache.get("expired"))
+        self.assertTrue(self.cache.add("expired", "y"))
+        self.assertFalse(self.cache.add("profile", "other"))
+        self.assertEqual(self.cache.get_many(["profile", "expired", "missing"]), {"profile": {"name": "John"}, "expired": "y"})
+
+    def test_incr_is_a_server_side_update(self):
+        self.cache.set("counter", 1, None)
+        self.assertEqual(self.cache.incr("counter", 5), 6)
+        self.assertEqual(self.cache.decr("counter"), 5)
+        self.assertEqual(self.cache.collection.find_one({"_id": self.cache.make_key("counter")})["value"], 5)
+
+        self.cache.set("text", "1")
+        with self.assertRaises(ValueError):
+            self.cache.incr("text")
+
+    def test_entries_are_shared_between_backend_instances(self):
+        from config.cache import MongoCache
+        self.cache.set_many({"a": 1, "b": [2]})
+        other_worker = MongoCache("test_cache", {})
+        self.assertEqual(other_worker.get_many(["a", "b"]), {"a": 1, "b": [2]})
+        other_worker.delete_many(["a"])
+        self.assertFalse(self.cache.has_key("a"))
+
+
+class FriendshipStoreTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        UserProfile.objects.delete()
+        self.john = UserProfile(auth0_id="auth0|1", username="john", email="john@example.com").save()
+        self.jane = UserProfile(auth0_id="auth0|2", username="jane", email="jane@example.com").save()
+
+    def tearDown(self):
+        UserProfile.objects.delete()
+
+    def test_add_and_remove_friendship(self):
+        from .friendships import add_friendship, remove_friendship, friend_ids, are_friends
+        add_friendship(self.john.id, self.jane.id)
+        add_friendship(self.john.id, self.jane.id)
+
+        self.john.reload()
+        self.jane.reload()
+        self.assertEqual(friend_ids(self.john), [self.jane.id])
+        self.assertTrue(are_friends(self.jane, self.john.id))
+
+        remove_friendship(self.jane.id, self.john.id)
+        self.john.reload()
+        self.assertEqual(friend_ids(self.john), [])
+
+    def test_mutual_friend_counts(self):
+        from .friendships import add_friendship, sorted_friend_ids, count_common_friends, friend_ids_cache
+        friend_ids_cache.clear()
+        mike = UserProfile(auth0_id="auth0|3", username="mike", email="mike@example.com").save()
+        emma = UserProfile(auth0_id="auth0|4", username="emma", email="emma@example.com").save()
+        add_friendship(self.john.id, mike.id)
+        add_friendship(self.john.id, emma.id)
+        add_friendship(self.jane.id, mike.id)
+
+        packed = sorted_friend_ids([self.john.id, self.jane.id])
+        self.assertEqual(count_common_friends(packed[self.john.id], packed[self.jane.id]), 1)
+
+        add_friendship(self.jane.id, emma.id)
+        packed = sorted_friend_ids([self.john.id, self.jane.id])
+        self.assertEqual(count_common_friends(packed[self.john.id], packed[self.jane.id]), 2)
+
+    def test_accept_is_conditional_on_pending(self):
+        from .friendships import accept_friend_request, friend_ids
+        from .models import FriendRequest
+        friend_request = FriendRequest(sender=self.john, receiver=self.jane).save()
+
+        self.assertIsNone(accept_friend_request(str(friend_request.id), self.john.id))
+        self.assertEqual(accept_friend_request(str(friend_request.id), self.jane.id)['status'], 'accepted')
+        self.assertIsNone(accept_friend_request(str(friend_request.id), self.jane.id))
+
+        self.john.reload()
+        self.assertEqual(friend_ids(self.john), [self.jane.id])
+        FriendRequest.objects.delete()
+
+    def test_reject_removes_requests_between_pair(self):
+        from .friendships import reject_friend_request
+        from .models import FriendRequest
+        friend_request = FriendRequest(sender=self.john, receiver=self.jane).save()
+        FriendRequest(sender=self.jane, receiver=self.john, status='rejected').save()
+
+        self.assertIsNotNone(reject_friend_request(str(friend_request.id), self.jane.id))
+        self.assertEqual(FriendRequest.objects.count(), 0)
+
+    def test_transaction_support_is_asked_of_the_server(self):
+        from unittest import mock
+        from pymongo import MongoClient
+        from pymongo.database import Database
+        from pymongo.errors import ServerSelectionTimeoutError
+        from .friendships import supports_transactions
+
+        for hello, expected in (({'setName': 'rs0'}, True), ({'msg': 'isdbgrid'}, True), ({'isWritablePrimary': True}, False)):
+            client = MongoClient('mongodb://localhost:1', connect=False)
+            # an unreachable server decides nothing; the first answer is kept
+            replies = [ServerSelectionTimeoutError('down'), hello]
+            with mock.patch.object(Database, 'command', side_effect=replies) as command:
+                with self.assertRaises(ServerSelectionTimeoutError):
+                    supports_transactions(client)
+                self.assertEqual(supports_transactions(client), expected)
+                self.assertEqual(supports_transactions(client), expected)
+            self.assertEqual(command.call_count, 2)
+            client.close()
+
+        self.assertFalse(supports_transactions(mongomock.MongoClient()))
+
+
+class FriendSuggestionsTest(unittest.TestCase):
+    def test_ranks_friends_of_friends_by_mutual_count(self):
+        from .suggestions import compute_suggestions
+        adjacency = {
+            'ann': {'bob', 'cat'},
+            'bob': {'ann', 'cat', 'dan', 'eve'},
+            'cat': {'ann', 'bob', 'dan'},
+            'dan': {'bob', 'cat'},
+            'eve': {'bob'},
+        }
+
+        suggestions = compute_suggestions(['ann'], adjacency, limit=10, max_fanout=10)
+        self.assertEqual(suggestions['ann'], [('dan', 2), ('eve', 1)])
+
+    def test_skips_friends_above_max_fanout(self):
+        from .suggestions import compute_suggestions
+        adjacency = {'ann': {'hub'}, 'hub': {'ann', 'bob', 'cat'}}
+
+        self.assertEqual(compute_suggestions(['ann'], adjacency, max_fanout=2)['ann'], [])
+
+
+class ETagTest(unittest.TestCase):
+    def test_if_none_match_parsing(self):
+        from rest_framework.test import APIRequestFactory
+        from .etags import make_etag, etag_matches
+        factory = APIRequestFactory()
+        etag = make_etag('profile', 1, 2)
+
+        self.assertEqual(etag, make_etag('profile', 1, 2))
+        self.assertNotEqual(etag, make_etag('profile', 1, 3))
+        self.assertTrue(etag_matches(factory.get('/', HTTP_IF_NONE_MATCH=f'"other", W/{etag}'), etag))
+        self.assertTrue(etag_matches(factory.get('/', HTTP_IF_NONE_MATCH='*'), etag))
+        self.assertFalse(etag_matches(factory.get('/', HTTP_IF_NONE_MATCH='"other"'), etag))
+        self.assertFalse(etag_matches(factory.get('/'), etag))
+
+    def test_only_successes_carry_the_etag(self):
+        from rest_framework.response import Response
+        from rest_framework.test import APIRequestFactory
+        from .etags import make_etag, conditional_response
+        factory = APIRequestFactory()
+        etag = make_etag('activity', 1)
+
+        self.assertEqual(conditional_response(factory.get('/'), etag, lambda: Response({}))['ETag'], etag)
+        self.assertEqual(
+            conditional_response(factory.get('/', HTTP_IF_NONE_MATCH=etag), etag, None)['ETag'], etag
+        )
+        missing = conditional_response(factory.get('/'), etag, lambda: Response({}, status=404))
+        self.assertFalse(missing.has_header('ETag'))
+        self.assertEqual(missing['Cache-Control'], 'private, no-cache')
+
+
+class ORJSONRendererTest(unittest.TestCase):
+    def test_matches_default_renderer(self):
+        from datetime import date, datetime, time, timedelta, timezone
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+        from .serializers import LiveDataPointSerializer
+
+        data = {
+            "name": "Café run",
+            "points": LiveDataPointSerializer([{"timestamp": datetime(2025, 6, 1, 7, 0, 0, 123)}], many=True).data,
+            "distance": 5.25,
+            "empty": None,
+            # raw values, as views put them in responses
+            "naive": datetime(2025, 6, 1, 7, 0, 0, 123456),
+            "utc": datetime(2025, 6, 1, 7, 0, 0, 120000, tzinfo=timezone.utc),
+            "offset": datetime(2025, 6, 1, 7, tzinfo=timezone(timedelta(hours=-5))),
+            "day": date(2025, 6, 1),
+            "time": time(7, 0, 0, 5),
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+        # DRF refuses non-finite floats; they render as null
+        for value in (float('nan'), float('inf'), float('-inf')):
+            self.assertEqual(ORJSONRenderer().render({"pace": value}), b'{"pace":null}')
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({"pace": value})
+
+
+class FastSerializerParityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        from datetime import datetime
+        from .friendships import add_friendship
+        from .models import Activity, LiveDataPoint
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+
+        self.john = UserProfile(
+            auth0_id="auth0|1", username="john", email="john@example.com", full_name="John Doe",
+            age=28, gender="M", challenges=["5k"]
+        ).save()
+        self.jane = UserProfile(
+            auth0_id="auth0|2", username="jane", email="jane@example.com", profile_picture="jane.png"
+        ).save()
+        self.mike = UserProfile(auth0_id="auth0|3", username="mike", email="mike@example.com").save()
+        add_friendship(self.john.id, self.jane.id)
+        add_friendship(self.john.id, self.mike.id)
+
+        Activity(activity_name="Planned", user_id=self.john, type="gym").save()
+        Activity(
+            activity_name="Morning Run", user_id=self.john, type="running", status="completed",
+            start_time=datetime(2025, 6, 1, 7, 0), end_time=datetime(2025, 6, 1, 7, 45, 12, 345000),
+            distance=8.5, calories=540.25, avg_time=5.3, participants=[self.jane, self.mike],
+            route="_p~iF~ps|U_ulLnnqC",
+            live_data=[
+                LiveDataPoint(timestamp=datetime(2025, 6, 1, 7, 0), latitude=40.71, longitude=-74.0, heart_rate=120),
+                LiveDataPoint(timestamp=datetime(2025, 6, 1, 7, 1), speed=3.1, calories=12.5),
+            ]
+        ).save()
+        Activity(activity_name="Hike", user_id=self.jane, type="hiking", status="in_progress").save()
+
+    def tearDown(self):
+        from .models import Activity
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+
+    def assertSameJSON(self, fast, regular):
+        # compare rendered bytes so key order is checked too
+        from .renderers import ORJSONRenderer
+        self.assertEqual(ORJSONRenderer().render(fast), ORJSONRenderer().render(regular))
+
+    def test_activity_plan(self):
+        from .fast_serializers import ACTIVITY_PLAN, render_queryset
+        from .models import Activity
+        from .serializers import ActivitySerializer
+
+        activities = Activity.objects.order_by('-created_at')
+        self.assertSameJSON(render_queryset(ACTIVITY_PLAN, activities), ActivitySerializer(activities, many=True).data)
+
+    def test_activity_summary_plan(self):
+        from .fast_serializers import ACTIVITY_SUMMARY_PLAN, render_queryset
+        from .models import Activity
+        from .serializers import ActivitySummarySerializer
+
+        activities = Activity.objects.order_by('-created_at')
+        fast = render_queryset(ACTIVITY_SUMMARY_PLAN, activities)
+        self.assertSameJSON(fast, ActivitySummarySerializer(activities, many=True).data)
+        self.assertNotIn('live_data', ACTIVITY_SUMMARY_PLAN.projection)
+        self.assertEqual({item['activity_name']: item['route'] for item in fast}, {
+            "Planned": None, "Morning Run": "_p~iF~ps|U_ulLnnqC", "Hike": None
+        })
+
+    def test_user_profile_plan(self):
+        from .fast_serializers import USER_PROFILE_PLAN, render_documents, render_queryset
+        from .serializers import UserProfileSerializer
+
+        users = UserProfile.objects.order_by('username')
+        self.assertSameJSON(render_queryset(USER_PROFILE_PLAN, users), UserProfileSerializer(users, many=True).data)
+
+        john = UserProfile.objects.get(id=self.john.id)
+        self.assertSameJSON(render_documents(USER_PROFILE_PLAN, [john.to_mongo()])[0], UserProfileSerializer(john).data)
+
+    def test_user_profile_basic_plan(self):
+        from .fast_serializers import USER_PROFILE_BASIC_PLAN, render_queryset
+        from .serializers import UserProfileBasicSerializer
+
+        users = UserProfile.objects.order_by('username')
+        self.assertSameJSON(
+            render_queryset(USER_PROFILE_BASIC_PLAN, users), UserProfileBasicSerializer(users, many=True).data
+        )
+
+    def test_notification_plan(self):
+        from bson import ObjectId
+        from .fast_serializers import NOTIFICATION_PLAN, render_queryset
+        from .models import Notification
+        from .serializers import NotificationSerializer
+
+        Notification.objects.delete()
+        Notification(user=self.john, seq=1, type='friend_request', actor=self.jane, friend_request=ObjectId()).save()
+        Notification(user=self.john, seq=2, type='friend_request_accepted', actor=self.mike).save()
+
+        notifications = Notification.objects.order_by('seq')
+        self.assertSameJSON(
+            render_queryset(NOTIFICATION_PLAN, notifications), NotificationSerializer(notifications, many=True).data
+        )
+        Notification.objects.delete()
+
+
+class LiveChannelLayerTest(unittest.TestCase):
+    def test_fan_out_to_many_subscribers(self):
+        import asyncio
+        from .live import InProcessChannelLayer
+
+        async def run():
+            layer = InProcessChannelLayer(max_pending_points=1000)
+            subscriptions = [layer.subscribe('activity.a') for _ in range(500)]
+            other = layer.subscribe('activity.b')
+
+            for start in range(0, 30, 3):
+                layer.publish('activity.a', {'start': start, 'points': [start, start + 1, start + 2]})
+            layer.publish('activity.a', {'status': 'completed'})
+
+            events = await asyncio.gather(*(subscription.get(timeout=1) for subscription in subscriptions))
+            self.assertIsNone(await other.get(timeout=0.01))
+
+            for subscription in subscriptions:
+                layer.unsubscribe('activity.a', subscription)
+            self.assertEqual(layer.groups, {'activity.b': {other}})
+            return events
+
+        events = asyncio.run(run())
+        # every subscriber receives all queued messages as one coalesced event
+        self.assertEqual(len(events), 500)
+        for event in events:
+            self.assertEqual(event, {'start': 0, 'points': list(range(30)), 'status': 'completed'})
+
+    def test_slow_subscriber_keeps_newest_points(self):
+        import asyncio
+        from .live import InProcessChannelLayer
+
+        async def run():
+            layer = InProcessChannelLayer(max_pending_points=10)
+            subscription = layer.subscribe('activity.a')
+            for start in range(0, 40, 4):
+                layer.publish('activity.a', {'start': start, 'points': list(range(start, start + 4))})
+            await asyncio.sleep(0)
+            return subscription, await subscription.get(timeout=1)
+
+        subscription, event = asyncio.run(run())
+        self.assertEqual(event, {'start': 32, 'points': list(range(32, 40))})
+        self.assertEqual(subscription.dropped_points, 32)
+
+    def test_backpressure_keeps_reset_and_status(self):
+        import asyncio
+        from .live import InProcessChannelLayer
+
+        async def run():
+            layer = InProcessChannelLayer(max_pending_points=10)
+            subscription = layer.subscribe('activity.a')
+            layer.publish('activity.a', {'start': 0, 'points': list(range(6))})
+            layer.publish('activity.a', {'reset': True, 'start': 0, 'points': list(range(100, 106))})
+            layer.publish('activity.a', {'start': 6, 'points': list(range(106, 112))})
+            layer.publish('activity.a', {'status': 'completed'})
+            await asyncio.sleep(0)
+            return subscription, await subscription.get(timeout=1)
+
+        subscription, event = asyncio.run(run())
+        # the replaced track's first points are gone, not the fact that it was replaced
+        self.assertEqual(event, {'reset': True, 'start': 6, 'points': list(range(106, 112)), 'status': 'completed'})
+        self.assertEqual(subscription.dropped_points, 12)
+
+    def test_broker_layer_delivers_across_nodes(self):
+        import asyncio
+        from .live import BrokerChannelLayer, LocalBroker
+
+        async def run():
+            broker = LocalBroker()
+            nodes = [BrokerChannelLayer(broker) for _ in range(3)]
+            subscriptions = [node.subscribe('activity.a') for node in nodes for _ in range(100)]
+            nodes[0].publish('activity.a', {'reset': True, 'start': 0, 'points': [1]})
+            return await asyncio.gather(*(subscription.get(timeout=1) for subscription in subscriptions))
+
+        events = asyncio.run(run())
+        self.assertEqual(len(events), 300)
+        self.assertTrue(all(event == {'reset': True, 'start': 0, 'points': [1]} for event in events))
+
+    def test_redis_broker_delivers_across_processes(self):
+        import asyncio
+        import fnmatch
+        from datetime import datetime
+        from .live import BrokerChannelLayer, RedisBroker
+
+        class FakeRedis:
+            """Pub/sub of one server shared by the clients of several processes"""
+
+            def __init__(self, handlers):
+                self.handlers = handlers
+
+            def publish(self, channel, data):
+                for pattern, handler in list(self.handlers):
+                    if fnmatch.fnmatchcase(channel, pattern):
+                        handler({'channel': channel.encode(), 'data': data.encode()})
+
+            def pubsub(self, **kwargs):
+                return self
+
+            def psubscribe(self, **handlers):
+                self.handlers.extend(handlers.items())
+
+            def run_in_thread(self, **kwargs):
+                return object()
+
+        async def run():
+            handlers = []
+            # one broker per process, all on the same server
+            nodes = [BrokerChannelLayer(RedisBroker(client=FakeRedis(handlers), prefix='live:')) for _ in range(2)]
+            subscriptions = [node.subscribe('activity.a') for node in nodes]
+            nodes[0].publish('activity.a', {'start': 0, 'points': [{'timestamp': datetime(2025, 6, 1, 7)}]})
+            nodes[1].publish('inbox.b', {'seq': 3})
+            return await asyncio.gather(*(subscription.get(timeout=1) for subscription in subscriptions))
+
+        events = asyncio.run(run())
+        self.assertEqual(events, [{'start': 0, 'points': [{'timestamp': '2025-06-01T07:00:00'}]}] * 2)
+
+
+class NotificationInboxTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Notification
+        cache.clear()
+        UserProfile.objects.delete()
+        Notification.objects.delete()
+        self.john = UserProfile(auth0_id="auth0|1", username="john", email="john@example.com").save()
+        self.jane = UserProfile(auth0_id="auth0|2", username="jane", email="jane@example.com").save()
+
+    def tearDown(self):
+        from .models import Notification
+        UserProfile.objects.delete()
+        Notification.objects.delete()
+
+    def test_sequence_advances_per_user(self):
+        from .notifications import notify, latest_seq, notifications_since
+
+        self.assertEqual(latest_seq(self.jane.id), 0)
+        self.assertEqual(notify(self.jane.id, 'friend_request', self.john.id), 1)
+        self.assertEqual(notify(self.jane.id, 'friend_request_accepted', self.john.id), 2)
+        self.assertEqual(notify(self.john.id, 'friend_request', self.jane.id), 1)
+
+        self.assertEqual(latest_seq(self.jane.id), 2)
+        self.assertEqual(
+            [(n.seq, n.type) for n in notifications_since(self.jane.id, 1)],
+            [(2, 'friend_request_accepted')]
+        )
+
+    def test_seq_is_published_after_its_notification(self):
+        from django.core.cache import cache
+        from .models import Notification
+        from .notifications import notify, latest_seq, notifications_since, raise_cached_seq, seq_cache_key
+
+        notify(self.jane.id, 'friend_request', self.john.id)
+        # a concurrent notify that stored seq 2 and has not published it yet
+        Notification(user=self.jane, seq=2, type='friend_request', actor=self.john).save()
+        self.assertEqual(latest_seq(self.jane.id), 1)
+
+        self.assertEqual(notify(self.jane.id, 'friend_request_accepted', self.john.id), 3)
+        self.assertEqual(UserProfile.objects.get(id=self.jane.id).notification_seq, 3)
+        self.assertEqual([n.seq for n in notifications_since(self.jane.id, 0)], [1, 2, 3])
+
+        # the cached seq only moves forward, whichever writer comes last
+        raise_cached_seq(self.jane.id, 2)
+        self.assertEqual(cache.get(seq_cache_key(self.jane.id)), 3)
+        cache.delete(seq_cache_key(self.jane.id))
+        raise_cached_seq(self.jane.id, 4)
+        self.assertEqual(latest_seq(self.jane.id), 4)
+
+    def test_notify_wakes_inbox_subscribers(self):
+        import asyncio
+        from .live import get_channel_layer
+        from .notifications import notify, inbox_group
+
+        async def run():
+            layer = get_channel_layer()
+            subscription = layer.subscribe(inbox_group(self.jane.id))
+            try:
+                notify(self.jane.id, 'friend_request', self.john.id)
+                return await subscription.get(timeout=1)
+            finally:
+                layer.unsubscribe(inbox_group(self.jane.id), subscription)
+
+        self.assertEqual(asyncio.run(run()), {'seq': 1})
+
+
+class AsyncMongomockCursor:
+    """The slice of AsyncCursor the async views use, over a mongomock cursor"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args):
+        self.cursor = self.cursor.sort(*args)
+        return self
+
+    def limit(self, limit):
+        self.cursor = self.cursor.limit(limit)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.cursor)
+
+    async def __aiter__(self):
+        for doc in self.cursor:
+            yield doc
+
+
+class AsyncMongomockCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return AsyncMongomockCursor(self.collection.find(*args, **kwargs))
+
+
+class AsyncViewsTest(unittest.TestCase):
+    """The async views answer like their sync counterparts (apps.users.async_views)"""
+
+    @classmethod
+    def setUpClass(cls):
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        from datetime import datetime
+        from unittest import mock
+        from django.core.cache import cache
+        from .friendships import add_friendship, friend_ids_cache
+        from .models import Activity, LiveDataPoint, Notification
+        from .search import search_cache
+        cache.clear()
+        search_cache.clear()
+        friend_ids_cache.clear()
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+        Notification.objects.delete()
+
+        self.john = UserProfile(auth0_id="auth0|1", username="john", email="john@example.com", full_name="John Doe").save()
+        self.jane = UserProfile(auth0_id="auth0|2", username="jane", email="jane@example.com").save()
+        add_friendship(self.john.id, self.jane.id)
+        self.john.reload()
+        Activity(activity_name="Ride", user_id=self.john, type="cycling", participants=[self.jane]).save()
+        self.run_activity = Activity(
+            activity_name="Run", user_id=self.jane, type="running", status="in_progress",
+            start_time=datetime(2025, 6, 1, 7), route="_p~iF~ps|U",
+            live_data=[LiveDataPoint(timestamp=datetime(2025, 6, 1, 7, 0, i), heart_rate=100 + i) for i in range(3)]
+        ).save()
+
+        # the views' AsyncMongoClient, served by the tests' mongomock database
+        database = UserProfile._get_db()
+        patcher = mock.patch(
+            'apps.users.async_db.get_async_db',
+            lambda: {name: AsyncMongomockCollection(database[name]) for name in database.list_collection_names()}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        from .models import Activity, Notification
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+        Notification.objects.delete()
+
+    def headers(self, user):
+        from .jwt_utils import generate_jwt_token
+        return {'HTTP_AUTHORIZATION': f"Bearer {generate_jwt_token(str(user.id), user.email)}"}
+
+    def get_async(self, view, path, user=None, headers=None, **kwargs):
+        import asyncio
+        from django.test import RequestFactory
+        request = RequestFactory().get(path, **(headers if headers is not None else self.headers(user)))
+        return asyncio.run(view.as_view()(request, **kwargs))
+
+    def options_async(self, view, path, headers, **kwargs):
+        import asyncio
+        from django.test import RequestFactory
+        return asyncio.run(view.as_view()(RequestFactory().options(path, **headers), **kwargs))
+
+    def get_sync(self, view, path, user, **kwargs):
+        from rest_framework.test import APIRequestFactory
+        request = APIRequestFactory().get(path, **self.headers(user))
+        response = view.as_view()(request, **kwargs)
+        response.render()
+        return response
+
+    def test_unauthenticated_requests_match_the_sync_views(self):
+        from . import async_views, views
+
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Token abc'}, {'HTTP_AUTHORIZATION': 'Bearer abc'}):
+            with self.subTest(headers=headers):
+                from rest_framework.test import APIRequestFactory
+                expected = views.ActivitiesListView.as_view()(APIRequestFactory().get('/', **headers))
+                expected.render()
+                for view in (async_views.AsyncActivitiesListView, async_views.AsyncNotificationsPollView):
+                    response = self.get_async(view, '/', headers=headers)
+                    self.assertEqual(response.status_code, 401)
+                    self.assertEqual(response.content, expected.content)
+                    self.assertEqual(response['WWW-Authenticate'], expected['WWW-Authenticate'])
+
+                    # options is answered without credentials, listing the view's methods
+                    response = self.options_async(view, '/', headers=headers)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response['Allow'], 'GET, HEAD, OPTIONS')
+                    self.assertEqual(response.content, b'')
+
+    def test_reads_match_the_sync_views(self):
+        from . import async_views, views
+
+        activity_id = str(self.run_activity.id)
+        pairs = {
+            'activities_list': (views.ActivitiesListView, async_views.AsyncActivitiesListView, '/', {}),
+            'friends_activities': (views.FriendsActivitiesView, async_views.AsyncFriendsActivitiesView, '/', {}),
+            'activity_detail': (
+                views.ActivityDetailView, async_views.AsyncActivityDetailView, '/', {'activity_id': activity_id}
+            ),
+            'search_users': (views.SearchUsersView, async_views.AsyncSearchUsersView, '/?q=ja', {}),
+        }
+        for name, (sync_view, async_view, path, kwargs) in pairs.items():
+            with self.subTest(endpoint=name):
+                expected = self.get_sync(sync_view, path, self.john, **kwargs)
+                response = self.get_async(async_view, path, self.john, **kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+
+        missing = self.get_async(async_views.AsyncActivityDetailView, '/', self.john, activity_id='nope')
+        self.assertEqual(missing.status_code, 404)
+
+    def test_search_fills_and_reads_the_shared_cache(self):
+        from .async_views import AsyncSearchUsersView
+        from .search import search_cache
+
+        first = self.get_async(AsyncSearchUsersView, '/?q=JO', self.jane)
+        self.assertEqual(search_cache.get('jo'), [self.john.id])
+
+        # served from the cached ids, which are only resolved to current profiles
+        UserProfile.objects(id=self.john.id).update_one(set__full_name="John Smith")
+        second = self.get_async(AsyncSearchUsersView, '/?q=jo', self.jane)
+        self.assertIn(b'John Smith', second.content)
+        self.assertEqual(first.content.replace(b'John Doe', b'John Smith'), second.content)
+        self.assertEqual(self.get_async(AsyncSearchUsersView, '/?q=%20', self.jane).status_code, 400)
+
+    def test_live_stream_catches_up_then_follows_pushes(self):
+        import asyncio
+        import orjson
+        from .async_views import AsyncActivityLiveStreamView
+        from .live import get_channel_layer, activity_group
+
+        group = activity_group(self.run_activity.id)
+
+        def parse(chunk):
+            fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+            return fields['event'], fields.get('id'), orjson.loads(fields['data'])
+
+        async def run():
+            from django.test import RequestFactory
+            request = RequestFactory().get('/?since=1', **self.headers(self.john))
+            response = await AsyncActivityLiveStreamView.as_view()(request, activity_id=str(self.run_activity.id))
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = aiter(response.streaming_content)
+
+            events = [parse(await anext(stream))]
+            layer = get_channel_layer()
+            # overlaps the catch-up by one point, which is not sent twice
+            layer.publish(group, {'start': 2, 'points': [{'heart_rate': 102}, {'heart_rate': 103}]})
+            events.append(parse(await anext(stream)))
+            layer.publish(group, {'reset': True, 'start': 0, 'points': [{'heart_rate': 90}]})
+            events.append(parse(await anext(stream)))
+            layer.publish(group, {'status': 'completed'})
+            events.append(parse(await anext(stream)))
+            with self.assertRaises(StopAsyncIteration):
+                await anext(stream)
+            return events
+
+        events = asyncio.run(run())
+        self.assertEqual([(event, event_id) for event, event_id, _ in events], [
+            ('points', '3'), ('points', '4'), ('reset', '1'), ('status', None)
+        ])
+        self.assertEqual([point['heart_rate'] for point in events[0][2]['points']], [101, 102])
+        self.assertEqual(events[1][2], {'start': 3, 'points': [{'heart_rate': 103}]})
+        self.assertEqual(events[3][2], {'status': 'completed'})
+        self.assertEqual(get_channel_layer().groups.get(group), None)
+
+        # only the owner, participants and the owner's friends may watch
+        stranger = UserProfile(auth0_id="auth0|3", username="mike", email="mike@example.com").save()
+        response = self.get_async(AsyncActivityLiveStreamView, '/', stranger, activity_id=str(self.run_activity.id))
+        self.assertEqual(response.status_code, 403)
+
+    def test_notification_pages_continue_where_the_last_one_ended(self):
+        import orjson
+        from .async_views import AsyncNotificationsPollView
+        from .notifications import notify, NOTIFICATIONS_PAGE_SIZE
+        from .views import NotificationsView
+
+        for _ in range(NOTIFICATIONS_PAGE_SIZE + 10):
+            notify(self.john.id, 'friend_request', self.jane.id)
+
+        for view, get in ((NotificationsView, self.get_sync), (AsyncNotificationsPollView, self.get_async)):
+            with self.subTest(view=view.__name__):
+                received, since = [], 0
+                for _ in range(3):
+                    page = orjson.loads(get(view, f'/?since={since}&timeout=0', self.john).content)
+                    received += [notification['seq'] for notification in page['notifications']]
+                    since = page['seq']
+                self.assertEqual(received, list(range(1, NOTIFICATIONS_PAGE_SIZE + 11)))
+                self.assertEqual(since, NOTIFICATIONS_PAGE_SIZE + 10)
+
+    def test_long_poll_returns_new_notifications_or_times_out(self):
+        import asyncio
+        import orjson
+        from unittest import mock
+        from django.test import RequestFactory
+        from .async_views import AsyncNotificationsPollView
+        from .notifications import notify
+        from .views import NotificationsView
+
+        self.assertEqual(
+            orjson.loads(self.get_async(AsyncNotificationsPollView, '/?timeout=0', self.john).content),
+            {'seq': 0, 'notifications': []}
+        )
+
+        async def run():
+            request = RequestFactory().get('/?since=0&timeout=5', **self.headers(self.john))
+            poll = asyncio.ensure_future(AsyncNotificationsPollView.as_view()(request))
+            await asyncio.sleep(0.01)
+            self.assertFalse(poll.done())
+            notify(self.john.id, 'friend_request', self.jane.id)
+            return await asyncio.wait_for(poll, 1)
+
+        response = asyncio.run(run())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.get_sync(NotificationsView, '/?since=0', self.john).content)
+        self.assertEqual(self.get_async(AsyncNotificationsPollView, '/?since=x', self.john).status_code, 400)
+
+        # a notify in another process (no shared broker) is picked up from the cache when the poll times out
+        async def elsewhere():
+            request = RequestFactory().get('/?since=1&timeout=1', **self.headers(self.john))
+            poll = asyncio.ensure_future(AsyncNotificationsPollView.as_view()(request))
+            await asyncio.sleep(0.01)
+            with mock.patch('apps.users.notifications.get_channel_layer'):
+                notify(self.john.id, 'friend_request', self.jane.id)
+            return await asyncio.wait_for(poll, 2)
+
+        page = orjson.loads(asyncio.run(elsewhere()).content)
+        self.assertEqual((page['seq'], [notification['seq'] for notification in page['notifications']]), (2, [2]))
+
+
+class WeeklyRollupTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        from datetime import datetime
+        from .friendships import add_friendship, friend_ids_cache
+        from .models import Activity, WeeklyRollup
+        friend_ids_cache.clear()
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+        WeeklyRollup.objects.delete()
+
+        self.user = UserProfile(auth0_id="auth0|1", username="ana", email="ana@example.com").save()
+        self.friend = UserProfile(auth0_id="auth0|2", username="bob", email="bob@example.com").save()
+        self.stranger = UserProfile(auth0_id="auth0|3", username="cid", email="cid@example.com").save()
+        add_friendship(self.user.id, self.friend.id)
+
+        # Monday of ISO week 2025-W23
+        self.activity = Activity(
+            activity_name="Run", user_id=self.user, type="running", status="in_progress",
+            start_time=datetime(2025, 6, 2, 7)
+        ).save()
+
+    def tearDown(self):
+        from .models import Activity, WeeklyRollup
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+        WeeklyRollup.objects.delete()
+
+    def call(self, view, method, user, path='/', data=None, **kwargs):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        request = getattr(APIRequestFactory(), method)(path, data, format='json')
+        force_authenticate(request, user=UserProfile.objects.get(id=user.id))
+        return view.as_view()(request, **kwargs)
+
+    def rollups(self):
+        from .models import WeeklyRollup
+        return list(WeeklyRollup._get_collection().find({}, {'_id': 0, 'user': 1, 'week': 1, 'distance': 1, 'duration': 1, 'count': 1}))
+
+    def test_activity_edits_keep_rollups_in_step(self):
+        from .views import ActivityDetailView
+        activity_id = str(self.activity.id)
+
+        self.call(ActivityDetailView, 'patch', self.user, data={'distance': 5.0}, activity_id=activity_id)
+        self.assertEqual(self.rollups(), [])
+
+        self.call(ActivityDetailView, 'patch', self.user, activity_id=activity_id, data={
+            'status': 'completed', 'distance': 10.0, 'end_time': '2025-06-02T08:00:00Z'
+        })
+        self.assertEqual(self.rollups(), [
+            {'user': self.user.id, 'week': '2025-W23', 'distance': 10.0, 'duration': 3600.0, 'count': 1}
+        ])
+
+        self.call(ActivityDetailView, 'patch', self.user, data={'distance': 12.5}, activity_id=activity_id)
+        self.assertEqual(self.rollups()[0]['distance'], 12.5)
+        self.assertEqual(self.rollups()[0]['count'], 1)
+
+        self.call(ActivityDetailView, 'delete', self.user, activity_id=activity_id)
+        self.assertEqual(self.rollups(), [])
+
+    def concurrently(self, change):
+        """Patch activity_unchanged so change() runs between a view's read and its write"""
+        from unittest import mock
+        from .views import activity_unchanged
+
+        def condition(activity):
+            change()
+            return activity_unchanged(activity)
+
+        return mock.patch('apps.users.views.activity_unchanged', side_effect=condition)
+
+    def test_lost_race_leaves_rollups_alone(self):
+        from datetime import datetime
+        from .models import Activity
+        from .views import ActivityDetailView
+        activity_id = str(self.activity.id)
+
+        def complete():
+            Activity._get_collection().update_one(
+                {'_id': self.activity.id}, {'$set': {'distance': 3.0, 'updated_at': datetime(2025, 6, 2, 9)}}
+            )
+
+        with self.concurrently(complete):
+            response = self.call(ActivityDetailView, 'patch', self.user, activity_id=activity_id, data={
+                'status': 'completed', 'distance': 10.0, 'end_time': '2025-06-02T08:00:00Z'
+            })
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.rollups(), [])
+        self.assertEqual(Activity.objects.get(id=self.activity.id).status, 'in_progress')
+
+        self.call(ActivityDetailView, 'patch', self.user, activity_id=activity_id, data={
+            'status': 'completed', 'distance': 10.0, 'end_time': '2025-06-02T08:00:00Z'
+        })
+        def edit():
+            Activity.objects(id=self.activity.id).update(set__distance=20.0, set__updated_at=datetime.utcnow())
+
+        with self.concurrently(edit):
+            response = self.call(ActivityDetailView, 'delete', self.user, activity_id=activity_id)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.rollups()[0]['distance'], 10.0)
+
+        with self.concurrently(lambda: Activity.objects(id=self.activity.id).delete()):
+            response = self.call(ActivityDetailView, 'delete', self.user, activity_id=activity_id)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.rollups()[0]['count'], 1)
+
+    def test_leaderboard_ranks_the_user_and_friends(self):
+        from datetime import datetime
+        from .models import Activity
+        from .rollups import activity_contribution, apply_contribution_change
+        from .views import LeaderboardView
+
+        for owner, distance in ((self.user, 10.0), (self.friend, 30.0), (self.stranger, 50.0)):
+            activity = Activity(
+                activity_name="Run", user_id=owner, type="running", status="completed",
+                start_time=datetime(2025, 6, 4, 7), distance=distance
+            ).save()
+            apply_contribution_change(None, activity_contribution(activity))
+
+        response = self.call(LeaderboardView, 'get', self.user, '/?week=2025-W23')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(entry['rank'], entry['user']['username'], entry['distance']) for entry in response.data['entries']],
+            [(1, 'bob', 30.0), (2, 'ana', 10.0)]
+        )
+
+        response = self.call(LeaderboardView, 'get', self.user, '/?week=2025-W23&type=cycling')
+        self.assertEqual(response.data['entries'], [])
+
+        for query in ('?week=2025-23', '?week=2025-W23&metric=pace'):
+            self.assertEqual(self.call(LeaderboardView, 'get', self.user, '/' + query).status_code, 400)
+
+
+class UserStatsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        from datetime import datetime
+        from .models import Activity, UserStats
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+        UserStats.objects.delete()
+
+        self.user = UserProfile(auth0_id="auth0|1", username="ana", email="ana@example.com").save()
+        self.activities = [
+            Activity(
+                activity_name="Workout", user_id=self.user, type=activity_type, status="in_progress",
+                start_time=datetime(2025, 6, day, 7)
+            ).save()
+            for day, activity_type in ((2, 'running'), (3, 'running'), (4, 'cycling'))
+        ]
+
+    def tearDown(self):
+        from .models import Activity, UserStats
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+        UserStats.objects.delete()
+
+    def patch(self, activity, data):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .views import ActivityDetailView
+        request = APIRequestFactory().patch('/', data, format='json')
+        force_authenticate(request, user=UserProfile.objects.get(id=self.user.id))
+        return ActivityDetailView.as_view()(request, activity_id=str(activity.id))
+
+    def complete_all(self):
+        for activity, distance in zip(self.activities, (5.0, 12.0, 40.0)):
+            self.patch(activity, {'status': 'completed', 'distance': distance})
+
+    def test_stats_follow_activity_edits(self):
+        from datetime import datetime
+        from .stats import load_stats
+
+        self.complete_all()
+        stats = load_stats(self.user.id, now=datetime(2025, 6, 5))
+        self.assertEqual(stats['totals']['running']['distance'], 17.0)
+        self.assertEqual(stats['totals']['cycling']['count'], 1)
+        self.assertEqual(stats['this_week']['distance'], 57.0)
+        self.assertEqual(stats['this_year']['count'], 3)
+        self.assertEqual(stats['longest_run']['activity_id'], str(self.activities[1].id))
+
+        # shortening the record run hands the record to the other one
+        self.patch(self.activities[1], {'distance': 3.0})
+        stats = load_stats(self.user.id, now=datetime(2025, 6, 5))
+        self.assertEqual(stats['longest_run']['activity_id'], str(self.activities[0].id))
+
+        # periods other than the current one read as zero
+        stats = load_stats(self.user.id, now=datetime(2025, 7, 1))
+        self.assertEqual(stats['this_week']['count'], 0)
+        self.assertEqual(stats['this_month']['count'], 0)
+        self.assertEqual(stats['this_year']['distance'], 48.0)
+
+    def test_racing_completions_count_once(self):
+        from datetime import datetime
+        from unittest import mock
+        from .stats import check_stats, load_stats
+        from .views import activity_unchanged
+        activity = self.activities[0]
+
+        def condition(loaded):
+            # the other request completes the activity between this one's read and write
+            with mock.patch('apps.users.views.activity_unchanged', side_effect=activity_unchanged):
+                self.patch(activity, {'status': 'completed', 'distance': 5.0})
+            return activity_unchanged(loaded)
+
+        with mock.patch('apps.users.views.activity_unchanged', side_effect=condition):
+            response = self.patch(activity, {'status': 'completed', 'distance': 8.0})
+        self.assertEqual(response.status_code, 409)
+
+        stats = load_stats(self.user.id, now=datetime(2025, 6, 5))
+        self.assertEqual(stats['totals']['running']['count'], 1)
+        self.assertEqual(stats['totals']['running']['distance'], 5.0)
+        self.assertEqual(stats['longest_run']['distance'], 5.0)
+        self.assertEqual(check_stats(), (1, []))
+
+    def test_check_reports_and_fixes_drift(self):
+        from .models import UserStats
+        from .stats import check_stats
+
+        self.complete_all()
+        self.assertEqual(check_stats(), (1, []))
+
+        UserStats._get_collection().update_one(
+            {'user': self.user.id}, {'$inc': {'totals.running.distance': 1.0}, '$unset': {'longest_run': 1}}
+        )
+        checked, mismatches = check_stats(fix=True)
+        self.assertEqual(mismatches, [(self.user.id, ['totals.running', 'longest_run'])])
+        self.assertEqual(check_stats(), (1, []))
+
+
+class GeoTest(unittest.TestCase):
+    def test_track_geometry(self):
+        from datetime import datetime
+        from .geo import track_geometry, start_point
+        from .models import LiveDataPoint
+
+        points = [
+            LiveDataPoint(timestamp=datetime(2025, 6, 1, 7)),
+            LiveDataPoint(timestamp=datetime(2025, 6, 1, 7, 1), latitude=4.70, longitude=-74.10),
+            LiveDataPoint(timestamp=datetime(2025, 6, 1, 7, 2), latitude=4.75, longitude=-74.02),
+            LiveDataPoint(timestamp=datetime(2025, 6, 1, 7, 3), latitude=4.72, longitude=-74.05),
+        ]
+        geometry = track_geometry(points)
+        self.assertEqual(geometry['start_point'], {'type': 'Point', 'coordinates': [-74.10, 4.70]})
+        self.assertEqual(geometry['bbox']['coordinates'], [[
+            [-74.10, 4.70], [-74.02, 4.70], [-74.02, 4.75], [-74.10, 4.75], [-74.10, 4.70]
+        ]])
+        self.assertEqual(track_geometry(points[:1]), {'start_point': None, 'bbox': None})
+        self.assertEqual(start_point([{'latitude': 1.0, 'longitude': 2.0}])['coordinates'], [2.0, 1.0])
+
+    def test_cursor_pages_past_ties(self):
+        from bson import ObjectId
+        from .geo import next_cursor, parse_cursor, nearby_pipeline
+
+        ids = [ObjectId() for _ in range(4)]
+        page = [{'_id': ids[0], 'meters_away': 10.5}, {'_id': ids[1], 'meters_away': 20.25}]
+        self.assertIsNone(next_cursor(page, None, limit=3))
+
+        after = parse_cursor(next_cursor(page, None, limit=2))
+        self.assertEqual(after, (20.25, [ids[1]]))
+
+        # a page entirely at the boundary distance keeps excluding the earlier ids
+        page = [{'_id': ids[2], 'meters_away': 20.25}, {'_id': ids[3], 'meters_away': 20.25}]
+        self.assertEqual(parse_cursor(next_cursor(page, after, limit=2)), (20.25, ids[1:]))
+
+        geo_near = nearby_pipeline(-74.0, 4.7, 1000, {'public': True}, after)[0]['$geoNear']
+        self.assertEqual(geo_near['minDistance'], 20.25)
+        self.assertEqual(geo_near['query'], {'public': True, '_id': {'$nin': [ids[1]]}})
+
+        with self.assertRaises(ValueError):
+            parse_cursor('12.5:not-an-id')
+
+
+class RouteTest(unittest.TestCase):
+    def test_encode_polyline(self):
+        from .routes import encode_polyline
+
+        # the example of Google's polyline algorithm documentation, as (longitude, latitude)
+        self.assertEqual(
+            encode_polyline([(-120.2, 38.5), (-120.95, 40.7), (-126.453, 43.252)]),
+            '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+        )
+
+    def test_simplification_keeps_corners_within_the_point_budget(self):
+        import numpy as np
+        from .routes import simplify, route_polyline
+
+        # an L of 1 m steps with a little noise: only the ends and the corner matter
+        xy = np.array([(x, 0.0) for x in range(100)] + [(99.0, y) for y in range(1, 100)])
+        xy[1:-1] += np.random.default_rng(0).normal(0, 0.2, (len(xy) - 2, 2))
+        self.assertEqual(simplify(xy, 1.0).tolist(), [0, 99, 198])
+
+        # a long zigzag needs more than 20 points at 10 m: the tolerance grows instead
+        points = [
+            {'latitude': 4.6 + i * 0.0001, 'longitude': -74.1 + (i % 2) * 0.0005 * (1 + i / 500)}
+            for i in range(5000)
+        ]
+        route = route_polyline(points, tolerance=10, max_points=20)
+        self.assertLess(len(route), 200)
+        self.assertIsNone(route_polyline([{'latitude': 4.6, 'longitude': -74.1}]))
+
+
+class HeatmapTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        from .models import Activity, HeatmapTile
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+        HeatmapTile.objects.delete()
+
+    def tearDown(self):
+        from .models import Activity, HeatmapTile
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+        HeatmapTile.objects.delete()
+
+    def test_increments_touch_only_changed_cells(self):
+        from .heatmap import rasterize, track_coordinates, tile_increments, zoom_levels, TILE_CELLS
+
+        # out and back along a street, 1 km east: every cell counts once
+        out = [{'latitude': 4.6, 'longitude': -74.1 + i * 0.0001} for i in range(90)]
+        track = out + out[::-1]
+        tiles = rasterize(track_coordinates(track), 15)
+        cells = [cell for indices in tiles.values() for cell in indices.tolist()]
+        self.assertEqual(len(cells), len(set(cells)))
+        # 1 km is ~8 tiles wide at zoom 15, ~1.2 m per cell: no holes along the way
+        self.assertGreater(len(cells), 1000 / (40_075_000 / 2 ** 15 / TILE_CELLS) * 0.9)
+
+        added = tile_increments(None, track)
+        self.assertEqual({z for z, _, _ in added}, set(zoom_levels()))
+        self.assertTrue(all(delta == 1 for deltas in added.values() for delta in deltas.values()))
+        self.assertEqual(tile_increments(track, track), {})
+
+        # extending the track only adds its new cells, at the zooms where they are new cells
+        extended = tile_increments(track, track + [{'latitude': 4.6, 'longitude': -74.09}])
+        self.assertTrue(extended)
+        self.assertLess(sum(map(len, extended.values())), sum(map(len, added.values())) / 2)
+        self.assertEqual(tile_increments(None, [{'latitude': None, 'longitude': None}]), {})
+
+    def test_lost_race_moves_no_tiles(self):
+        from datetime import datetime
+        from unittest import mock
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .models import Activity, LiveDataPoint
+        from .views import ActivityDetailView, activity_unchanged
+
+        me = UserProfile(auth0_id="auth0|me", username="me", email="me@example.com").save()
+        activity = Activity(
+            activity_name="Run", user_id=me, type="running", status="completed",
+            live_data=[LiveDataPoint(timestamp=datetime(2025, 6, 1, 7), latitude=4.6, longitude=-74.1)]
+        ).save()
+
+        def condition(loaded):
+            # another request edits the activity between this one's read and write
+            Activity._get_collection().update_one({'_id': activity.id}, {'$set': {'updated_at': datetime.utcnow()}})
+            return activity_unchanged(loaded)
+
+        def call(method, data=None):
+            request = getattr(APIRequestFactory(), method)('/', data, format='json')
+            force_authenticate(request, user=UserProfile.objects.get(id=me.id))
+            return ActivityDetailView.as_view()(request, activity_id=str(activity.id))
+
+        with mock.patch('apps.users.views.activity_unchanged', side_effect=condition), \
+                mock.patch('apps.users.views.apply_heatmap_change') as apply_heatmap_change:
+            replaced = call('patch', {'live_data': [
+                {'timestamp': '2025-06-01T07:00:00Z', 'latitude': 10.0, 'longitude': 10.0}
+            ]})
+            deleted = call('delete')
+
+        self.assertEqual((replaced.status_code, deleted.status_code), (409, 409))
+        apply_heatmap_change.assert_not_called()
+        self.assertEqual(Activity.objects.get(id=activity.id).live_data[0].latitude, 4.6)
+
+    def test_tiles_are_cached_by_version(self):
+        import zlib
+        from datetime import datetime
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .friendships import add_friendship
+        from .heatmap import rebuild_heatmaps, track_tiles, TILE_SIZE
+        from .models import Activity, LiveDataPoint
+        from .views import HeatmapView, HeatmapTileView
+
+        me = UserProfile(auth0_id="auth0|me", username="me", email="me@example.com").save()
+        friend = UserProfile(auth0_id="auth0|friend", username="friend", email="friend@example.com").save()
+        add_friendship(me.id, friend.id)
+        track = [{'latitude': 4.6 + i * 0.0002, 'longitude': -74.1} for i in range(50)]
+        Activity(
+            activity_name="Run", user_id=friend, type="running", status="completed",
+            live_data=[LiveDataPoint(timestamp=datetime(2025, 6, 1, 7), **point) for point in track]
+        ).save()
+        Activity(
+            activity_name="Planned", user_id=friend, type="running", status="planned",
+            live_data=[LiveDataPoint(timestamp=datetime(2025, 6, 1, 7), latitude=10.0, longitude=10.0)]
+        ).save()
+        self.assertEqual(rebuild_heatmaps(), len(track_tiles(track)))
+
+        def get(view, path, **kwargs):
+            request = APIRequestFactory().get(path, **kwargs.pop('headers', {}))
+            force_authenticate(request, user=UserProfile.objects.get(id=me.id))
+            return view.as_view()(request, **kwargs)
+
+        meta = get(HeatmapView, '/?scope=friends').data
+        self.assertTrue(meta['tiles'].endswith(f"/api/heatmap/friends/{{z}}/{{x}}/{{y}}.png?v={meta['version']}"))
+
+        z, x, y = next(iter(track_tiles(track)))
+        response = get(HeatmapTileView, f"/?v={meta['version']}", scope='friends', z=z, x=x, y=y)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Cache-Control'], 'private, max-age=31536000, immutable')
+        idat = response.content[response.content.index(b'IDAT') + 4:response.content.index(b'IEND') - 8]
+        self.assertEqual(len(zlib.decompress(idat)), TILE_SIZE * (TILE_SIZE * 4 + 1))
+
+        # a stale version revalidates, and the client's copy is still current
+        stale = get(HeatmapTileView, '/?v=old', scope='friends', z=z, x=x, y=y,
+                    headers={'HTTP_IF_NONE_MATCH': response['ETag']})
+        self.assertEqual(stale.status_code, 304)
+        self.assertEqual(stale['Cache-Control'], 'private, no-cache')
+
+        # the user's own heatmap is empty, and there are no tiles outside the precomputed zooms
+        self.assertNotEqual(get(HeatmapTileView, '/', scope='me', z=z, x=x, y=y).content, response.content)
+        self.assertEqual(get(HeatmapTileView, '/', scope='me', z=3, x=0, y=0).status_code, 404)
+
+
+class CompressionMiddlewareTest(unittest.TestCase):
+    def test_credentialed_responses_are_padded_gzip(self):
+        import gzip
+        import brotli
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from config.middleware import CompressionMiddleware
+
+        body = b'{"username": "ana", "email": "ana@example.com"}' * 100
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body, content_type='application/json'))
+
+        def get(**headers):
+            return middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br, gzip', **headers))
+
+        response = get()
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), body)
+
+        lengths = set()
+        for headers in ({'HTTP_AUTHORIZATION': 'Bearer abc'}, {'HTTP_COOKIE': 'sessionid=abc'}) * 10:
+            response = get(**headers)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), body)
+            lengths.add(len(response.content))
+        # the compressed length no longer tells the content apart
+        self.assertGreater(len(lengths), 1)
+
+
+class QueryBudgetTest(unittest.TestCase):
+    # maximum MongoDB commands per request, independent of the amount of data
+    BUDGETS = {
+        'profile': 2,
+        'friends_list': 2,
+        'activities_list': 2,
+        'activity_detail': 5,
+        'friends_activities': 4,
+        'search_users': 2,
+        'friend_suggestions': 2,
+        'mutual_friends': 1,
+        'notifications': 1,
+        'leaderboard': 3,
+        'profile_stats': 1,
+        'heatmap_tile': 2,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        from config.instrumentation import instrument_mongomock
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+        instrument_mongomock()
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .friendships import add_friendship, friend_ids_cache
+        from .models import Activity, FriendRequest
+        from .search import search_cache
+        cache.clear()
+        search_cache.clear()
+        friend_ids_cache.clear()
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+        FriendRequest.objects.delete()
+
+        self.users = [
+            UserProfile(auth0_id=f"auth0|{i}", username=f"user{i}", email=f"user{i}@example.com").save()
+            for i in range(10)
+        ]
+        self.user = self.users[0]
+        for friend in self.users[1:]:
+            add_friendship(self.user.id, friend.id)
+            Activity(activity_name="Run", user_id=friend, type="running", participants=self.users[1:4]).save()
+            Activity(activity_name="Ride", user_id=self.user, type="cycling", participants=self.users[1:4]).save()
+            FriendRequest(sender=friend, receiver=self.users[-1]).save()
+        self.activity = Activity.objects(user_id=self.user.id).first()
+
+    def tearDown(self):
+        from .models import Activity, FriendRequest
+        UserProfile.objects.delete()
+        Activity.objects.delete()
+        FriendRequest.objects.delete()
+
+    def request(self, user, path='/'):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, user=UserProfile.objects.get(id=user.id))
+        return request
+
+    def test_endpoint_budgets(self):
+        from django.test import override_settings
+        from config.instrumentation import query_budget
+        from . import views
+
+        endpoints = {
+            'profile': (views.ProfileView, '/', {}),
+            'friends_list': (views.FriendsListView, '/', {}),
+            'activities_list': (views.ActivitiesListView, '/', {}),
+            'activity_detail': (views.ActivityDetailView, '/', {'activity_id': str(self.activity.id)}),
+            'friends_activities': (views.FriendsActivitiesView, '/', {}),
+            'search_users': (views.SearchUsersView, '/?q=user', {}),
+            'friend_suggestions': (views.FriendSuggestionsView, '/', {}),
+            'mutual_friends': (views.MutualFriendsView, f'/?ids={self.users[2].id},{self.users[3].id}', {}),
+            'notifications': (views.NotificationsView, '/', {}),
+            'leaderboard': (views.LeaderboardView, '/?week=2025-W23', {}),
+            'profile_stats': (views.ProfileStatsView, '/', {}),
+            'heatmap_tile': (views.HeatmapTileView, '/', {'scope': 'friends', 'z': 12, 'x': 1206, 'y': 1999}),
+        }
+
+        # both serialization paths, the default DRF serializers included; budgets count
+        # data queries, so the cache tier (MongoDB by default) is kept out of them
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        for fast in (False, True):
+            with override_settings(FAST_SERIALIZATION=fast, CACHES=locmem):
+                for name, (view, path, kwargs) in endpoints.items():
+                    request = self.request(self.user, path)
+                    with self.subTest(endpoint=name, fast_serialization=fast), query_budget(self.BUDGETS[name]):
+                        response = view.as_view()(request, **kwargs)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_detects_repeated_command_shapes(self):
+        from config.instrumentation import track_queries
+        from .views import PendingFriendRequestsView
+
+        request = self.request(self.users[-1])
+        with track_queries() as stats:
+            PendingFriendRequestsView.as_view()(request)
+
+        # every request dereferences its sender and receiver with a query each
+        self.assertEqual(stats.repeated_shapes(5), {('find', 'users', ('_id',)): 18})
+
+    def test_budget_exceeded_lists_commands(self):
+        from config.instrumentation import query_budget, QueryBudgetExceeded
+
+        with self.assertRaisesRegex(QueryBudgetExceeded, "2 MongoDB commands run, budget is 1"):
+            with query_budget(1):
+                UserProfile.objects(username="user1").first()
+                UserProfile.objects(username="user2").first()
+
+    def test_command_shape_ignores_values(self):
+        from config.instrumentation import command_shape
+
+        self.assertEqual(
+            command_shape('find', {'find': 'users', 'filter': {'username': 'a', '_id': 1}, 'limit': 1}),
+            ('find', 'users', ('_id', 'username'))
+        )
+        self.assertEqual(
+            command_shape('update', {'update': 'users', 'updates': [{'q': {'_id': 1}, 'u': {}}]}),
+            ('update', 'users', ('_id',))
+        )
+        self.assertEqual(command_shape('getMore', {'getMore': 123, 'collection': 'users'})[:2], ('getMore', 'users'))
+
+
+class ThrottlingTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        disconnect(alias="default")
+        connect(
+            "test_db",
+            host="mongodb://localhost",
+            alias="default",
+            mongo_client_class=mongomock.MongoClient
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect(alias="default")
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_bucket_allows_a_burst_then_refills(self):
+        from .throttling import TokenBucket
+        bucket = TokenBucket("throttle:test:1", capacity=3, refill_rate=1)
+        now = 1_000_000.0
+
+        self.assertEqual([bucket.take(now)[0] for _ in range(4)], [True, True, True, False])
+        self.assertEqual(bucket.take(now), (False, 1.0))
+        self.assertEqual(bucket.take(now + 1), (True, 0))
+        self.assertFalse(bucket.take(now + 1)[0])
+
+        # idle time refills at most a full bucket
+        self.assertEqual([bucket.take(now + 100)[0] for _ in range(4)], [True, True, True, False])
+
+    def test_login_is_throttled_per_account_with_retry_after(self):
+        from django.conf import settings
+        from django.test import override_settings
+        from rest_framework.test import APIRequestFactory
+        from config.metrics import registry
+        from .views import LoginUserView
+
+        rates = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'login_account': '2/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            def login(email, ip):
+                request = APIRequestFactory().post(
+                    '/', {"email": email, "password": "wrong"}, format='json', REMOTE_ADDR=ip
+                )
+                return LoginUserView.as_view()(request)
+
+            statuses = [login("John@example.com ", f"10.0.0.{i}").status_code for i in range(3)]
+            self.assertEqual(statuses, [401, 401, 429])
+            self.assertEqual(login("john@example.com", "10.0.0.9")['Retry-After'], "30")
+            self.assertEqual(login("jane@example.com", "10.0.0.9").status_code, 401)
+
+        labels = (('decision', 'throttled'), ('scope', 'login_account'))
+        self.assertGreaterEqual(registry.values.totals()[('throttle_decisions_total', labels, '')], 2)
+
+
+    def test_ip_throttle_ignores_spoofed_forwarded_for(self):
+        from django.conf import settings
+        from django.test import override_settings
+        from rest_framework.test import APIRequestFactory
+        from .views import LoginUserView
+
+        def login(ip, forwarded_for):
+            request = APIRequestFactory().post(
+                '/', {"email": f"{forwarded_for}@example.com", "password": "wrong"}, format='json',
+                REMOTE_ADDR=ip, HTTP_X_FORWARDED_FOR=forwarded_for
+            )
+            return LoginUserView.as_view()(request).status_code
+
+        rates = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'login_ip': '2/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            # a new random header per attempt is still the same client
+            self.assertEqual([login("10.0.0.1", f"203.0.113.{i}") for i in range(3)], [401, 401, 429])
+
+        proxied = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates, 'NUM_PROXIES': 1}
+        with override_settings(REST_FRAMEWORK=proxied):
+            # behind one proxy only the address it appended counts, not what the client sent before it
+            statuses = [login("10.0.0.254", f"198.51.100.{i}, 192.0.2.7") for i in range(3)]
+            self.assertEqual(statuses, [401, 401, 429])
+            self.assertEqual(login("10.0.0.254", "192.0.2.8"), 401)
+
+
+class MetricsTest(unittest.TestCase):
+    def test_sharded_counters_sum_across_threads(self):
+        import threading
+        from config.metrics import ShardedCounters
+
+        counters = ShardedCounters()
+
+        def work():
+            for _ in range(1000):
+                counters.add('requests')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counters.totals(), {'requests': 8000})
+        self.assertEqual(len(counters.shards), 8)
+
+    def test_histogram_exposition(self):
+        from config.metrics import Registry
+
+        registry = Registry()
+        registry.define('latency_seconds', 'histogram', 'Latency.', (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            registry.observe('latency_seconds', (('route', 'api/"x"/'),), value)
+
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{route="api/\\"x\\"/",le="0.1"} 2',
+            'latency_seconds_bucket{route="api/\\"x\\"/",le="1.0"} 3',
+            'latency_seconds_bucket{route="api/\\"x\\"/",le="+Inf"} 4',
+            'latency_seconds_sum{route="api/\\"x\\"/"} 3.65',
+            'latency_seconds_count{route="api/\\"x\\"/"} 4',
+        ])
+
+    def test_scrape_endpoint_is_gated(self):
+        from django.http import Http404
+        from django.test import RequestFactory, override_settings
+        from config.metrics import method_label
+        from config.views import metrics_view
+
+        def scrape(**headers):
+            return metrics_view(RequestFactory().get('/metrics/', **headers))
+
+        with override_settings(DEBUG=False, METRICS_TOKEN=None):
+            with self.assertRaises(Http404):
+                scrape()
+        with override_settings(DEBUG=True, METRICS_TOKEN=None):
+            self.assertEqual(scrape().status_code, 200)
+        with override_settings(DEBUG=True, METRICS_TOKEN='s3cret'):
+            self.assertEqual(scrape().status_code, 403)
+            self.assertEqual(scrape(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(scrape(HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+        self.assertEqual([method_label(method) for method in ('GET', 'PATCH', 'FOO', 'get')], ['GET', 'PATCH', 'OTHER', 'OTHER'])
+
+
+class SlowQueryLogTest(unittest.TestCase):
+    def tearDown(self):
+        from config.slow_queries import slow_query_log
+        slow_query_log.configured = False
+
+    def test_listener_logs_slow_commands_with_view_and_filter_shape(self):
+        import json
+        from types import SimpleNamespace
+        from django.test import override_settings
+        from config.instrumentation import QueryListener, track_queries
+        from config.slow_queries import slow_query_log
+
+        listener = QueryListener()
+        command = {'find': 'users', 'filter': {'username': {'$regex': 'jo', '$options': 'i'}}, 'limit': 20}
+        started = SimpleNamespace(
+            command_name='find', command=command, database_name='sync', connection_id=('db', 27017), request_id=7
+        )
+        succeeded = SimpleNamespace(
+            command_name='find', connection_id=('db', 27017), request_id=7, duration_micros=250000,
+            reply={'cursor': {'firstBatch': [{}, {}]}}
+        )
+
+        slow_query_log.configured = False
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=100, SLOW_QUERY_EXPLAIN_SAMPLE_RATE=0):
+            with track_queries() as stats, self.assertLogs('config.slow_queries') as logs:
+                stats.view = 'GET search_users'
+                listener.started(started)
+                listener.succeeded(succeeded)
+
+        self.assertEqual(stats.count, 1)
+        self.assertEqual(stats.documents, 2)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['view'], 'GET search_users')
+        self.assertEqual(entry['collection'], 'users')
+        self.assertEqual(entry['filter'], {'username': {'$regex': '?', '$options': '?'}})
+        self.assertEqual(entry['duration_ms'], 250.0)
+
+    def test_plan_summary_flags_collection_scans(self):
+        from config.slow_queries import plan_summary
+
+        explain = {'queryPlanner': {'winningPlan': {
+            'stage': 'SORT', 'inputStage': {'stage': 'FETCH', 'inputStage': {'stage': 'COLLSCAN'}}
+        }}}
+        self.assertEqual(plan_summary(explain), {
+            'stages': ['SORT', 'FETCH', 'COLLSCAN'], 'indexes': [], 'collscan': True
+        })
+
+        explain = {'stages': [{'$cursor': {'queryPlanner': {'winningPlan': {'queryPlan': {
+            'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'user_id_1'}
+        }}}}}]}
+        self.assertEqual(plan_summary(explain)['indexes'], ['user_id_1'])
+
+
+class IndexProposalTest(unittest.TestCase):
+    def test_equality_then_sort_then_range(self):
+        from .query_registry import propose_indexes
+
+        self.assertEqual(
+            propose_indexes({'user': 1, 'seq': {'$gt': 3}, 'kind': {'$in': ['a']}}, [('created_at', -1)]),
+            [[('user', 1), ('kind', 1), ('created_at', -1), ('seq', 1)]]
+        )
+
+    def test_one_index_per_or_branch(self):
+        from .query_registry import propose_indexes
+
+        self.assertEqual(
+            propose_indexes(
+                {'$or': [{'receiver': 1, 'status': 'pending'}, {'sender': 1, 'status': 'pending'}]},
+                [('created_at', -1)]
+            ),
+            [
+                [('receiver', 1), ('status', 1), ('created_at', -1)],
+                [('sender', 1), ('status', 1), ('created_at', -1)],
+            ]
+        )
+
+    def test_regexes_get_no_key(self):
+        from .query_registry import propose_indexes
+
+        self.assertEqual(propose_indexes({'username': {'$regex': 'jo', '$options': 'i'}}, []), [])
+
+    def test_longest_run_has_its_index_and_sorts_before_projecting(self):
+        from types import SimpleNamespace
+        from bson import ObjectId
+        from .models import Activity
+        from .query_registry import CANONICAL_QUERIES, propose_indexes
+        from .rollups import contribution_pipeline
+
+        query = next(query for query in CANONICAL_QUERIES if query.name == 'longest_run')
+        declared = [list(spec['fields']) for spec in Activity._meta['index_specs']]
+        for proposal in propose_indexes(query.build(SimpleNamespace(user_id=ObjectId())), query.sort):
+            self.assertIn(proposal, declared)
 
+        stages = [next(iter(stage)) for stage in contribution_pipeline({'type': 'running'}, sort={'distance': -1}, limit=1)]
+        self.assertEqual(stages[:4], ['$match', '$sort', '$limit', '$project'])
@@ -0,0 +1,171 @@
+"""
+Token-bucket throttles backed by the shared cache (settings.CACHES).
+
+A bucket holds up to `capacity` tokens and refills at `capacity` per period,
+so "10/min" allows a burst of 10 and then one request every 6 seconds.
+Rates are configured per scope in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].
+
+Each bucket is one integer counting the tokens taken, against the allowance
+granted so far (now * refill rate): a request atomically increments it and is
+allowed while the count stays within the allowance. An allowed request costs
+a single cache round trip. A bucket that sat idle long enough to be full is
+moved up to allowance - capacity, so idle time never banks more than a burst.
+"""
+
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from config.metrics import registry
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity 10, refill of 10 tokens per 60 seconds as tokens per second)"""
+    tokens, period = rate.split('/')
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return int(tokens), int(tokens) / seconds
+
+
+class TokenBucket:
+    def __init__(self, key, capacity, refill_rate):
+        self.key = key
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        # an expired bucket starts full: keep it long enough that this rarely
+        # hands a continuously throttled client a fresh burst
+        self.timeout = math.ceil(10 * capacity / refill_rate)
+
+    def allowance(self, now):
+        return int(now * self.refill_rate)
+
+    def decide(self, taken, now):
+        """Return (allowed, seconds until a token is available, counter to reset to or None)"""
+        allowance = self.allowance(now)
+        if taken <= allowance - self.capacity:
+            # idle until full (or new): restart from a full bucket, minus this request
+            return True, 0, allowance - self.capacity + 1
+        if taken <= allowance:
+            return True, 0, None
+        return False, (taken - allowance) / self.refill_rate, None
+
+    def take(self, now=None):
+        now = time.time() if now is None else now
+        try:
+            taken = cache.incr(self.key)
+        except ValueError:
+            cache.add(self.key, self.allowance(now) - self.capacity, self.timeout)
+            taken = cache.incr(self.key)
+
+        allowed, wait, reset = self.decide(taken, now)
+        if reset is not None:
+            cache.set(self.key, reset, self.timeout)
+        elif not allowed:
+            # refused requests take no token
+            cache.decr(self.key)
+        return allowed, wait
+
+    async def atake(self, now=None):
+        now = time.time() if now is None else now
+        try:
+            taken = await cache.aincr(self.key)
+        except ValueError:
+            await cache.aadd(self.key, self.allowance(now) - self.capacity, self.timeout)
+            taken = await cache.aincr(self.key)
+
+        allowed, wait, reset = self.decide(taken, now)
+        if reset is not None:
+            await cache.aset(self.key, reset, self.timeout)
+        elif not allowed:
+            await cache.adecr(self.key)
+        return allowed, wait
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle on a token bucket per identity; subclasses set scope and get_ident_key"""
+    scope = None
+
+    def __init__(self):
+        rates = settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {})
+        self.rate = rates.get(self.scope)
+        self.wait_seconds = None
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError
+
+    def bucket(self, request, view):
+        ident = self.get_ident_key(request, view)
+        if self.rate is None or ident is None:
+            return None
+        capacity, refill_rate = parse_rate(self.rate)
+        return TokenBucket(f"throttle:{self.scope}:{ident}", capacity, refill_rate)
+
+    def record(self, allowed, wait):
+        self.wait_seconds = wait
+        decision = 'allowed' if allowed else 'throttled'
+        registry.inc('throttle_decisions_total', (('decision', decision), ('scope', self.scope)))
+        return allowed
+
+    def allow_request(self, request, view):
+        bucket = self.bucket(request, view)
+        if bucket is None:
+            return True
+        return self.record(*bucket.take())
+
+    async def aallow_request(self, request, view):
+        bucket = self.bucket(request, view)
+        if bucket is None:
+            return True
+        return self.record(*await bucket.atake())
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+class UserThrottle(TokenBucketThrottle):
+    """Per authenticated user, per IP otherwise"""
+
+    def get_ident_key(self, request, view):
+        user_id = getattr(request, 'user_id', None)
+        if user_id is None and getattr(request, 'user_doc', None):
+            user_id = request.user_doc['_id']
+        user = getattr(request, 'user', None)
+        if user_id is None and getattr(user, 'is_authenticated', False):
+            user_id = user.id
+        return f"user:{user_id}" if user_id is not None else f"ip:{self.get_ident(request)}"
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class LoginAccountThrottle(TokenBucketThrottle):
+    """Attempts against one account, whichever IPs they come from"""
+    scope = 'login_account'
+
+    def get_ident_key(self, request, view):
+        email = request.data.get('email') if hasattr(request, 'data') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        # keeps addresses out of the cache keys
+        return hashlib.blake2b(email.strip().lower().encode(), digest_size=16).hexdigest()
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
+
+
+class SearchUserThrottle(UserThrottle):
+    scope = 'search_user'
+
+
+class SearchIPThrottle(IPThrottle):
+    scope = 'search_ip'
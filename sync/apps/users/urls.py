@@ -1,10 +1,17 @@
+from django.conf import settings
 from django.urls import path
+from .async_views import (
+    AsyncActivitiesListView, AsyncActivityDetailView, AsyncFriendsActivitiesView, AsyncSearchUsersView,
+    AsyncActivityLiveStreamView, AsyncNotificationsPollView
+)
 from .views import (
     RegisterUserView, LoginUserView, CallbackView, LogoutUserView,
-    ProfileView, SearchUsersView,
-    FriendsListView, PendingFriendRequestsView, SendFriendRequestView,
+    ProfileView, ProfileStatsView, SearchUsersView,
+    NotificationsView,
+    FriendsListView, FriendSuggestionsView, MutualFriendsView, PendingFriendRequestsView, SendFriendRequestView,
     AcceptFriendRequestView, RejectFriendRequestView, UnfriendView,
-    ActivitiesListView, ActivityDetailView, FriendsActivitiesView
+    ActivitiesListView, ActivityDetailView, ActivityLiveDataView, FriendsActivitiesView, LeaderboardView,
+    NearbyActivitiesView, HeatmapView, HeatmapTileView
 )
 
 urlpatterns = [
@@ -14,9 +21,13 @@ urlpatterns = [
     path("auth/logout/", LogoutUserView.as_view(), name="logout"),
     
     path("profile/", ProfileView.as_view(), name='profile'),
+    path("profile/stats/", ProfileStatsView.as_view(), name='profile_stats'),
     path("users/search/", SearchUsersView.as_view(), name='search_users'),
+    path("notifications/", NotificationsView.as_view(), name='notifications'),
     
     path("friends/", FriendsListView.as_view(), name='friends_list'),
+    path("friends/suggestions/", FriendSuggestionsView.as_view(), name='friend_suggestions'),
+    path("friends/mutual/", MutualFriendsView.as_view(), name='mutual_friends'),
     path("friends/requests/pending/", PendingFriendRequestsView.as_view(), name='pending_friend_requests'),
     path("friends/requests/send/", SendFriendRequestView.as_view(), name='send_friend_request'),
     path("friends/requests/<str:request_id>/accept/", AcceptFriendRequestView.as_view(), name='accept_friend_request'),
@@ -25,5 +36,21 @@ urlpatterns = [
     
     path("activities/", ActivitiesListView.as_view(), name='activities_list'),
     path("activities/friends/", FriendsActivitiesView.as_view(), name='friends_activities'),
+    path("activities/nearby/", NearbyActivitiesView.as_view(), name='nearby_activities'),
+    path("leaderboard/", LeaderboardView.as_view(), name='leaderboard'),
+    path("heatmap/", HeatmapView.as_view(), name='heatmap'),
+    path("heatmap/<str:scope>/<int:z>/<int:x>/<int:y>.png", HeatmapTileView.as_view(), name='heatmap_tile'),
     path("activities/<str:activity_id>/", ActivityDetailView.as_view(), name='activity_detail'),
-]
\ No newline at end of file
+    path("activities/<str:activity_id>/live/", ActivityLiveDataView.as_view(), name='activity_live_data'),
+]
+
+if settings.ASYNC_ROUTES:
+    # async variants, for ASGI deployments only (see ASYNC_ROUTES)
+    urlpatterns += [
+        path("async/users/search/", AsyncSearchUsersView.as_view(), name='async_search_users'),
+        path("async/notifications/poll/", AsyncNotificationsPollView.as_view(), name='async_notifications_poll'),
+        path("async/activities/", AsyncActivitiesListView.as_view(), name='async_activities_list'),
+        path("async/activities/friends/", AsyncFriendsActivitiesView.as_view(), name='async_friends_activities'),
+        path("async/activities/<str:activity_id>/", AsyncActivityDetailView.as_view(), name='async_activity_detail'),
+        path("async/activities/<str:activity_id>/live/", AsyncActivityLiveStreamView.as_view(), name='async_activity_live_stream'),
+    ]
@@ -1,26 +1,65 @@
+import re
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from urllib.parse import quote_plus, urlencode
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
 from django.conf import settings
 from mongoengine import Q
+from mongoengine.errors import SaveConditionError
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
 
 from apps.auth0_service import create_auth0_user, login_auth0_user, callback
 from .models import UserProfile, FriendRequest, Activity, LiveDataPoint
 from .serializers import (
     RegisterUserSerializer, LoginUserSerializer, UserProfileSerializer, 
-    UserProfileBasicSerializer, FriendRequestSerializer, ActivitySerializer, 
-    ActivityCreateSerializer, ActivityUpdateSerializer
+    UserProfileBasicSerializer, FriendRequestSerializer, ActivitySerializer, ActivitySummarySerializer,
+    ActivityCreateSerializer, ActivityUpdateSerializer, FriendSuggestionSerializer,
+    LiveDataPointSerializer, LiveDataAppendSerializer, NotificationSerializer
 )
 from .jwt_utils import generate_jwt_token
+from .search import search_users, invalidate_profile
+from .friendships import (
+    friend_ids, are_friends, remove_friendship, accept_friend_request,
+    reject_friend_request, delete_friend_requests, pack_friend_ids,
+    sorted_friend_ids, count_common_friends, EMPTY_FRIEND_IDS, to_object_id
+)
+from .suggestions import get_suggestions, friendship_added, friendship_removed
+from .etags import make_etag, etag_matches, conditional_response, profile_versions
+from .fast_serializers import (
+    USER_PROFILE_PLAN, USER_PROFILE_BASIC_PLAN, ACTIVITY_SUMMARY_PLAN, render_documents, render_queryset, load_profiles
+)
+from .live import get_channel_layer, activity_group
+from .notifications import notify, latest_seq, notifications_since, NOTIFICATIONS_PAGE_SIZE
+from .rollups import activity_contribution, apply_contribution_change, leaderboard, iso_week, METRICS
+from .stats import apply_stats_change, load_stats
+from .routes import route_polyline
+from .heatmap import (
+    completed_track, apply_heatmap_change, heatmap_version, load_grid, render_tile, empty_tile, zoom_levels,
+    TILE_SIZE
+)
+from .renderers import ORJSONRenderer, PNGRenderer
+from .geo import (
+    track_geometry, start_point, nearby_pipeline, next_cursor, parse_cursor,
+    NEARBY_DEFAULT_RADIUS, NEARBY_MAX_RADIUS, NEARBY_PAGE_SIZE
+)
+from .throttling import (
+    LoginIPThrottle, LoginAccountThrottle, RegisterIPThrottle, SearchUserThrottle, SearchIPThrottle
+)
+
+def fast_serialization():
+    return getattr(settings, 'FAST_SERIALIZATION', False)
+
 
 class RegisterUserView(APIView):
     authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterIPThrottle]
 
     @extend_schema(
         request=RegisterUserSerializer,
@@ -80,6 +119,7 @@ class RegisterUserView(APIView):
             # Hash and set password
             profile.set_password(password)
             profile.save()
+            invalidate_profile(profile)
 
             # generate token
             access_token = generate_jwt_token(str(profile.id), profile.email)
@@ -98,6 +138,8 @@ class RegisterUserView(APIView):
 class LoginUserView(APIView):
     authentication_classes = []
     permission_classes = [AllowAny]
+    # every attempt runs the (deliberately slow) password hasher
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
 
     @extend_schema(
         request={'application/json': {'type': 'object', 'properties': {
@@ -211,8 +253,15 @@ class ProfileView(APIView):
     def get(self, request):
         user = request.user
         
-        serializer = UserProfileSerializer(user)
-        return Response(serializer.data)
+        # embedded friends are covered by their own versions
+        etag = make_etag('profile', user.id, user.version, profile_versions(friend_ids(user)))
+        
+        def build_response():
+            if fast_serialization():
+                return Response(render_documents(USER_PROFILE_PLAN, [user.to_mongo()])[0])
+            return Response(UserProfileSerializer(user).data)
+        
+        return conditional_response(request, etag, build_response)
 
     @extend_schema(
         request=UserProfileSerializer,
@@ -220,6 +269,7 @@ class ProfileView(APIView):
     )
     def put(self, request):
         user = request.user
+        previous = {'username': user.username, 'full_name': user.full_name}
 
         # only allow updating full_name and username
         new_full_name = request.data.get("full_name")
@@ -237,14 +287,38 @@ class ProfileView(APIView):
         if new_full_name:
             user.full_name = new_full_name
 
-        user.save()
+        # the fields and the ETag version change in one write, so no reader sees one without the other
+        user.validate()
+        UserProfile.objects(id=user.id).update_one(
+            set__username=user.username, set__full_name=user.full_name, inc__version=1
+        )
+        user.version += 1
+        invalidate_profile(user, previous)
 
         serializer = UserProfileSerializer(user)
         return Response(serializer.data)
 
 
+class ProfileStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        responses={200: {'type': 'object', 'properties': {
+            'totals': {'type': 'object', 'additionalProperties': {'type': 'object', 'properties': {metric: {'type': 'number'} for metric in METRICS}}},
+            'this_week': {'type': 'object', 'properties': {metric: {'type': 'number'} for metric in METRICS}},
+            'this_month': {'type': 'object', 'properties': {metric: {'type': 'number'} for metric in METRICS}},
+            'this_year': {'type': 'object', 'properties': {metric: {'type': 'number'} for metric in METRICS}},
+            'longest_run': {'type': 'object', 'nullable': True},
+        }}}
+    )
+    def get(self, request):
+        # one lookup in the user's materialized stats, whatever their history size
+        return Response(load_stats(request.user.id))
+
+
 class SearchUsersView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [SearchUserThrottle, SearchIPThrottle]
 
     @extend_schema(
         parameters=[OpenApiParameter(name='q', type=str, location=OpenApiParameter.QUERY)],
@@ -254,26 +328,16 @@ class SearchUsersView(APIView):
         # username, email, or ID
         query = request.query_params.get('q', '')
         
-        if not query:
+        if not query.strip():
             return Response(
                 {"error": "Search query required"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # ID first
-        try:
-            user_by_id = UserProfile.objects.get(id=query)
-            serializer = UserProfileBasicSerializer([user_by_id], many=True)
-            return Response(serializer.data)
-        except (UserProfile.DoesNotExist, Exception):
-            pass
+        users = search_users(query)
 
-        # search by username, full_name, or email
-        users = UserProfile.objects.filter(
-            Q(username__icontains=query) |
-            Q(email__icontains=query) |
-            Q(full_name__icontains=query)
-        )[:20]
+        if fast_serialization():
+            return Response(render_documents(USER_PROFILE_BASIC_PLAN, [user.to_mongo() for user in users]))
 
         serializer = UserProfileBasicSerializer(users, many=True)
         return Response(serializer.data)
@@ -285,10 +349,236 @@ class FriendsListView(APIView):
     def get(self, request):
         user = request.user
         
-        serializer = UserProfileBasicSerializer(user.friends, many=True)
+        etag = make_etag('friends', profile_versions(friend_ids(user)))
+        
+        def build_response():
+            if fast_serialization():
+                friends = UserProfile.objects(id__in=friend_ids(user))
+                friends_by_id = {
+                    doc['_id']: doc for doc in friends.only(*USER_PROFILE_BASIC_PLAN.only_fields).as_pymongo()
+                }
+                return Response(render_documents(USER_PROFILE_BASIC_PLAN, [
+                    friends_by_id[friend_id] for friend_id in friend_ids(user) if friend_id in friends_by_id
+                ]))
+            return Response(UserProfileBasicSerializer(user.friends, many=True).data)
+        
+        return conditional_response(request, etag, build_response)
+
+
+class LeaderboardView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='week', type=str, location=OpenApiParameter.QUERY,
+                             description='ISO week, e.g. 2025-W23 (default: the current week)'),
+            OpenApiParameter(name='metric', type=str, location=OpenApiParameter.QUERY,
+                             description='distance (default), duration, calories or count'),
+            OpenApiParameter(name='type', type=str, location=OpenApiParameter.QUERY,
+                             description='Only count activities of this type'),
+        ],
+        responses={200: {'type': 'object', 'properties': {
+            'week': {'type': 'string'},
+            'metric': {'type': 'string'},
+            'entries': {'type': 'array', 'items': {'type': 'object', 'properties': {
+                'rank': {'type': 'integer'},
+                'user': {'type': 'object'},
+                'distance': {'type': 'number'},
+                'duration': {'type': 'number'},
+                'calories': {'type': 'number'},
+                'count': {'type': 'integer'},
+            }}}
+        }}}
+    )
+    def get(self, request):
+        user = request.user
+        week = request.query_params.get('week') or iso_week(datetime.utcnow())
+        metric = request.query_params.get('metric', 'distance')
+        
+        if not re.fullmatch(r'\d{4}-W\d{2}', week):
+            return Response(
+                {"error": "week must be an ISO week like 2025-W23"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if metric not in METRICS:
+            return Response(
+                {"error": f"metric must be one of {', '.join(METRICS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # one indexed query over the rollups of the user and their friends
+        ranked = leaderboard([user.id] + friend_ids(user), week, metric, request.query_params.get('type'))
+        profiles = load_profiles([user_id for user_id, _ in ranked])
+        
+        entries = []
+        for user_id, totals in ranked:
+            profile = profiles.get(user_id, {})
+            entries.append({
+                "rank": len(entries) + 1,
+                "user": {
+                    "_id": str(user_id),
+                    "username": profile.get('username'),
+                    "full_name": profile.get('full_name'),
+                    "profile_picture": profile.get('profile_picture'),
+                },
+                **totals
+            })
+        
+        return Response({"week": week, "metric": metric, "entries": entries})
+
+
+HEATMAP_SCOPES = ('me', 'friends')
+
+
+def heatmap_users(user, scope):
+    return [user.id] if scope == 'me' else friend_ids(user)
+
+
+class HeatmapView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='scope', type=str, location=OpenApiParameter.QUERY,
+                             description='me (default) or friends'),
+        ],
+        responses={200: {'type': 'object', 'properties': {
+            'scope': {'type': 'string'},
+            'version': {'type': 'string'},
+            'tiles': {'type': 'string', 'description': 'Tile URL template with {z}, {x} and {y}'},
+            'tile_size': {'type': 'integer'},
+            'min_zoom': {'type': 'integer'},
+            'max_zoom': {'type': 'integer'},
+        }}}
+    )
+    def get(self, request):
+        scope = request.query_params.get('scope', 'me')
+        if scope not in HEATMAP_SCOPES:
+            return Response(
+                {"error": "scope must be me or friends"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # the version in the tile URLs changes with the tiles, so clients never reuse stale ones
+        version = heatmap_version(heatmap_users(request.user, scope))
+        zooms = zoom_levels()
+        return Response({
+            "scope": scope,
+            "version": version,
+            "tiles": f"{request.build_absolute_uri(reverse('heatmap'))}{scope}/{{z}}/{{x}}/{{y}}.png?v={version}",
+            "tile_size": TILE_SIZE,
+            "min_zoom": zooms[0],
+            "max_zoom": zooms[-1],
+        })
+
+
+class HeatmapTileView(APIView):
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [ORJSONRenderer, PNGRenderer]
+
+    @extend_schema(responses={(200, 'image/png'): {'type': 'string', 'format': 'binary'}})
+    def get(self, request, scope, z, x, y):
+        if scope not in HEATMAP_SCOPES or z not in zoom_levels() or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return Response(
+                {"error": "Tile not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        user_ids = heatmap_users(request.user, scope)
+        version = heatmap_version(user_ids)
+        etag = make_etag('heatmap', request.user.id, scope, z, x, y, version)
+        
+        if etag_matches(request, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            # precomputed counts: one indexed query for the tile, summed over friends
+            grid = load_grid(user_ids, z, x, y) if user_ids else None
+            png = render_tile(grid) if grid is not None and grid.any() else empty_tile()
+            response = HttpResponse(png, content_type='image/png')
+        
+        response['ETag'] = etag
+        if request.query_params.get('v') == version:
+            # versioned URL: its content never changes
+            response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class FriendSuggestionsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[OpenApiParameter(name='limit', type=int, location=OpenApiParameter.QUERY)],
+        responses={200: FriendSuggestionSerializer(many=True)}
+    )
+    def get(self, request):
+        user = request.user
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+        except ValueError:
+            return Response(
+                {"error": "limit must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        suggestions = get_suggestions(user, exclude_ids=friend_ids(user), limit=limit)
+
+        serializer = FriendSuggestionSerializer(suggestions, many=True)
         return Response(serializer.data)
 
 
+class MutualFriendsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    MAX_TARGETS = 100
+
+    @extend_schema(
+        parameters=[OpenApiParameter(
+            name='ids', type=str, location=OpenApiParameter.QUERY,
+            description='Comma separated user IDs (up to 100)'
+        )],
+        responses={200: {'type': 'array', 'items': {'type': 'object', 'properties': {
+            '_id': {'type': 'string'},
+            'mutual_count': {'type': 'integer'}
+        }}}}
+    )
+    def get(self, request):
+        user = request.user
+        target_ids = [value for value in request.query_params.get('ids', '').split(',') if value]
+
+        if not target_ids:
+            return Response(
+                {"error": "ids required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if len(target_ids) > self.MAX_TARGETS:
+            return Response(
+                {"error": f"At most {self.MAX_TARGETS} ids per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not all(ObjectId.is_valid(target_id) for target_id in target_ids):
+            return Response(
+                {"error": "Invalid user id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        own_friends = pack_friend_ids(friend_ids(user))
+        packed = sorted_friend_ids([ObjectId(target_id) for target_id in target_ids])
+
+        return Response([
+            {
+                "_id": target_id,
+                "mutual_count": count_common_friends(own_friends, packed.get(ObjectId(target_id), EMPTY_FRIEND_IDS))
+            }
+            for target_id in target_ids
+        ])
+
+
 class PendingFriendRequestsView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -304,6 +594,35 @@ class PendingFriendRequestsView(APIView):
         serializer = FriendRequestSerializer(pending_requests, many=True)
         return Response(serializer.data)
 
+class NotificationsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[OpenApiParameter(name='since', type=int, location=OpenApiParameter.QUERY)],
+        responses={200: NotificationSerializer(many=True)}
+    )
+    def get(self, request):
+        user = request.user
+        since = request.query_params.get('since', '0')
+        
+        if not since.isdigit():
+            return Response(
+                {"error": "since must be a sequence number"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        seq = latest_seq(user.id)
+        if seq <= int(since):
+            return Response({"seq": seq, "notifications": []})
+        
+        notifications = list(notifications_since(user.id, int(since)))
+        if len(notifications) == NOTIFICATIONS_PAGE_SIZE:
+            # a full page: the client continues from its last notification
+            seq = notifications[-1].seq
+        
+        serializer = NotificationSerializer(notifications, many=True)
+        return Response({"seq": seq, "notifications": serializer.data})
+
 class SendFriendRequestView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -336,7 +655,7 @@ class SendFriendRequestView(APIView):
             )
         
         # check if already friends
-        if receiver in sender.friends:
+        if are_friends(sender, receiver.id):
             return Response(
                 {"error": "Already friends"},
                 status=status.HTTP_400_BAD_REQUEST
@@ -361,11 +680,39 @@ class SendFriendRequestView(APIView):
             status='pending'
         )
         friend_request.save()
+        notify(receiver.id, 'friend_request', sender.id, friend_request.id)
         
         serializer = FriendRequestSerializer(friend_request)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+def friend_request_error(request_id, user, action):
+    """Explain why a pending request could not be accepted or rejected by user"""
+    friend_request = None
+    if ObjectId.is_valid(request_id):
+        friend_request = FriendRequest._get_collection().find_one(
+            {'_id': ObjectId(request_id)}, {'receiver': 1}
+        )
+
+    if not friend_request:
+        return Response(
+            {"error": "Friend request not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    # validate that the user is the receiver
+    if friend_request['receiver'] != user.id:
+        return Response(
+            {"error": f"Unauthorized to {action} this request"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    return Response(
+        {"error": "Request already processed"},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
 class AcceptFriendRequestView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -373,41 +720,16 @@ class AcceptFriendRequestView(APIView):
     def post(self, request, request_id):
         user = request.user
         
-        friend_request = FriendRequest.objects(id=request_id).first()
-        if not friend_request:
-            return Response(
-                {"error": "Friend request not found"},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        # validate that the user is the receiver
-        if friend_request.receiver != user:
-            return Response(
-                {"error": "Unauthorized to accept this request"},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        
-        if friend_request.status != 'pending':
-            return Response(
-                {"error": "Request already processed"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        sender = friend_request.sender
-        receiver = friend_request.receiver
+        accepted = accept_friend_request(request_id, user.id)
+        if not accepted:
+            return friend_request_error(request_id, user, "accept")
         
-        friend_request.status = 'accepted'
-        friend_request.updated_at = datetime.utcnow()
-        friend_request.save()
-        
-        # add each other as friends
-        if receiver not in sender.friends:
-            sender.friends.append(receiver)
-            sender.save()
+        friendship_added(accepted['sender'], user.id)
+        notify(accepted['sender'], 'friend_request_accepted', user.id, accepted['_id'])
         
-        if sender not in receiver.friends:
-            receiver.friends.append(sender)
-            receiver.save()
+        friend_request = FriendRequest._from_son(accepted)
+        # the receiver is the authenticated user, no need to dereference it again
+        friend_request.receiver = user
         
         serializer = FriendRequestSerializer(friend_request)
         return Response(serializer.data)
@@ -419,35 +741,9 @@ class RejectFriendRequestView(APIView):
     def post(self, request, request_id):
         user = request.user
         
-        friend_request = FriendRequest.objects(id=request_id).first()
-        if not friend_request:
-            return Response(
-                {"error": "Friend request not found"},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        # validate that the user is the receiver
-        if friend_request.receiver != user:
-            return Response(
-                {"error": "Unauthorized to reject this request"},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        
-        if friend_request.status != 'pending':
-            return Response(
-                {"error": "Request already processed"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        sender = friend_request.sender
-        receiver = friend_request.receiver
-        
-        all_requests = FriendRequest.objects(
-            Q(sender=sender, receiver=receiver) | Q(sender=receiver, receiver=sender)
-        )
-        
-        for req in all_requests:
-            req.delete()
+        rejected = reject_friend_request(request_id, user.id)
+        if not rejected:
+            return friend_request_error(request_id, user, "reject")
                 
         return Response(
             {"message": "Friend request rejected"},
@@ -463,7 +759,7 @@ class UnfriendView(APIView):
     )
     def delete(self, request, friend_id):
         user = request.user
-        friend = UserProfile.objects(id=friend_id).first()
+        friend = UserProfile.objects(id=friend_id).only('id').first()
         
         if not friend:
             return Response(
@@ -472,32 +768,35 @@ class UnfriendView(APIView):
             )
         
         # remove from both friend lists
-        if friend in user.friends:
-            user.friends.remove(friend)
-            user.save()
-        
-        if user in friend.friends:
-            friend.friends.remove(user)
-            friend.save()
+        remove_friendship(user.id, friend.id)
+        friendship_removed(user.id, friend.id)
         
         # delete all existining friend requests to allow new requests
-        friend_requests = FriendRequest.objects(
-            Q(sender=user, receiver=friend) | Q(sender=friend, receiver=user)
-        )
-        for friend_request in friend_requests:
-            friend_request.delete()
+        delete_friend_requests(user.id, friend.id)
         
         return Response({"message": "Friend removed successfully"})
 
+def activity_profile_ids(doc):
+    """Ids of the profiles embedded in a serialized activity, from its raw document"""
+    return [to_object_id(doc['user_id'])] + [
+        to_object_id(value) for value in doc.get('participants', [])
+    ]
+
+
 class ActivitiesListView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @extend_schema(responses={200: ActivitySerializer(many=True)})
+    @extend_schema(responses={200: ActivitySummarySerializer(many=True)})
     def get(self, request):
         user = request.user
         
-        activities = Activity.objects(user_id=user).order_by('-created_at')
-        serializer = ActivitySerializer(activities, many=True)
+        # routes instead of tracks: live_data is never read
+        activities = Activity.objects(user_id=user).exclude('live_data').order_by('-created_at')
+        
+        if fast_serialization():
+            return Response(render_queryset(ACTIVITY_SUMMARY_PLAN, activities))
+        
+        serializer = ActivitySummarySerializer(activities.select_related(), many=True)
         return Response(serializer.data)
 
     @extend_schema(
@@ -517,7 +816,8 @@ class ActivitiesListView(APIView):
             user_id=user,
             type=serializer.validated_data['type'],
             start_time=serializer.validated_data.get('start_time', datetime.utcnow()),
-            status='in_progress'
+            status='in_progress',
+            public=serializer.validated_data.get('public', False)
         )
         
         # add participants if its possible
@@ -532,21 +832,118 @@ class ActivitiesListView(APIView):
         response_serializer = ActivitySerializer(activity)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
+class NearbyActivitiesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='lat', type=float, location=OpenApiParameter.QUERY, required=True),
+            OpenApiParameter(name='lng', type=float, location=OpenApiParameter.QUERY, required=True),
+            OpenApiParameter(name='radius', type=int, location=OpenApiParameter.QUERY,
+                             description=f'Meters (default {NEARBY_DEFAULT_RADIUS}, at most {NEARBY_MAX_RADIUS})'),
+            OpenApiParameter(name='status', type=str, location=OpenApiParameter.QUERY,
+                             description='e.g. in_progress for people active near you'),
+            OpenApiParameter(name='after', type=str, location=OpenApiParameter.QUERY,
+                             description='The "next" cursor of the previous page'),
+        ],
+        responses={200: {'type': 'object', 'properties': {
+            'results': {'type': 'array', 'items': {'type': 'object'}},
+            'next': {'type': 'string', 'nullable': True},
+        }}}
+    )
+    def get(self, request):
+        user = request.user
+        
+        try:
+            latitude = float(request.query_params['lat'])
+            longitude = float(request.query_params['lng'])
+            radius = float(request.query_params.get('radius', NEARBY_DEFAULT_RADIUS))
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "lat and lng are required numbers, radius a number of meters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or not 0 < radius <= NEARBY_MAX_RADIUS:
+            return Response(
+                {"error": f"lat/lng out of range, or radius not in (0, {NEARBY_MAX_RADIUS}]"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        after = None
+        if request.query_params.get('after'):
+            try:
+                after = parse_cursor(request.query_params['after'])
+            except ValueError:
+                return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        query = {'public': True, 'user_id': {'$ne': user.id}}
+        if request.query_params.get('status'):
+            query['status'] = request.query_params['status']
+        
+        # nearest first, served by the (public, status, start_point 2dsphere) index
+        docs = list(Activity._get_collection().aggregate(
+            nearby_pipeline(longitude, latitude, radius, query, after, NEARBY_PAGE_SIZE)
+        ))
+        profiles = load_profiles({doc['user_id'] for doc in docs})
+        
+        results = []
+        for doc in docs:
+            profile = profiles.get(doc['user_id'], {})
+            results.append({
+                "_id": str(doc['_id']),
+                "activity_name": doc.get('activity_name'),
+                "type": doc.get('type'),
+                "status": doc.get('status'),
+                "start_time": doc['start_time'].isoformat() if doc.get('start_time') else None,
+                "start_point": doc.get('start_point'),
+                "meters_away": doc['meters_away'],
+                "user": {
+                    "_id": str(doc['user_id']),
+                    "username": profile.get('username'),
+                    "full_name": profile.get('full_name'),
+                    "profile_picture": profile.get('profile_picture'),
+                },
+            })
+        
+        return Response({"results": results, "next": next_cursor(docs, after, NEARBY_PAGE_SIZE)})
+
+
 class ActivityDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     @extend_schema(responses={200: ActivitySerializer})
     def get(self, request, activity_id):
-        activity = Activity.objects(id=activity_id).first()
+        validators = None
+        if ObjectId.is_valid(activity_id):
+            validators = Activity._get_collection().find_one(
+                {'_id': ObjectId(activity_id)},
+                {'updated_at': 1, 'user_id': 1, 'participants': 1}
+            )
         
-        if not activity:
+        if not validators:
             return Response(
                 {"error": "Activity not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        serializer = ActivitySerializer(activity)
-        return Response(serializer.data)
+        etag = make_etag(
+            'activity', validators['_id'], validators.get('updated_at'),
+            profile_versions(activity_profile_ids(validators))
+        )
+        
+        def build_response():
+            activity = Activity.objects(id=activity_id).first()
+            if not activity:
+                return Response(
+                    {"error": "Activity not found"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            
+            serializer = ActivitySerializer(activity)
+            return Response(serializer.data)
+        
+        return conditional_response(request, etag, build_response)
 
     @extend_schema(
         request=ActivityUpdateSerializer,
@@ -565,6 +962,11 @@ class ActivityDetailView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
+        # the derived documents move from this state; the write only lands if nobody changed it since
+        unchanged = activity_unchanged(activity)
+        contribution = activity_contribution(activity)
+        track = completed_track(activity)
+        
         if 'activity_name' in serializer.validated_data:
             activity.activity_name = serializer.validated_data['activity_name']
         if 'status' in serializer.validated_data:
@@ -577,6 +979,8 @@ class ActivityDetailView(APIView):
             activity.calories = serializer.validated_data['calories']
         if 'avg_time' in serializer.validated_data:
             activity.avg_time = serializer.validated_data['avg_time']
+        if 'public' in serializer.validated_data:
+            activity.public = serializer.validated_data['public']
         if 'live_data' in serializer.validated_data:
             live_data_points = []
             for data_point in serializer.validated_data['live_data']:
@@ -584,8 +988,35 @@ class ActivityDetailView(APIView):
                 live_data_points.append(point)
             activity.live_data = live_data_points
         
+        # the bounding box and route cover the final track
+        if 'live_data' in serializer.validated_data or 'status' in serializer.validated_data:
+            geometry = track_geometry(activity.live_data)
+            activity.start_point = geometry['start_point']
+            activity.bbox = geometry['bbox']
+            activity.route = route_polyline(activity.live_data) if activity.status == 'completed' else None
+        
         activity.updated_at = datetime.utcnow()
-        activity.save()
+        try:
+            activity.save(save_condition=unchanged)
+        except SaveConditionError:
+            return activity_conflict(activity_id)
+        updated = activity_contribution(activity)
+        apply_contribution_change(contribution, updated)
+        apply_stats_change(contribution, updated)
+        if 'live_data' in serializer.validated_data or 'status' in serializer.validated_data:
+            # only the tiles the track entered or left
+            apply_heatmap_change(to_object_id(activity._data.get('user_id')), track, completed_track(activity))
+        
+        # let live viewers resync (replaced track) or stop (finished activity)
+        message = {}
+        if 'live_data' in serializer.validated_data:
+            message['reset'] = True
+            message['start'] = 0
+            message['points'] = LiveDataPointSerializer(activity.live_data, many=True).data
+        if 'status' in serializer.validated_data:
+            message['status'] = activity.status
+        if message:
+            get_channel_layer().publish(activity_group(activity.id), message)
         
         response_serializer = ActivitySerializer(activity)
         return Response(response_serializer.data)
@@ -602,19 +1033,147 @@ class ActivityDetailView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        activity.delete()
+        if not Activity.objects(id=activity.id, **activity_unchanged(activity)).delete():
+            return activity_conflict(activity_id)
+        contribution = activity_contribution(activity)
+        apply_contribution_change(contribution, None)
+        apply_stats_change(contribution, None)
+        apply_heatmap_change(to_object_id(activity._data.get('user_id')), completed_track(activity), None)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+def activity_unchanged(activity):
+    """Condition matching the activity only while it is as loaded (every write sets updated_at)"""
+    return {'status': activity.status, 'updated_at': activity.updated_at}
+
+
+def activity_conflict(activity_id):
+    """Explain why a conditional activity write matched nothing"""
+    if not Activity.objects(id=activity_id).only('id').first():
+        return Response(
+            {"error": "Activity not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    return Response(
+        {"error": "Activity was changed by another request"},
+        status=status.HTTP_409_CONFLICT
+    )
+
+class ActivityLiveDataView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=LiveDataAppendSerializer,
+        responses={200: None}
+    )
+    def post(self, request, activity_id):
+        user = request.user
+        
+        serializer = LiveDataAppendSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        points = serializer.validated_data['points']
+        
+        # append only the new points instead of rewriting the whole live_data list
+        updated = None
+        if ObjectId.is_valid(activity_id):
+            updated = Activity._get_collection().find_one_and_update(
+                {'_id': ObjectId(activity_id), 'user_id': user.id, 'status': 'in_progress'},
+                {
+                    '$push': {'live_data': {'$each': [LiveDataPoint(**point).to_mongo() for point in points]}},
+                    '$set': {'updated_at': datetime.utcnow()}
+                },
+                projection={'count': {'$size': '$live_data'}, 'start_point': 1},
+                return_document=ReturnDocument.AFTER
+            )
+        
+        if not updated:
+            return live_data_error(activity_id, user)
+        
+        # until the first located point arrives; conditional, so it is only ever set once
+        if not updated.get('start_point'):
+            first_point = start_point(points)
+            if first_point:
+                Activity._get_collection().update_one(
+                    {'_id': updated['_id'], 'start_point': None}, {'$set': {'start_point': first_point}}
+                )
+        
+        start = updated['count'] - len(points)
+        get_channel_layer().publish(activity_group(activity_id), {
+            'start': start,
+            'points': LiveDataPointSerializer(points, many=True).data
+        })
+        
+        return Response({"start": start, "count": updated['count']})
+
+
+def live_data_error(activity_id, user):
+    """Explain why a live data append matched no activity"""
+    activity = None
+    if ObjectId.is_valid(activity_id):
+        activity = Activity._get_collection().find_one(
+            {'_id': ObjectId(activity_id)}, {'user_id': 1, 'status': 1}
+        )
+
+    if not activity:
+        return Response(
+            {"error": "Activity not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if activity['user_id'] != user.id:
+        return Response(
+            {"error": "Not authorized to update this activity"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    return Response(
+        {"error": "Activity is not in progress"},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
 class FriendsActivitiesView(APIView):
     permission_classes = [IsAuthenticated]
 
-    @extend_schema(responses={200: ActivitySerializer(many=True)})
+    @extend_schema(responses={200: ActivitySummarySerializer(many=True)})
     def get(self, request):
         user = request.user
         
-        friend_activities = Activity.objects(
-            user_id__in=user.friends
-        ).order_by('-created_at')[:50]
+        # validators only, live_data and embedded profiles are not loaded
+        recent = list(Activity._get_collection().find(
+            {'user_id': {'$in': friend_ids(user)}},
+            {'updated_at': 1, 'user_id': 1, 'participants': 1}
+        ).sort('created_at', -1).limit(50))
+        
+        profile_ids = list(dict.fromkeys(
+            profile_id for doc in recent for profile_id in activity_profile_ids(doc)
+        ))
+        etag = make_etag(
+            'friends_activities',
+            [(doc['_id'], doc.get('updated_at')) for doc in recent],
+            profile_versions(profile_ids)
+        )
+        
+        def build_response():
+            activity_ids = [doc['_id'] for doc in recent]
+            activities = Activity.objects(id__in=activity_ids).exclude('live_data')
+            
+            if fast_serialization():
+                docs_by_id = {
+                    doc['_id']: doc for doc in activities.only(*ACTIVITY_SUMMARY_PLAN.only_fields).as_pymongo()
+                }
+                return Response(render_documents(ACTIVITY_SUMMARY_PLAN, [
+                    docs_by_id[activity_id] for activity_id in activity_ids if activity_id in docs_by_id
+                ]))
+            
+            activities_by_id = {activity.id: activity for activity in activities.select_related()}
+            friend_activities = [
+                activities_by_id[activity_id] for activity_id in activity_ids
+                if activity_id in activities_by_id
+            ]
+            
+            serializer = ActivitySummarySerializer(friend_activities, many=True)
+            return Response(serializer.data)
         
-        serializer = ActivitySerializer(friend_activities, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return conditional_response(request, etag, build_response)
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+Throughput benchmark: sync vs async endpoints under many concurrent clients
+
+Start one worker per server flavour against the same local mongod, e.g.
+
+    gunicorn config.wsgi -w 1 --threads 8 -b 127.0.0.1:8000
+    uvicorn config.asgi:application --workers 1 --port 8001
+
+then run
+
+    python benchmarks/bench_async.py --email john@example.com --password ... \\
+        --sync-url http://127.0.0.1:8000 --async-url http://127.0.0.1:8001
+
+Each path pair (sync view, async view) is hammered by --clients concurrent
+closed-loop clients for --duration seconds and reported as requests/second
+per worker with p50/p99 latency.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+ENDPOINTS = [
+    ("activities list", "/api/activities/", "/api/async/activities/"),
+    ("friends feed", "/api/activities/friends/", "/api/async/activities/friends/"),
+    ("search", "/api/users/search/?q=jo", "/api/async/users/search/?q=jo"),
+]
+
+
+async def login(session, base_url, email, password):
+    async with session.post(f"{base_url}/api/auth/login/", json={"email": email, "password": password}) as response:
+        response.raise_for_status()
+        return (await response.json())["access_token"]
+
+
+async def run_clients(session, url, headers, clients, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with session.get(url, headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sync-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--async-url', default='http://127.0.0.1:8001')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30)
+    args = parser.parse_args()
+
+    connector = aiohttp.TCPConnector(limit=args.clients)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        token = await login(session, args.sync_url, args.email, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        print(f"{args.clients} concurrent clients, {args.duration:.0f}s per run\n")
+        print(f"   {'endpoint':<16} {'flavour':<6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+
+        for name, sync_path, async_path in ENDPOINTS:
+            for flavour, url in (("sync", args.sync_url + sync_path), ("async", args.async_url + async_path)):
+                latencies, errors = await run_clients(session, url, headers, args.clients, args.duration)
+                print(
+                    f"   {name:<16} {flavour:<6} {len(latencies) / args.duration:8.1f} "
+                    f"{statistics.median(latencies) * 1000:8.1f} {percentile(latencies, 0.99) * 1000:8.1f} "
+                    f"{errors:7d}"
+                )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+"""
+Benchmark for nearby-activity discovery ($geoNear on the 2dsphere index)
+
+Seeds a collection of the configured MongoDB (settings.MONGO_DB_*) with
+activities whose start points cluster around a few cities, builds the same
+geo index as Activity, then times nearby pages at random points and checks
+with explain that every query is served by the index (exits 1 otherwise).
+
+    python benchmarks/bench_geo.py --activities 2000000 --queries 200
+
+The collection is kept between runs and reseeded only when its size differs
+from --activities (or with --reseed); app data is never touched.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from bson import ObjectId
+from mongoengine.connection import get_db
+
+from apps.users.geo import nearby_pipeline, next_cursor, parse_cursor, NEARBY_PAGE_SIZE
+from apps.users.models import Activity
+from config.slow_queries import plan_summary
+from populate_db import CITIES, METERS_PER_DEGREE
+
+TYPES = ['running', 'cycling', 'walking', 'hiking']
+
+
+def geo_index_keys():
+    """Key list of Activity's 2dsphere index, so the benchmark measures the real one"""
+    for spec in Activity._meta['index_specs']:
+        if any(direction == '2dsphere' for _, direction in spec['fields']):
+            return spec['fields']
+    raise SystemExit("Activity has no 2dsphere index")
+
+
+def random_point(rng, spread_m):
+    lat, lon = rng.choice(CITIES)
+    lat += rng.gauss(0, spread_m) / METERS_PER_DEGREE
+    lon += rng.gauss(0, spread_m) / METERS_PER_DEGREE
+    return round(max(min(lon, 180), -180), 6), round(max(min(lat, 90), -90), 6)
+
+
+def seed(collection, count, users, batch_size, rng):
+    collection.drop()
+    owners = [ObjectId() for _ in range(users)]
+    now = datetime.utcnow()
+    inserted = 0
+
+    while inserted < count:
+        batch = []
+        for _ in range(min(batch_size, count - inserted)):
+            roll = rng.random()
+            status = 'completed' if roll < 0.9 else 'in_progress' if roll < 0.95 else 'planned'
+            created_at = now - timedelta(days=rng.uniform(0, 365))
+            doc = {
+                'activity_name': 'Bench activity',
+                'user_id': rng.choice(owners),
+                'type': rng.choice(TYPES),
+                'status': status,
+                'public': rng.random() < 0.3,
+                'start_time': created_at,
+                'created_at': created_at,
+            }
+            if status != 'planned':
+                longitude, latitude = random_point(rng, 8000)
+                doc['start_point'] = {'type': 'Point', 'coordinates': [longitude, latitude]}
+            batch.append(doc)
+        collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+        print(f"   {inserted}/{count}", end='\r')
+    print()
+
+
+def explain(db, collection, pipeline):
+    result = db.command({
+        'explain': {'aggregate': collection.name, 'pipeline': pipeline, 'cursor': {}},
+        'verbosity': 'executionStats',
+    })
+    summary = plan_summary(result)
+
+    stats = result.get('executionStats')
+    if stats is None:
+        cursor = (result.get('stages') or [{}])[0]
+        stats = (cursor.get('$geoNearCursor') or cursor.get('$cursor') or {}).get('executionStats', {})
+    summary['keys_examined'] = stats.get('totalKeysExamined')
+    summary['docs_examined'] = stats.get('totalDocsExamined')
+    return summary
+
+
+def percentiles(timings):
+    ordered = sorted(timings)
+    return (
+        f"p50={statistics.median(ordered) * 1000:.1f}ms "
+        f"p95={ordered[int(len(ordered) * 0.95)] * 1000:.1f}ms "
+        f"p99={ordered[int(len(ordered) * 0.99)] * 1000:.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--activities', type=int, default=2_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--collection', default='bench_nearby_activities')
+    parser.add_argument('--reseed', action='store_true')
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--pages', type=int, default=3, help="pages fetched per query")
+    parser.add_argument('--radius', type=float, default=5000, help="meters")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = get_db()
+    collection = db[args.collection]
+
+    if args.reseed or collection.estimated_document_count() != args.activities:
+        print(f"Seeding {args.activities} activities into {db.name}.{args.collection}...")
+        started = time.perf_counter()
+        seed(collection, args.activities, args.users, args.batch_size, rng)
+        print(f"   seeded in {time.perf_counter() - started:.0f}s")
+
+    keys = geo_index_keys()
+    started = time.perf_counter()
+    index = collection.create_index(keys)
+    print(f"Index {index} ready in {time.perf_counter() - started:.1f}s\n")
+
+    timings = {'first page': [], 'next pages': []}
+    returned = 0
+    for query_number in range(args.queries):
+        longitude, latitude = random_point(rng, 3000)
+        # alternate discovery of public activities and of people active right now
+        query = {'public': True}
+        if query_number % 2:
+            query['status'] = 'in_progress'
+
+        after = None
+        for page in range(args.pages):
+            pipeline = nearby_pipeline(longitude, latitude, args.radius, query, after, NEARBY_PAGE_SIZE)
+            started = time.perf_counter()
+            docs = list(collection.aggregate(pipeline))
+            timings['first page' if page == 0 else 'next pages'].append(time.perf_counter() - started)
+            returned += len(docs)
+
+            cursor = next_cursor(docs, after, NEARBY_PAGE_SIZE)
+            if cursor is None:
+                break
+            after = parse_cursor(cursor)
+
+    for name, values in timings.items():
+        if values:
+            print(f"{name:>10}: {len(values)} queries {percentiles(values)}")
+    print(f"{returned / args.queries:.1f} results per query on average\n")
+
+    failures = 0
+    longitude, latitude = CITIES[0][1], CITIES[0][0]
+    for name, query in (('public', {'public': True}), ('active', {'public': True, 'status': 'in_progress'})):
+        summary = explain(db, collection, nearby_pipeline(longitude, latitude, args.radius, query))
+        uses_index = bool(summary['indexes']) and not summary['collscan']
+        failures += not uses_index
+        print(
+            f"explain {name}: {' <- '.join(summary['stages'])} ({', '.join(summary['indexes']) or 'no index'}), "
+            f"keys examined={summary['keys_examined']} docs examined={summary['docs_examined']} "
+            f"{'ok' if uses_index else 'NOT INDEXED'}"
+        )
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
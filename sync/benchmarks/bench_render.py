@@ -0,0 +1,105 @@
+"""
+Benchmark for JSON rendering and response compression
+
+Serializes a synthetic activity with a large live_data trace and compares
+DRF's JSONRenderer with ORJSONRenderer (render time) and the body size raw,
+gzipped and brotli-compressed.
+
+    python benchmarks/bench_render.py --points 10000
+"""
+
+import argparse
+import gzip
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import brotli
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from apps.users.models import UserProfile, Activity, LiveDataPoint
+from apps.users.parsers import ORJSONParser
+from apps.users.renderers import ORJSONRenderer
+from apps.users.serializers import ActivitySerializer
+
+
+def build_activity(points):
+    owner = UserProfile(username="bench_runner", full_name="Bench Runner")
+    start = datetime(2025, 6, 1, 7, 0, 0)
+    activity = Activity(
+        activity_name="Long Run",
+        user_id=owner,
+        type="running",
+        status="completed",
+        start_time=start,
+        end_time=start + timedelta(seconds=points),
+        distance=points * 0.003,
+        calories=points * 0.2,
+    )
+    for index in range(points):
+        activity.live_data.append(LiveDataPoint(
+            timestamp=start + timedelta(seconds=index),
+            latitude=40.7128 + index * 1e-5,
+            longitude=-74.0060 + index * 1e-5,
+            speed=3.2 + (index % 7) * 0.1,
+            heart_rate=130 + index % 30,
+            calories=index * 0.2,
+        ))
+    return activity
+
+
+def timeit(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    data = ActivitySerializer(build_activity(args.points)).data
+    print(f"Activity with {args.points} live data points\n")
+
+    results = {}
+    for name, renderer in (("JSONRenderer", JSONRenderer()), ("ORJSONRenderer", ORJSONRenderer())):
+        elapsed, body = timeit(lambda: renderer.render(data), args.repeat)
+        results[name] = (elapsed, body)
+        print(f"   {name:<16} render {elapsed:8.2f}ms  {len(body):>10,} bytes")
+
+    body = results["ORJSONRenderer"][1]
+    for name, parser_instance in (("JSONParser", JSONParser()), ("ORJSONParser", ORJSONParser())):
+        elapsed, _ = timeit(lambda: parser_instance.parse(BytesIO(body)), args.repeat)
+        print(f"   {name:<16} parse  {elapsed:8.2f}ms")
+
+    print()
+    gzip_ms, gzipped = timeit(
+        lambda: gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0), args.repeat
+    )
+    brotli_ms, brotlied = timeit(
+        lambda: brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY), args.repeat
+    )
+    print(f"   {'identity':<16} {len(body):>10,} bytes")
+    print(f"   {'gzip':<16} {len(gzipped):>10,} bytes  ({len(gzipped) / len(body):.1%}, {gzip_ms:.2f}ms)")
+    print(f"   {'br':<16} {len(brotlied):>10,} bytes  ({len(brotlied) / len(body):.1%}, {brotli_ms:.2f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark for the friend-of-friend suggestion engine
+
+Builds a synthetic power-law friendship graph and times compute_suggestions
+over sampled batches, then extrapolates the cost of a full rebuild.
+
+    python benchmarks/bench_suggestions.py --users 1000000 --edges-per-user 5
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from apps.users.suggestions import compute_suggestions, SUGGESTIONS_PER_USER, SUGGESTIONS_MAX_FANOUT
+from benchmarks.synthetic import power_law_graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--edges-per-user', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=SUGGESTIONS_PER_USER)
+    parser.add_argument('--max-fanout', type=int, default=SUGGESTIONS_MAX_FANOUT)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Building power-law graph: {args.users} users, m={args.edges_per_user}...")
+    started = time.perf_counter()
+    graph = power_law_graph(args.users, args.edges_per_user, args.seed)
+    print(f"   built in {time.perf_counter() - started:.1f}s")
+
+    degrees = sorted((len(friends) for friends in graph), reverse=True)
+    print(f"   degree: max={degrees[0]} p99={degrees[len(degrees) // 100]} "
+          f"median={degrees[len(degrees) // 2]} mean={statistics.mean(degrees):.1f}")
+
+    adjacency = dict(enumerate(graph))
+    rng = random.Random(args.seed)
+    timings = []
+    candidates = 0
+
+    for _ in range(args.batches):
+        batch = rng.sample(range(args.users), args.batch_size)
+        started = time.perf_counter()
+        result = compute_suggestions(batch, adjacency, args.limit, args.max_fanout)
+        timings.append(time.perf_counter() - started)
+        candidates += sum(len(items) for items in result.values())
+
+    per_user = sum(timings) / (args.batches * args.batch_size)
+    print(f"\nBatches of {args.batch_size}: mean={statistics.mean(timings) * 1000:.1f}ms "
+          f"max={max(timings) * 1000:.1f}ms")
+    print(f"Per user: {per_user * 1e6:.1f}µs, "
+          f"{candidates / (args.batches * args.batch_size):.1f} candidates stored on average")
+    print(f"Extrapolated full rebuild (compute only): {per_user * args.users / 60:.1f} min")
+
+
+if __name__ == "__main__":
+    main()
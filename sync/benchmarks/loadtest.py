@@ -0,0 +1,348 @@
+"""
+Load test: realistic user mixes against a running server, with per-endpoint tail latency
+
+Runs virtual users through weighted scenarios (login, opening the feed,
+syncing live data, typing a search, a friend request round trip) against a
+local server backed by a local mongod, e.g.
+
+    export THROTTLE_LOGIN_IP=100000/min THROTTLE_SEARCH_IP=100000/min THROTTLE_SEARCH_USER=100000/min
+    gunicorn config.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+    python benchmarks/loadtest.py --users 200 --duration 60 --output run.json
+
+Every virtual user comes from the same address, so with the default rates
+the per-IP throttles on login and search reject most of the load; raise
+them as above. Throttled (429) responses are counted apart from the
+latencies, and the run fails when they are more than --max-throttled
+percent of the requests.
+
+Closed loop (default): --users virtual users each run a scenario, think for
+an exponentially distributed --think seconds and start over, so load adapts
+to the server's speed. Open loop (--rate N): scenarios start at N per second
+(Poisson arrivals) whatever the response times, which exposes queueing; at
+most --max-in-flight run at once and the excess is counted as dropped.
+
+Accounts are --email-pattern formatted with 0..--users-1, all sharing
+--password (see populate_db.py), or an --accounts JSON list of
+{"email", "password"}. Results (p50/p95/p99 per endpoint) are printed and
+saved with --output; --compare BASELINE.json reports the change against a
+previous run and exits with an error when a p95 regresses by more than
+--threshold percent.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+import aiohttp
+
+SCENARIO_WEIGHTS = {
+    'open_feed': 40,
+    'search_typing': 20,
+    'live_sync': 15,
+    'friend_request': 10,
+    'login': 15,
+}
+
+SEARCH_TERMS = ['john', 'sarah', 'runner', 'mike', 'emma']
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.throttled = {}
+        self.dropped = 0
+
+    def add(self, endpoint, seconds, ok):
+        self.samples.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def add_throttled(self, endpoint):
+        # rejected before doing any work: not a latency sample
+        self.throttled[endpoint] = self.throttled.get(endpoint, 0) + 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for endpoint in sorted(set(self.samples) | set(self.throttled)):
+            ordered = sorted(self.samples.get(endpoint, [])) or [0.0]
+            endpoints[endpoint] = {
+                'requests': len(self.samples.get(endpoint, [])),
+                'errors': self.errors.get(endpoint, 0),
+                'throttled': self.throttled.get(endpoint, 0),
+                'rps': len(self.samples.get(endpoint, [])) / duration,
+                'p50_ms': percentile(ordered, 0.50) * 1000,
+                'p95_ms': percentile(ordered, 0.95) * 1000,
+                'p99_ms': percentile(ordered, 0.99) * 1000,
+                'max_ms': ordered[-1] * 1000,
+            }
+        return endpoints
+
+
+class VirtualUser:
+    def __init__(self, session, base_url, account, peers, recorder):
+        self.session = session
+        self.base_url = base_url
+        self.account = account
+        self.peers = peers
+        self.recorder = recorder
+        self.token = None
+        self.user_id = None
+        self.etags = {}
+
+    async def request(self, endpoint, method, path, token=None, **kwargs):
+        headers = kwargs.pop('headers', {})
+        token = token or self.token
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+
+        started = time.perf_counter()
+        try:
+            async with self.session.request(method, self.base_url + path, headers=headers, **kwargs) as response:
+                body = await response.read()
+                if response.status == 429:
+                    self.recorder.add_throttled(endpoint)
+                    return response, None
+                ok = response.status < 400
+                self.recorder.add(endpoint, time.perf_counter() - started, ok)
+                data = json.loads(body) if body and response.content_type == 'application/json' else None
+                return response, data
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.recorder.add(endpoint, time.perf_counter() - started, False)
+            return None, None
+
+    async def cached_get(self, endpoint, path):
+        """GET revalidating with the last ETag, the way the mobile client does"""
+        headers = {'If-None-Match': self.etags[path]} if path in self.etags else {}
+        response, data = await self.request(endpoint, 'GET', path, headers=headers)
+        if response is not None and response.headers.get('ETag'):
+            self.etags[path] = response.headers['ETag']
+        return data
+
+    async def login(self):
+        response, data = await self.request('login', 'POST', '/api/auth/login/', json={
+            'email': self.account['email'], 'password': self.account['password']
+        })
+        if data and 'access_token' in data:
+            self.token = data['access_token']
+            self.user_id = data['user']['_id']
+        return self.token is not None
+
+    async def open_feed(self):
+        await self.cached_get('friends_feed', '/api/activities/friends/')
+        await self.cached_get('activities_list', '/api/activities/')
+        await self.request('notifications', 'GET', '/api/notifications/')
+
+    async def search_typing(self):
+        term = random.choice(SEARCH_TERMS)
+        for length in range(2, len(term) + 1):
+            await self.request('search', 'GET', '/api/users/search/', params={'q': term[:length]})
+            await asyncio.sleep(random.uniform(0.1, 0.3))
+
+    async def live_sync(self):
+        _, activity = await self.request('create_activity', 'POST', '/api/activities/', json={
+            'activity_name': 'Load test run', 'type': 'running'
+        })
+        if not activity:
+            return
+
+        path = f"/api/activities/{activity['_id']}"
+        now = time.time()
+        for batch in range(5):
+            points = [
+                {
+                    'timestamp': datetime.fromtimestamp(now + batch * 10 + i, timezone.utc).isoformat(),
+                    'latitude': 40.7 + random.random() / 100,
+                    'longitude': -74.0 + random.random() / 100,
+                    'speed': random.uniform(2, 4),
+                    'heart_rate': random.randint(110, 170),
+                }
+                for i in range(10)
+            ]
+            await self.request('live_append', 'POST', f"{path}/live/", json={'points': points})
+            await asyncio.sleep(random.uniform(0.2, 0.5))
+
+        await self.request('finish_activity', 'PATCH', f"{path}/", json={'status': 'completed'})
+
+    async def friend_request(self):
+        peer = random.choice(self.peers)
+        if peer is self or not await peer.ensure_logged_in():
+            return
+
+        _, sent = await self.request('send_friend_request', 'POST', '/api/friends/requests/send/', json={
+            'receiver_id': peer.user_id
+        })
+        await self.request('pending_requests', 'GET', '/api/friends/requests/pending/', token=peer.token)
+        if not sent or '_id' not in sent:
+            return
+
+        await self.request(
+            'accept_friend_request', 'POST', f"/api/friends/requests/{sent['_id']}/accept/", token=peer.token
+        )
+        # leave the graph as we found it
+        await self.request('unfriend', 'DELETE', f"/api/friends/{peer.user_id}/unfriend/")
+
+    async def ensure_logged_in(self):
+        return self.token is not None or await self.login()
+
+    async def run_scenario(self, name):
+        if name == 'login':
+            await self.login()
+        elif await self.ensure_logged_in():
+            await getattr(self, name)()
+
+
+def pick_scenario():
+    names = list(SCENARIO_WEIGHTS)
+    return random.choices(names, weights=[SCENARIO_WEIGHTS[name] for name in names])[0]
+
+
+async def closed_loop(users, duration, think):
+    deadline = time.perf_counter() + duration
+
+    async def loop(user):
+        while time.perf_counter() < deadline:
+            await user.run_scenario(pick_scenario())
+            await asyncio.sleep(random.expovariate(1 / think) if think else 0)
+
+    await asyncio.gather(*(loop(user) for user in users))
+
+
+async def open_loop(users, duration, rate, max_in_flight, recorder):
+    deadline = time.perf_counter() + duration
+    in_flight = set()
+
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(random.expovariate(rate))
+        if len(in_flight) >= max_in_flight:
+            recorder.dropped += 1
+            continue
+        task = asyncio.create_task(random.choice(users).run_scenario(pick_scenario()))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+
+def load_accounts(args):
+    if args.accounts:
+        with open(args.accounts) as f:
+            return json.load(f)
+    return [{'email': args.email_pattern.format(i), 'password': args.password} for i in range(args.users)]
+
+
+def print_summary(endpoints, baseline=None):
+    print(
+        f"   {'endpoint':<22} {'requests':>9} {'errors':>7} {'429s':>7} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for endpoint, row in endpoints.items():
+        line = (
+            f"   {endpoint:<22} {row['requests']:9d} {row['errors']:7d} {row['throttled']:7d} {row['rps']:8.1f} "
+            f"{row['p50_ms']:8.1f} {row['p95_ms']:8.1f} {row['p99_ms']:8.1f}"
+        )
+        if baseline and endpoint in baseline and row['requests']:
+            line += f"   p95 {percent_change(baseline[endpoint]['p95_ms'], row['p95_ms']):+.1f}%"
+        print(line)
+
+
+def percent_change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+def throttled_percent(endpoints):
+    throttled = sum(row['throttled'] for row in endpoints.values())
+    total = throttled + sum(row['requests'] for row in endpoints.values())
+    return throttled / total * 100 if total else 0.0
+
+
+def regressions(endpoints, baseline, threshold):
+    return [
+        endpoint for endpoint, row in endpoints.items()
+        if endpoint in baseline and row['requests'] and percent_change(baseline[endpoint]['p95_ms'], row['p95_ms']) > threshold
+    ]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--email-pattern', default='user{}@example.com')
+    parser.add_argument('--password', default='password123')
+    parser.add_argument('--accounts', help="JSON file with [{\"email\": ..., \"password\": ...}]")
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--think', type=float, default=1.0, help="mean think time between scenarios (closed loop)")
+    parser.add_argument('--rate', type=float, help="scenarios started per second (open loop)")
+    parser.add_argument('--max-in-flight', type=int, default=1000)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--output', help="save the results as JSON")
+    parser.add_argument('--compare', help="JSON results of a previous run")
+    parser.add_argument('--threshold', type=float, default=10.0, help="p95 regression (%%) that fails --compare")
+    parser.add_argument('--max-throttled', type=float, default=5.0, help="share of 429s (%%) that fails the run")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    recorder = Recorder()
+    connector = aiohttp.TCPConnector(limit=args.max_in_flight)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        users = []
+        for account in load_accounts(args):
+            users.append(VirtualUser(session, args.url, account, users, recorder))
+
+        mode = f"open loop, {args.rate:g} scenarios/s" if args.rate else f"closed loop, {len(users)} users"
+        print(f"{mode}, {args.duration:.0f}s against {args.url}\n")
+
+        started = time.perf_counter()
+        if args.rate:
+            await open_loop(users, args.duration, args.rate, args.max_in_flight, recorder)
+        else:
+            await closed_loop(users, args.duration, args.think)
+        elapsed = time.perf_counter() - started
+
+    endpoints = recorder.summary(elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['endpoints']
+
+    print_summary(endpoints, baseline)
+    if recorder.dropped:
+        print(f"\n   {recorder.dropped} arrivals dropped at --max-in-flight {args.max_in_flight}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'started_at': datetime.now(timezone.utc).isoformat(),
+                'config': vars(args),
+                'duration': elapsed,
+                'dropped': recorder.dropped,
+                'endpoints': endpoints,
+            }, f, indent=2)
+
+    throttled = throttled_percent(endpoints)
+    if throttled > args.max_throttled:
+        print(f"\n{throttled:.1f}% of requests were throttled (429), the latencies do not reflect the load;"
+              f" raise the THROTTLE_* rates on the server")
+        sys.exit(1)
+
+    if baseline:
+        regressed = regressions(endpoints, baseline, args.threshold)
+        if regressed:
+            print(f"\np95 regressed by more than {args.threshold:g}%: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Fixtures for the microbenchmarks: Django settings and a seeded database.
+
+Runs against mongomock by default; set BENCH_MONGO_URL (a MongoDB URI with
+a database name, e.g. mongodb://localhost:27017/sync_bench) to run against
+a local mongod. The database is dropped at the end of the session.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# the benchmarks sign their own tokens, no real secrets needed
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret')
+os.environ.setdefault('JWT_ALGORITHM', 'HS256')
+os.environ.setdefault('JWT_EXPIRATION_DAYS', '1')
+
+import django
+
+django.setup()
+
+LIVE_DATA_POINTS = 10_000
+FRIENDS = 1_000
+SEARCHABLE_USERS = 2_000
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    import mongomock
+    from mongoengine import connect, disconnect
+    from mongoengine.connection import get_db
+
+    url = os.getenv('BENCH_MONGO_URL')
+    disconnect(alias='default')
+    if url:
+        connect(host=url, alias='default')
+    else:
+        connect('bench_db', host='mongodb://localhost', alias='default', mongo_client_class=mongomock.MongoClient)
+
+    db = get_db()
+    yield db
+    db.client.drop_database(db.name)
+    disconnect(alias='default')
+
+
+@pytest.fixture(scope='session')
+def users(database):
+    """SEARCHABLE_USERS profiles; the first one is friends with the next FRIENDS"""
+    from apps.users.models import UserProfile
+
+    documents = [
+        UserProfile(
+            auth0_id=f"auth0|bench{i}", username=f"runner_{i}", email=f"runner{i}@example.com",
+            full_name=f"Bench Runner {i}"
+        ).to_mongo()
+        for i in range(SEARCHABLE_USERS)
+    ]
+    ids = UserProfile._get_collection().insert_many(documents).inserted_ids
+    UserProfile._get_collection().update_one({'_id': ids[0]}, {'$set': {'friends': ids[1:FRIENDS + 1]}})
+    return ids
+
+
+@pytest.fixture(scope='session')
+def popular_user(users):
+    from apps.users.models import UserProfile
+    return UserProfile.objects.get(id=users[0])
+
+
+@pytest.fixture(scope='session')
+def long_activity(popular_user):
+    from apps.users.models import Activity, LiveDataPoint
+
+    start = datetime(2025, 6, 1, 7, 0, 0)
+    return Activity(
+        activity_name="Long Run", user_id=popular_user, type='running', status='completed',
+        start_time=start, end_time=start + timedelta(seconds=LIVE_DATA_POINTS),
+        live_data=[
+            LiveDataPoint(
+                timestamp=start + timedelta(seconds=i), latitude=40.7128 + i * 1e-5, longitude=-74.006 + i * 1e-5,
+                speed=10.5, heart_rate=150, calories=i * 0.1
+            )
+            for i in range(LIVE_DATA_POINTS)
+        ]
+    ).save()
@@ -0,0 +1,97 @@
+"""
+Microbenchmarks for the serializers, auth and search hot paths
+
+    pip install -r benchmarks/requirements.txt
+    pytest benchmarks/micro --benchmark-autosave        # store a baseline run
+    pytest benchmarks/micro --benchmark-compare --benchmark-compare-fail=median:15%
+    BENCH_MONGO_URL=mongodb://localhost:27017/sync_bench pytest benchmarks/micro
+
+The second run compares with the latest stored one and fails when a median
+is more than 15% slower.
+"""
+
+import random
+from datetime import datetime
+
+import pytest
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.users.authentication import JWTAuthentication
+from apps.users.fast_serializers import ACTIVITY_PLAN, USER_PROFILE_PLAN, render_documents
+from apps.users.heatmap import tile_increments
+from apps.users.jwt_utils import generate_jwt_token
+from apps.users.models import UserProfile, Activity
+from apps.users.routes import route_polyline
+from apps.users.search import search_users, search_cache
+from apps.users.serializers import ActivitySerializer, UserProfileSerializer
+from populate_db import live_trace
+
+
+@pytest.mark.benchmark(group='activity')
+def test_activity_serializer_large_live_data(benchmark, long_activity):
+    data = benchmark(lambda: ActivitySerializer(long_activity).data)
+    assert len(data['live_data']) == len(long_activity.live_data)
+
+
+@pytest.mark.benchmark(group='activity')
+def test_activity_fast_plan_large_live_data(benchmark, long_activity):
+    doc = Activity._get_collection().find_one({'_id': long_activity.id})
+    data = benchmark(render_documents, ACTIVITY_PLAN, [doc])
+    assert len(data[0]['live_data']) == len(long_activity.live_data)
+
+
+@pytest.mark.benchmark(group='activity')
+def test_route_polyline_winding_track(benchmark):
+    points, _ = live_trace(random.Random(7), 'running', datetime(2025, 6, 1, 7), 10_000, 1)
+    route = benchmark(route_polyline, points)
+    # a feed thumbnail stays a few hundred bytes
+    assert len(route) < 500
+
+
+@pytest.mark.benchmark(group='activity')
+def test_heatmap_increments_winding_track(benchmark):
+    points, _ = live_trace(random.Random(7), 'running', datetime(2025, 6, 1, 7), 10_000, 1)
+    increments = benchmark(tile_increments, None, points)
+    # a few dozen tile updates per completed activity, over every zoom
+    assert len(increments) < 100
+
+
+@pytest.mark.benchmark(group='profile')
+def test_user_profile_serializer_many_friends(benchmark, popular_user):
+    # reloaded every round, the friend references are dereferenced once per instance
+    data = benchmark(lambda: UserProfileSerializer(UserProfile.objects.get(id=popular_user.id)).data)
+    assert len(data['friends']) == len(popular_user.friends)
+
+
+@pytest.mark.benchmark(group='profile')
+def test_user_profile_fast_plan_many_friends(benchmark, popular_user):
+    doc = UserProfile._get_collection().find_one({'_id': popular_user.id})
+    data = benchmark(render_documents, USER_PROFILE_PLAN, [doc])
+    assert len(data[0]['friends']) == len(popular_user.friends)
+
+
+@pytest.mark.benchmark(group='auth')
+def test_generate_jwt_token(benchmark, popular_user):
+    assert benchmark(generate_jwt_token, str(popular_user.id), popular_user.email)
+
+
+@pytest.mark.benchmark(group='auth')
+def test_jwt_authenticate(benchmark, popular_user):
+    token = generate_jwt_token(str(popular_user.id), popular_user.email)
+    request = Request(APIRequestFactory().get('/api/profile/', HTTP_AUTHORIZATION=f"Bearer {token}"))
+    user, _ = benchmark(JWTAuthentication().authenticate, request)
+    assert user.id == popular_user.id
+
+
+@pytest.mark.benchmark(group='search')
+def test_search_uncached(benchmark, users):
+    results = benchmark.pedantic(search_users, args=("runner_12",), setup=search_cache.clear, rounds=50)
+    assert results
+
+
+@pytest.mark.benchmark(group='search')
+def test_search_cached(benchmark, users):
+    search_cache.clear()
+    search_users("runner_12")
+    assert benchmark(search_users, "runner_12")
@@ -0,0 +1,34 @@
+"""
+Synthetic data helpers shared by the benchmark scripts
+"""
+
+import random
+
+
+def power_law_graph(num_users, edges_per_user=5, seed=42):
+    """Build an undirected Barabási–Albert graph over user ids 0..num_users-1.
+
+    Preferential attachment gives the power-law degree distribution of real
+    social graphs: most users have a handful of friends, a few have thousands.
+    Returns a list of friend id sets indexed by user id.
+    """
+    rng = random.Random(seed)
+    adjacency = [set() for _ in range(num_users)]
+
+    # every endpoint appears once per edge, so uniform picks from it are degree-weighted
+    endpoints = []
+    targets = list(range(min(edges_per_user, num_users)))
+
+    for source in range(len(targets), num_users):
+        for target in targets:
+            adjacency[source].add(target)
+            adjacency[target].add(source)
+            endpoints.append(target)
+            endpoints.append(source)
+
+        targets = set()
+        while len(targets) < edges_per_user:
+            targets.add(rng.choice(endpoints))
+        targets = list(targets)
+
+    return adjacency
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# one long-lived event loop per worker: the async endpoints can share its connection pool
+os.environ.setdefault('ASYNC_ROUTES', 'true')
 
 application = get_asgi_application()
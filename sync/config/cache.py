@@ -0,0 +1,154 @@
+"""
+Django cache backend storing entries in a MongoDB collection.
+
+Every worker and node shares the entries through the database they already
+use, with no extra service to run, and goes through mongoengine's pooled
+MongoClient. Integers are stored as plain numbers so incr/decr are atomic
+$inc updates; other values are pickled. A TTL index removes expired entries
+in the background (about once a minute), and reads skip entries that expired
+since.
+
+    CACHES = {"default": {"BACKEND": "config.cache.MongoCache", "LOCATION": "django_cache"}}
+
+OPTIONS accepts "alias", the mongoengine connection alias (default "default").
+"""
+
+import pickle
+from datetime import datetime, timezone
+
+from bson import Binary
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+DUPLICATE_KEY = 11000
+
+
+class MongoCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.collection_name = location or 'django_cache'
+        self.alias = params.get('OPTIONS', {}).get('alias', 'default')
+        self._indexed = set()
+
+    @property
+    def collection(self):
+        from mongoengine.connection import get_db
+
+        db = get_db(self.alias)
+        collection = db[self.collection_name]
+        # once per database: tests and scripts may reconnect the alias elsewhere
+        if db.name not in self._indexed:
+            collection.create_index('expires_at', expireAfterSeconds=0)
+            self._indexed.add(db.name)
+        return collection
+
+    def encode(self, value):
+        if type(value) is int:
+            return value
+        return Binary(pickle.dumps(value, self.pickle_protocol))
+
+    def decode(self, value):
+        if isinstance(value, bytes):
+            return pickle.loads(value)
+        return value
+
+    def expires_at(self, timeout):
+        expiry = self.get_backend_timeout(timeout)
+        if expiry is None:
+            return None
+        return datetime.fromtimestamp(expiry, timezone.utc)
+
+    def live(self, key):
+        # matches entries without an expiry too
+        return {'_id': key, 'expires_at': {'$not': {'$lte': datetime.now(timezone.utc)}}}
+
+    def document(self, key, value, timeout):
+        return {'_id': key, 'value': self.encode(value), 'expires_at': self.expires_at(timeout)}
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        try:
+            # replaces an expired entry; a live one makes the upsert collide on _id
+            self.collection.replace_one(
+                {'_id': key, 'expires_at': {'$lte': datetime.now(timezone.utc)}},
+                self.document(key, value, timeout),
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        doc = self.collection.find_one(self.live(key), {'value': 1})
+        if doc is None:
+            return default
+        return self.decode(doc['value'])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.collection.replace_one({'_id': key}, self.document(key, value, timeout), upsert=True)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        result = self.collection.update_one(self.live(key), {'$set': {'expires_at': self.expires_at(timeout)}})
+        return result.matched_count == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.collection.delete_one({'_id': key}).deleted_count == 1
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.collection.count_documents(self.live(key), limit=1) == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        doc = self.collection.find_one_and_update(
+            {**self.live(key), 'value': {'$type': 'number'}},
+            {'$inc': {'value': delta}},
+            projection={'value': 1},
+            return_document=True
+        )
+        if doc is None:
+            raise ValueError(f"Key '{key}' not found or not an integer")
+        return doc['value']
+
+    def get_many(self, keys, version=None):
+        keys_by_name = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys_by_name:
+            return {}
+
+        docs = self.collection.find({
+            '_id': {'$in': list(keys_by_name)},
+            'expires_at': {'$not': {'$lte': datetime.now(timezone.utc)}},
+        }, {'value': 1})
+        return {keys_by_name[doc['_id']]: self.decode(doc['value']) for doc in docs}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        docs = [
+            self.document(self.make_and_validate_key(key, version=version), value, timeout)
+            for key, value in data.items()
+        ]
+        collection = self.collection
+        # two round trips whatever the number of keys; a key another client sets
+        # in between keeps that client's (equally fresh) value
+        collection.delete_many({'_id': {'$in': [doc['_id'] for doc in docs]}})
+        try:
+            collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            if any(error['code'] != DUPLICATE_KEY for error in e.details['writeErrors']):
+                raise
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            self.collection.delete_many({'_id': {'$in': keys}})
+
+    def clear(self):
+        self.collection.delete_many({})
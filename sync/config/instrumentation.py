@@ -0,0 +1,244 @@
+"""
+Per-request MongoDB command instrumentation.
+
+A pymongo CommandListener attributes every command to the QueryStats of the
+current request (held in a context variable, so it follows both threads and
+asyncio tasks). QueryInstrumentationMiddleware opens the stats for each
+request, reports them in a Server-Timing header in debug mode, aggregates
+them per view in query_metrics and logs likely N+1 patterns: the same
+command shape repeated many times within one request.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pymongo import monitoring
+
+from .slow_queries import slow_query_log
+
+logger = logging.getLogger(__name__)
+
+_current_stats = ContextVar('query_stats', default=None)
+
+# commands whose first value is not a collection name
+NON_COLLECTION_COMMANDS = {'getMore': 'collection', 'killCursors': None, 'endSessions': None}
+
+# commands driven by the driver itself rather than by application code, and the slow-query log's explains
+IGNORED_COMMANDS = {
+    'hello', 'isMaster', 'ismaster', 'ping', 'endSessions', 'saslStart', 'saslContinue', 'explain'
+}
+
+
+def command_shape(command_name, command):
+    """Identify a command by its collection and filter keys, ignoring the values"""
+    collection_key = NON_COLLECTION_COMMANDS.get(command_name, command_name)
+    collection = command.get(collection_key) if collection_key else None
+
+    if command_name == 'aggregate':
+        pipeline = command.get('pipeline') or [{}]
+        query = pipeline[0].get('$match', {})
+    elif command_name in ('update', 'delete'):
+        statements = command.get('updates') or command.get('deletes') or [{}]
+        query = statements[0].get('q', {})
+    else:
+        query = command.get('filter') or command.get('query') or {}
+
+    return command_name, str(collection), tuple(sorted(query))
+
+
+def documents_returned(command_name, reply):
+    cursor = reply.get('cursor')
+    if cursor:
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', ())))
+    if command_name == 'findAndModify':
+        return 1 if reply.get('value') else 0
+    return reply.get('n', 0)
+
+
+class QueryStats:
+    def __init__(self):
+        self.commands = []
+        # set once the URL is resolved
+        self.view = None
+
+    def record(self, shape, duration, documents):
+        self.commands.append((shape, duration, documents))
+
+    @property
+    def count(self):
+        return len(self.commands)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration, _ in self.commands)
+
+    @property
+    def documents(self):
+        return sum(documents for _, _, documents in self.commands)
+
+    def repeated_shapes(self, threshold):
+        """Return {shape: count} for the shapes run at least threshold times"""
+        counts = {}
+        for shape, _, _ in self.commands:
+            counts[shape] = counts.get(shape, 0) + 1
+        return {shape: count for shape, count in counts.items() if count >= threshold}
+
+    def describe(self):
+        return "\n".join(
+            f"  {name} {collection} {list(keys)} {duration * 1000:.2f}ms {documents} docs"
+            for (name, collection, keys), duration, documents in self.commands
+        )
+
+
+def current_stats():
+    return _current_stats.get()
+
+
+@contextmanager
+def track_queries():
+    """Collect the commands run inside the block (in this thread or task) into a QueryStats"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+class QueryListener(monitoring.CommandListener):
+    def __init__(self):
+        self.pending = {}
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        # commands outside requests (management commands, workers) still reach the slow-query log
+        self.pending[(event.connection_id, event.request_id)] = (
+            _current_stats.get(), event.command, event.database_name
+        )
+
+    def succeeded(self, event):
+        self.finish(event, documents_returned(event.command_name, event.reply))
+
+    def failed(self, event):
+        self.finish(event, 0)
+
+    def finish(self, event, documents):
+        pending = self.pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+
+        stats, command, database = pending
+        shape = command_shape(event.command_name, command)
+        duration = event.duration_micros / 1e6
+        if stats is not None:
+            stats.record(shape, duration, documents)
+
+        slow_query_log.check(
+            event.command_name, command, database, shape, duration, stats.view if stats else None
+        )
+
+
+class QueryMetrics:
+    """Per-view totals of the commands run while serving requests"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, view, stats, n_plus_one):
+        with self.lock:
+            metrics = self.views.setdefault(view, {
+                'requests': 0, 'commands': 0, 'duration': 0.0, 'documents': 0,
+                'max_commands': 0, 'n_plus_one': 0,
+            })
+            metrics['requests'] += 1
+            metrics['commands'] += stats.count
+            metrics['duration'] += stats.duration
+            metrics['documents'] += stats.documents
+            metrics['max_commands'] = max(metrics['max_commands'], stats.count)
+            metrics['n_plus_one'] += 1 if n_plus_one else 0
+
+    def snapshot(self):
+        with self.lock:
+            return {view: dict(metrics) for view, metrics in self.views.items()}
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+query_metrics = QueryMetrics()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_commands):
+    """Fail when the block runs more than max_commands MongoDB commands"""
+    with track_queries() as stats:
+        yield stats
+
+    if stats.count > max_commands:
+        raise QueryBudgetExceeded(
+            f"{stats.count} MongoDB commands run, budget is {max_commands}:\n{stats.describe()}"
+        )
+
+
+_mongomock_instrumented = False
+_inside_mongomock = ContextVar('inside_mongomock', default=False)
+
+MONGOMOCK_OPERATIONS = {
+    'find': 'find', 'find_one': 'find', 'aggregate': 'aggregate', 'count_documents': 'aggregate',
+    'distinct': 'distinct', 'insert_one': 'insert', 'insert_many': 'insert',
+    'update_one': 'update', 'update_many': 'update', 'replace_one': 'update',
+    'delete_one': 'delete', 'delete_many': 'delete', 'bulk_write': 'bulk_write',
+    'find_one_and_update': 'findAndModify', 'find_one_and_delete': 'findAndModify',
+    'find_one_and_replace': 'findAndModify',
+}
+
+
+def instrument_mongomock():
+    """Record mongomock collection calls as commands, since it has no command monitoring.
+
+    For tests only; one call per operation is counted, the way the server
+    would see it (cursor batches and documents returned are not simulated).
+    """
+    global _mongomock_instrumented
+    if _mongomock_instrumented:
+        return
+
+    from mongomock.collection import Collection
+
+    def wrap(method_name, command_name):
+        method = getattr(Collection, method_name)
+
+        def instrumented(self, *args, **kwargs):
+            stats = _current_stats.get()
+            if stats is None or _inside_mongomock.get():
+                return method(self, *args, **kwargs)
+
+            query = args[0] if args and isinstance(args[0], dict) else kwargs.get('filter') or {}
+            if command_name == 'aggregate' and args and isinstance(args[0], list):
+                query = args[0][0].get('$match', {}) if args[0] else {}
+            shape = (command_name, self.name, tuple(sorted(query)) if command_name != 'insert' else ())
+
+            token = _inside_mongomock.set(True)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                _inside_mongomock.reset(token)
+                stats.record(shape, time.perf_counter() - start, 0)
+
+        setattr(Collection, method_name, instrumented)
+
+    for method_name, command_name in MONGOMOCK_OPERATIONS.items():
+        wrap(method_name, command_name)
+
+    _mongomock_instrumented = True
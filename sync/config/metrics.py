@@ -0,0 +1,211 @@
+"""
+Request metrics in the Prometheus text format.
+
+Every thread records into its own shard of plain dicts, so recording a
+request takes no lock; a scrape sums the shards. Only the first record made
+by a new thread takes a lock, to register its shard.
+
+Per route (the URL pattern, to keep label cardinality bounded) we keep
+request counts by status, latency and response size histograms, in-flight
+requests and the time spent in each phase: auth (authentication, including
+its user lookup), db (MongoDB commands outside auth), render (response
+encoding) and view (everything else, mostly serializers).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .instrumentation import current_stats, query_metrics
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+PHASES = ('auth', 'db', 'render', 'view')
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+_request_timing = ContextVar('request_timing', default=None)
+
+
+class ShardedCounters:
+    """Counters split into one dict per thread: increments never contend, reads sum the shards"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []
+        self.shards_lock = threading.Lock()
+
+    def shard(self):
+        try:
+            return self.local.values
+        except AttributeError:
+            values = {}
+            with self.shards_lock:
+                self.shards.append(values)
+            self.local.values = values
+            return values
+
+    def add(self, key, amount=1):
+        values = self.shard()
+        values[key] = values.get(key, 0) + amount
+
+    def totals(self):
+        totals = {}
+        with self.shards_lock:
+            shards = list(self.shards)
+        for values in shards:
+            # copying a dict is atomic under the GIL, even while its owner writes to it
+            for key, value in values.copy().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def clear(self):
+        with self.shards_lock:
+            for values in self.shards:
+                values.clear()
+
+
+class Registry:
+    def __init__(self):
+        self.values = ShardedCounters()
+        self.definitions = {}
+
+    def define(self, name, kind, help, buckets=None):
+        self.definitions[name] = (kind, help, buckets)
+
+    def inc(self, name, labels, amount=1):
+        self.values.add((name, labels, ''), amount)
+
+    def observe(self, name, labels, value):
+        buckets = self.definitions[name][2]
+        values = self.values
+        if buckets:
+            values.add((name, labels, bisect_left(buckets, value)))
+        values.add((name, labels, 'sum'), value)
+        values.add((name, labels, 'count'))
+
+    def render(self):
+        totals = self.values.totals()
+        by_name = {}
+        for (name, labels, part), value in totals.items():
+            by_name.setdefault(name, {}).setdefault(labels, {})[part] = value
+
+        lines = []
+        for name, (kind, help, buckets) in self.definitions.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, parts in sorted(by_name.get(name, {}).items()):
+                if kind in ('counter', 'gauge'):
+                    lines.append(f"{name}{format_labels(labels)} {format_value(parts.get('', 0))}")
+                    continue
+
+                if buckets:
+                    cumulative = 0
+                    for index, bound in enumerate(buckets):
+                        cumulative += parts.get(index, 0)
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {parts.get('count', 0)}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(parts.get('sum', 0))}")
+                lines.append(f"{name}_count{format_labels(labels)} {parts.get('count', 0)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+registry.define('http_requests_total', 'counter', 'Requests served, by route, method and status.')
+registry.define('http_requests_in_flight', 'gauge', 'Requests currently being served.')
+registry.define(
+    'http_request_duration_seconds', 'histogram', 'Time to produce the response.', LATENCY_BUCKETS
+)
+registry.define('http_response_size_bytes', 'histogram', 'Response body size, after compression.', SIZE_BUCKETS)
+registry.define(
+    'http_request_phase_seconds', 'summary', 'Time spent per request phase (auth, db, render, view).'
+)
+registry.define('throttle_decisions_total', 'counter', 'Throttle checks, by scope and decision.')
+
+
+class RequestTiming:
+    def __init__(self):
+        self.phases = {}
+        # MongoDB time already counted in another phase (e.g. the auth user lookup)
+        self.db_inside_phases = 0.0
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase):
+    """Count the block's wall time towards phase of the current request, if any"""
+    timing = _request_timing.get()
+    if timing is None:
+        yield
+        return
+
+    stats = current_stats()
+    db_before = stats.duration if stats else 0.0
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(phase, time.perf_counter() - start)
+        if stats:
+            timing.db_inside_phases += stats.duration - db_before
+
+
+@contextmanager
+def track_request():
+    timing = RequestTiming()
+    token = _request_timing.set(timing)
+    registry.inc('http_requests_in_flight', ())
+    try:
+        yield timing
+    finally:
+        registry.inc('http_requests_in_flight', (), -1)
+        _request_timing.reset(token)
+
+
+def method_label(method):
+    """The method as a label value; unknown verbs share one, so clients cannot add series"""
+    return method if method in HTTP_METHODS else 'OTHER'
+
+
+def record_request(route, method, status, duration, size, timing, stats):
+    labels = (('method', method_label(method)), ('route', route))
+    registry.inc('http_requests_total', labels + (('status', str(status)),))
+    registry.observe('http_request_duration_seconds', labels, duration)
+    registry.observe('http_response_size_bytes', labels, size)
+
+    phases = dict(timing.phases)
+    phases['db'] = max((stats.duration if stats else 0.0) - timing.db_inside_phases, 0.0)
+    phases['view'] = max(duration - sum(phases.values()), 0.0)
+    for phase in PHASES:
+        registry.observe('http_request_phase_seconds', labels + (('phase', phase),), phases.get(phase, 0.0))
+
+
+def render_metrics():
+    lines = [registry.render()]
+
+    # per-view totals collected by QueryInstrumentationMiddleware
+    lines.append("# HELP mongo_commands_by_view_total MongoDB commands run, by view.\n")
+    lines.append("# TYPE mongo_commands_by_view_total counter\n")
+    for view, metrics in sorted(query_metrics.snapshot().items()):
+        lines.append(f"mongo_commands_by_view_total{format_labels((('view', view),))} {metrics['commands']}\n")
+
+    return "".join(lines)
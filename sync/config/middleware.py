@@ -0,0 +1,202 @@
+import gzip
+import re
+import secrets
+import time
+
+import brotli
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .instrumentation import track_queries, current_stats, query_metrics, logger as query_logger
+from .metrics import track_request, record_request, method_label
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+
+ACCEPT_ENCODING_RE = re.compile(r'\s*([a-z*]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def accepted_encodings(header):
+    """Parse an Accept-Encoding header into {coding: q}"""
+    encodings = {}
+    for item in header.lower().split(','):
+        match = ACCEPT_ENCODING_RE.match(item)
+        if not match or not match.group(1):
+            continue
+        try:
+            encodings[match.group(1)] = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+    return encodings
+
+
+def padded_gzip(content, level, max_random_bytes):
+    """gzip with a random-length file name in the header, as django.utils.text.compress_string pads it"""
+    compressed = gzip.compress(content, compresslevel=level, mtime=0)
+    if not max_random_bytes:
+        return compressed
+    header = bytearray(compressed[:10])
+    header[3] = gzip.FNAME
+    return bytes(header) + b'a' * secrets.randbelow(max_random_bytes) + b'\x00' + compressed[10:]
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Brotli or gzip response compression, negotiated from Accept-Encoding.
+
+    Bodies under COMPRESSION_MIN_SIZE bytes are sent as is: below roughly a
+    TCP segment, compressing costs more CPU than the bytes it saves.
+    Streaming responses (e.g. server-sent events) are never buffered.
+
+    Against BREACH (guessing a secret in a response from its compressed
+    length), gzip output is padded with up to COMPRESSION_MAX_RANDOM_BYTES
+    random bytes like Django's GZipMiddleware, and brotli, which has no
+    room for padding, is only used for requests without credentials.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.gzip_level = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4)
+        self.max_random_bytes = getattr(settings, 'COMPRESSION_MAX_RANDOM_BYTES', 100)
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(COMPRESSIBLE_TYPES) or len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        wildcard = encodings.get('*', 0)
+        credentials = 'HTTP_AUTHORIZATION' in request.META or bool(request.COOKIES)
+        if encodings.get('br', wildcard) > 0 and not credentials:
+            encoding = 'br'
+            compressed = brotli.compress(response.content, quality=self.brotli_quality)
+        elif encodings.get('gzip', wildcard) > 0:
+            encoding = 'gzip'
+            compressed = padded_gzip(response.content, self.gzip_level, self.max_random_bytes)
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+
+        # the representation changed, so a strong validator must become weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        return response
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return f"{method_label(request.method)} {match.view_name if match else 'unmatched'}"
+
+
+class QueryInstrumentationMiddleware:
+    """Attribute the MongoDB commands run by each request to its view.
+
+    Works for sync and async views alike: the stats live in a context
+    variable, which follows the request into threads and tasks. Commands run
+    while a streaming response is consumed are not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = getattr(settings, 'QUERY_TIMING_HEADER', settings.DEBUG)
+        self.n_plus_one_threshold = getattr(settings, 'QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with track_queries() as stats:
+            response = self.get_response(request)
+        return self.report(request, response, stats)
+
+    async def __acall__(self, request):
+        with track_queries() as stats:
+            response = await self.get_response(request)
+        return self.report(request, response, stats)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = current_stats()
+        if stats is not None:
+            stats.view = view_label(request)
+
+    def report(self, request, response, stats):
+        request.query_stats = stats
+        view = view_label(request)
+
+        repeated = stats.repeated_shapes(self.n_plus_one_threshold)
+        for (command_name, collection, keys), count in repeated.items():
+            query_logger.warning(
+                "Possible N+1 in %s: %d %s commands on %s filtering on %s",
+                view, count, command_name, collection, list(keys)
+            )
+
+        query_metrics.add(view, stats, bool(repeated))
+
+        if self.header:
+            response['Server-Timing'] = (
+                f'mongo;dur={stats.duration * 1000:.2f};desc="{stats.count} commands, {stats.documents} docs"'
+            )
+
+        return response
+
+
+class MetricsMiddleware:
+    """Record latency, status, size and phase timings per route (see config.metrics).
+
+    Meant to be first in MIDDLEWARE so the latency covers the whole stack
+    and the size is what goes on the wire. Streaming responses are measured
+    up to their first byte.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        with track_request() as timing:
+            response = self.get_response(request)
+            self.record(request, response, time.perf_counter() - start, timing)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with track_request() as timing:
+            response = await self.get_response(request)
+            self.record(request, response, time.perf_counter() - start, timing)
+        return response
+
+    def record(self, request, response, duration, timing):
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match else 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+
+        record_request(
+            route, request.method, response.status_code, duration, size,
+            timing, getattr(request, 'query_stats', None)
+        )
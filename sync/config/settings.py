@@ -13,6 +13,9 @@ import os
 import mongoengine
 from pathlib import Path
 from dotenv import load_dotenv
+from pymongo import monitoring
+
+from config.instrumentation import QueryListener
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,7 +52,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'config.middleware.CompressionMiddleware',
+    'config.middleware.QueryInstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,6 +101,9 @@ MONGO_DB_HOST = os.getenv("MONGO_DB_HOST")
 MONGO_DB_PORT = int(os.getenv("MONGO_DB_PORT", 27017))
 MONGO_DB_AUTHSOURCE = os.getenv("MONGO_DB_AUTHSOURCE", "admin")
 
+# attribute MongoDB commands to requests (config.instrumentation)
+monitoring.register(QueryListener())
+
 mongoengine.connect(
     db=MONGO_DB_NAME,
     host=MONGO_DB_HOST,
@@ -128,9 +137,43 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'apps.users.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'apps.users.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # reverse proxies in front of the app, each appending to X-Forwarded-For: client IPs for the
+    # IP throttles are taken that many entries from the right, and 0 ignores the (spoofable) header
+    'NUM_PROXIES': int(os.getenv("NUM_PROXIES", 0)),
+    # token buckets (apps.users.throttling): "10/min" is a burst of 10 refilled at 10 per minute
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.getenv("THROTTLE_LOGIN_IP", "20/min"),
+        'login_account': os.getenv("THROTTLE_LOGIN_ACCOUNT", "5/min"),
+        'register_ip': os.getenv("THROTTLE_REGISTER_IP", "10/hour"),
+        'search_user': os.getenv("THROTTLE_SEARCH_USER", "60/min"),
+        'search_ip': os.getenv("THROTTLE_SEARCH_IP", "300/min"),
+    },
 }
 
+# Serve hot read endpoints from raw documents (apps.users.fast_serializers)
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "false").lower() == "true"
+
+# Mount the /api/async/ endpoints (apps.users.async_views); config.asgi turns this on. Under WSGI
+# each async request would run on a new event loop and open its own MongoDB connection pool.
+ASYNC_ROUTES = os.getenv("ASYNC_ROUTES", "false").lower() == "true"
+
+# Response compression (config.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+# random padding of gzip responses, against BREACH; 0 turns it off
+COMPRESSION_MAX_RANDOM_BYTES = int(os.getenv("COMPRESSION_MAX_RANDOM_BYTES", 100))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Sync Activity API',
     'DESCRIPTION': 'This project is the backend for the mobile application, design to connect people through sports',
@@ -158,11 +201,99 @@ STATIC_URL = 'static/'
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-sessions"
+# Shared by every worker and node (sessions hold the Auth0 PKCE state between
+# login and callback): MongoDB by default, Redis when CACHE_REDIS_URL is set
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CACHE_REDIS_MAX_CONNECTIONS = int(os.getenv("CACHE_REDIS_MAX_CONNECTIONS", 50))
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+            # per-process connection pool
+            "OPTIONS": {"max_connections": CACHE_REDIS_MAX_CONNECTIONS}
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "config.cache.MongoCache",
+            "LOCATION": os.getenv("CACHE_COLLECTION", "django_cache")
+        }
     }
+
+# User search result cache (normalized query -> result ids)
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 30))
+# a profile change drops the cached queries matching it, or the whole cache above this many
+SEARCH_INVALIDATE_MAX_KEYS = int(os.getenv("SEARCH_INVALIDATE_MAX_KEYS", 5000))
+
+# Friend-of-friend suggestions
+FRIEND_SUGGESTIONS_PER_USER = int(os.getenv("FRIEND_SUGGESTIONS_PER_USER", 50))
+FRIEND_SUGGESTIONS_MAX_FANOUT = int(os.getenv("FRIEND_SUGGESTIONS_MAX_FANOUT", 5000))
+
+# Sorted friend-id arrays used for mutual friend counts
+FRIEND_IDS_CACHE_TTL = int(os.getenv("FRIEND_IDS_CACHE_TTL", 300))
+
+# Live activity streaming (apps.users.live). The in-process layer only reaches
+# streams held by the same process: with more than one worker process or host,
+# set LIVE_REDIS_URL so messages go through Redis pub/sub
+LIVE_REDIS_URL = os.getenv("LIVE_REDIS_URL")
+LIVE_REDIS_PREFIX = os.getenv("LIVE_REDIS_PREFIX", "live:")
+LIVE_CHANNEL_LAYER = os.getenv("LIVE_CHANNEL_LAYER") or (
+    "apps.users.live.BrokerChannelLayer" if LIVE_REDIS_URL else "apps.users.live.InProcessChannelLayer"
+)
+LIVE_MAX_PENDING_POINTS = int(os.getenv("LIVE_MAX_PENDING_POINTS", 1000))
+LIVE_KEEPALIVE_SECONDS = int(os.getenv("LIVE_KEEPALIVE_SECONDS", 15))
+
+# Notification inbox (apps.users.notifications)
+NOTIFICATION_SEQ_CACHE_TTL = int(os.getenv("NOTIFICATION_SEQ_CACHE_TTL", 300))
+NOTIFICATIONS_LONG_POLL_TIMEOUT = int(os.getenv("NOTIFICATIONS_LONG_POLL_TIMEOUT", 25))
+
+# Route thumbnails in list and feed responses (apps.users.routes)
+ROUTE_SIMPLIFY_TOLERANCE_M = float(os.getenv("ROUTE_SIMPLIFY_TOLERANCE_M", 10))
+ROUTE_MAX_POINTS = int(os.getenv("ROUTE_MAX_POINTS", 60))
+
+# Activity heatmap tiles (apps.users.heatmap), zoom levels precomputed
+HEATMAP_MIN_ZOOM = int(os.getenv("HEATMAP_MIN_ZOOM", 8))
+HEATMAP_MAX_ZOOM = int(os.getenv("HEATMAP_MAX_ZOOM", 15))
+
+# MongoDB command instrumentation (config.middleware.QueryInstrumentationMiddleware)
+QUERY_TIMING_HEADER = DEBUG
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", 5))
+
+# Prometheus scrape endpoint (/metrics/): scrapers send "Authorization: Bearer <METRICS_TOKEN>";
+# without a token it is only served in debug mode
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Slow-query log (config.slow_queries), a negative threshold disables it
+SLOW_QUERY_THRESHOLD_MS = int(os.getenv("SLOW_QUERY_THRESHOLD_MS", 100))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.1))
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE", str(BASE_DIR / "slow_queries.log"))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '{message}', 'style': '{'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'config.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
 # CORS Configuration
@@ -192,4 +323,9 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
     'x-user-id',
+    'if-none-match',
+]
+
+CORS_EXPOSE_HEADERS = [
+    'etag',
 ]
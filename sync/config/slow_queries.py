@@ -0,0 +1,144 @@
+"""
+Slow-query log.
+
+Every MongoDB command slower than SLOW_QUERY_THRESHOLD_MS is written as a
+JSON line to the config.slow_queries logger (a rotating file, see LOGGING)
+with its filter shape, duration and calling view. A sample of them
+(SLOW_QUERY_EXPLAIN_SAMPLE_RATE) is explained first, on a background thread,
+so the entry also tells which stages and indexes the winning plan used.
+"""
+
+import json
+import logging
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify'}
+
+# session and routing fields the driver adds, which explain does not accept
+DRIVER_FIELDS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern', 'writeConcern'}
+
+MAX_PENDING_EXPLAINS = 100
+
+
+def redact(value):
+    """Keep the structure of a filter (fields and operators) but none of its values"""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(value[0])] if value else []
+    return '?'
+
+
+def command_filter(command_name, command):
+    if command_name == 'aggregate':
+        return command.get('pipeline', [])
+    if command_name in ('update', 'delete'):
+        statements = command.get('updates') or command.get('deletes') or [{}]
+        return statements[0].get('q', {})
+    return command.get('filter') or command.get('query') or {}
+
+
+def plan_summary(explain):
+    """Reduce an explain result to its winning plan's stages and indexes"""
+    planner = explain.get('queryPlanner')
+    if planner is None:
+        # aggregations nest the planner under their first stage
+        stages = explain.get('stages') or [{}]
+        cursor = stages[0].get('$cursor') or stages[0].get('$geoNearCursor') or {}
+        planner = cursor.get('queryPlanner', {})
+
+    plan = planner.get('winningPlan', {})
+    # slot-based engine plans wrap the classic tree
+    plan = plan.get('queryPlan', plan)
+
+    stages, indexes = [], []
+    pending = [plan]
+    while pending:
+        node = pending.pop()
+        if node.get('stage'):
+            stages.append(node['stage'])
+        if node.get('indexName'):
+            indexes.append(node['indexName'])
+        pending.extend(node.get('inputStages', []))
+        if node.get('inputStage'):
+            pending.append(node['inputStage'])
+
+    return {'stages': stages, 'indexes': indexes, 'collscan': 'COLLSCAN' in stages}
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.configured = False
+        self.explains = queue.Queue(maxsize=MAX_PENDING_EXPLAINS)
+        self.worker = None
+        self.worker_lock = threading.Lock()
+
+    def configure(self):
+        threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100)
+        self.threshold = None if threshold is None or threshold < 0 else threshold / 1000
+        self.sample_rate = getattr(settings, 'SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1)
+        self.configured = True
+
+    def check(self, command_name, command, database, shape, duration, view):
+        if not self.configured:
+            self.configure()
+        if self.threshold is None or duration < self.threshold:
+            return
+
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'view': view,
+            'command': command_name,
+            'collection': shape[1],
+            'filter': redact(command_filter(command_name, command)),
+            'duration_ms': round(duration * 1000, 2),
+        }
+
+        if command_name in EXPLAINABLE_COMMANDS and random.random() < self.sample_rate:
+            try:
+                self.explains.put_nowait((entry, command, database))
+                self.start_worker()
+                return
+            except queue.Full:
+                pass
+
+        self.write(entry)
+
+    def start_worker(self):
+        if self.worker is not None:
+            return
+        with self.worker_lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.explain_forever, name='slow-query-explain', daemon=True)
+                self.worker.start()
+
+    def explain_forever(self):
+        while True:
+            entry, command, database = self.explains.get()
+            try:
+                entry['plan'] = plan_summary(self.explain(command, database))
+            except Exception as e:
+                entry['plan'] = {'error': str(e)}
+            self.write(entry)
+
+    def explain(self, command, database):
+        from mongoengine.connection import get_connection
+
+        explained = {
+            key: value for key, value in command.items()
+            if not key.startswith('$') and key not in DRIVER_FIELDS
+        }
+        return get_connection()[database].command({'explain': explained, 'verbosity': 'queryPlanner'})
+
+    def write(self, entry):
+        logger.warning(json.dumps(entry, default=str))
+
+
+slow_query_log = SlowQueryLog()
@@ -21,12 +21,14 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
     SpectacularRedocView
 )
-from .views import RootView
+from .views import RootView, QueryMetricsView, metrics_view
 
 urlpatterns = [
     path("", RootView.as_view(), name='root'),
     path('api/', include('apps.users.urls')),
     path('admin/', admin.site.urls),
+    path('debug/queries/', QueryMetricsView.as_view(), name='query_metrics'),
+    path('metrics/', metrics_view, name='metrics'),
 
     # OpenAPI schema
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -1,7 +1,14 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 
+from .instrumentation import query_metrics
+from .metrics import render_metrics
+
 class RootView(APIView):
     permission_classes = [AllowAny]
 
@@ -12,3 +19,29 @@ class RootView(APIView):
             "docs": "/api/docs"
         })
 
+
+class QueryMetricsView(APIView):
+    """Per-view MongoDB command totals, only available in debug mode"""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        if not settings.DEBUG:
+            raise Http404
+
+        views = query_metrics.snapshot()
+        for metrics in views.values():
+            metrics['avg_commands'] = metrics['commands'] / metrics['requests']
+            metrics['avg_duration_ms'] = metrics['duration'] * 1000 / metrics['requests']
+        return Response(views)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, for a bearer METRICS_TOKEN, or anyone in debug mode"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token:
+        if not settings.DEBUG:
+            raise Http404
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponse(status=403)
+
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,381 +1,440 @@
-﻿"""
+"""
 Database Population Script for SyncActivity
-Creates sample users, friend relationships, and activities for testing
+
+Generates a synthetic dataset of any size, deterministic from --seed and
+--until: users on a power-law friendship graph, activities with GPS and
+heart-rate live_data traces, pending friend requests and their inbox
+notifications. Documents are built as plain dicts and streamed to
+insert_many in batches; indexes are built once the collections are loaded.
+
+    python populate_db.py --users 1000 --activities 10000
+    python populate_db.py --users 1000000 --activities 20000000 --workers 8 --trace-interval 120
+
+Every user can log in as user<N>@example.com (N from 0) with --password,
+the accounts benchmarks/loadtest.py uses by default.
 """
 
+import argparse
+import calendar
+import math
 import os
+import random
+import struct
 import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from multiprocessing import Pool
+
 import django
-from datetime import datetime, timedelta
-import random
 
 # Setup Django environment
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
-from apps.users.models import UserProfile, FriendRequest, Activity, LiveDataPoint
-from pymongo import MongoClient
+from bson import ObjectId
 from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from mongoengine.connection import get_db
+from pymongo import MongoClient
 
+from apps.users.models import (
+    UserProfile, FriendRequest, Notification, FriendSuggestion, Activity, WeeklyRollup, UserStats, HeatmapTile
+)
+from apps.users.rollups import rebuild_rollups
+from apps.users.stats import check_stats
+from apps.users.geo import track_geometry
+from apps.users.routes import route_polyline
+from benchmarks.synthetic import power_law_graph
 
-def drop_indexes():
-    """Drop all indexes to avoid conflicts"""
-    print("Dropping existing indexes...")
-    try:
-        # Get MongoDB connection from Django settings
-        from mongoengine import connect
-        from mongoengine.connection import get_db
-        
-        db = get_db()
-        
-        # Drop indexes for each collection
-        collections = ['users', 'friend_requests', 'activities']
-        for collection_name in collections:
-            try:
-                collection = db[collection_name]
-                # Drop all indexes except _id
-                collection.drop_indexes()
-                print(f"   ✓ Dropped indexes for {collection_name}")
-            except Exception as e:
-                print(f"   ⚠ Could not drop indexes for {collection_name}: {e}")
-        
-        print("Indexes dropped!\n")
-    except Exception as e:
-        print(f"Warning: Could not drop indexes: {e}\n")
-
-
-def clear_database():
-    """Clear all existing data"""
-    print("Clearing existing data...")
-    try:
-        Activity.objects.all().delete()
-        print("   ✓ Activities cleared")
-    except Exception as e:
-        print(f"   ⚠ Activities: {e}")
-    
-    try:
-        FriendRequest.objects.all().delete()
-        print("   ✓ Friend requests cleared")
-    except Exception as e:
-        print(f"   ⚠ Friend requests: {e}")
-    
-    try:
-        UserProfile.objects.all().delete()
-        print("   ✓ User profiles cleared")
-    except Exception as e:
-        print(f"   ⚠ User profiles: {e}")
-    
-    print("Database cleared!\n")
-
-
-def create_users():
-    """Create sample users"""
-    print("Creating users...")
-    
-    users_data = [
-        {
-            "auth0_id": "auth0|user001",
-            "username": "john_runner",
-            "email": "john@example.com",
-            "full_name": "John Doe",
-            "password": "hashed_password_123",
-            "age": 28,
-            "gender": "M"
-        },
-        {
-            "auth0_id": "auth0|user002",
-            "username": "sarah_cyclist",
-            "email": "sarah@example.com",
-            "full_name": "Sarah Johnson",
-            "password": "hashed_password_456",
-            "age": 25,
-            "gender": "F"
-        },
-        {
-            "auth0_id": "auth0|user003",
-            "username": "mike_swimmer",
-            "email": "mike@example.com",
-            "full_name": "Mike Wilson",
-            "password": "hashed_password_789",
-            "age": 32,
-            "gender": "M"
-        },
-        {
-            "auth0_id": "auth0|user004",
-            "username": "emma_yoga",
-            "email": "emma@example.com",
-            "full_name": "Emma Davis",
-            "password": "hashed_password_abc",
-            "age": 27,
-            "gender": "F"
-        }
-    ]
-    
-    created_users = []
-    for user_data in users_data:
-        user = UserProfile(**user_data)
-        user.save()
-        created_users.append(user)
-        print(f"   Created user: {user.username} ({user.full_name})")
-    
-    print(f"Created {len(created_users)} users!\n")
-    return created_users
-
-
-def create_friendships(users):
-    """Create friend relationships"""
-    print("Creating friendships...")
-    
-    # Define friend pairs (index based)
-    friendships = [
-        (0, 1),  # John & Sarah
-        (0, 2),  # John & Mike
-        (1, 3),  # Sarah & Emma
-    ]
-    
-    for i, j in friendships:
-        user1 = users[i]
-        user2 = users[j]
-        
-        # Add to friends list (bidirectional)
-        if user2 not in user1.friends:
-            user1.friends.append(user2)
-            user1.save()
-        
-        if user1 not in user2.friends:
-            user2.friends.append(user1)
-            user2.save()
-        
-        print(f"   ✓ {user1.username} ↔ {user2.username}")
-    
-    print(f"Created {len(friendships)} friendships!\n")
-    return friendships
-
-
-def create_friend_requests(users):
-    """Create pending friend requests"""
-    print("Creating friend requests...")
-    
-    # Pending requests (sender_idx, receiver_idx)
-    pending_requests = [
-        (2, 3),  # Mike → Emma
-        (0, 3),  # John → Emma
-        (3, 0),  # Emma → John (bidirectional example)
-        (1, 2),  # Sarah → Mike
-        (2, 0),  # Mike → John
-    ]
-    
-    created_requests = []
-    for sender_idx, receiver_idx in pending_requests:
-        sender = users[sender_idx]
-        receiver = users[receiver_idx]
-        
-        # Skip if already friends
-        if receiver in sender.friends:
-            print(f"   ⚠ Skipped: {sender.username} and {receiver.username} are already friends")
-            continue
-        
-        # Check if request already exists
-        existing = FriendRequest.objects(
-            sender=sender,
-            receiver=receiver,
-            status='pending'
-        ).first()
-        
-        if existing:
-            print(f"   ⚠ Skipped: Request from {sender.username} → {receiver.username} already exists")
+# leading byte of the generated ObjectIds, so ids never collide across collections
+USER_ID, ACTIVITY_ID, REQUEST_ID, NOTIFICATION_ID = range(1, 5)
+
+FIRST_NAMES = [
+    'John', 'Sarah', 'Mike', 'Emma', 'Liam', 'Olivia', 'Noah', 'Ava',
+    'Lucas', 'Mia', 'Mateo', 'Sofia', 'Daniel', 'Valentina', 'Ethan', 'Isabella'
+]
+LAST_NAMES = ['Doe', 'Johnson', 'Wilson', 'Davis', 'Garcia', 'Martinez', 'Lopez', 'Smith', 'Brown', 'Taylor']
+NICKNAMES = ['runner', 'cyclist', 'swimmer', 'hiker', 'walker', 'lifter']
+
+ACTIVITY_NAMES = {
+    'running': ['Morning Run', 'Evening Jog', '5K Training', 'Park Run', 'Trail Run'],
+    'cycling': ['City Ride', 'Mountain Biking', 'Evening Cycle', 'Weekend Tour', 'Speed Training'],
+    'walking': ['Morning Walk', 'Park Stroll', 'City Walk', 'Evening Walk', 'Nature Walk'],
+    'hiking': ['Summit Hike', 'Forest Trail', 'Ridge Walk'],
+    'swimming': ['Pool Session', 'Open Water Swim', 'Lap Swimming', 'Beach Swim', 'Training Session'],
+    'gym': ['Strength Training', 'Cardio Session', 'Full Body Workout', 'Leg Day', 'Upper Body'],
+}
+ACTIVITY_WEIGHTS = {'running': 35, 'cycling': 20, 'walking': 20, 'hiking': 5, 'swimming': 5, 'gym': 15}
+
+# type: (mean speed km/h, target heart rate, duration range in minutes, kcal per km or, for gym, per minute)
+PROFILES = {
+    'running': (10.0, 155, (20, 90), 65),
+    'cycling': (22.0, 140, (30, 180), 35),
+    'walking': (5.0, 105, (20, 90), 45),
+    'hiking': (4.0, 125, (60, 300), 55),
+    'swimming': (2.5, 135, (20, 60), 400),
+    'gym': (0.0, 125, (30, 90), 7),
+}
+
+# trace starting points, so activities cluster in cities like real ones do
+CITIES = [
+    (40.7128, -74.0060), (4.7110, -74.0721), (51.5074, -0.1278), (48.8566, 2.3522),
+    (35.6762, 139.6503), (-33.8688, 151.2093), (19.4326, -99.1332), (52.5200, 13.4050),
+]
+
+# a user's share of activities falls off with their id: the earliest users,
+# also the hubs of the friendship graph, are the most active
+ACTIVITY_SKEW = 2.0
+
+# activities listed in nearby discovery
+PUBLIC_SHARE = 0.3
+
+METERS_PER_DEGREE = 111_320
+
+
+@lru_cache(maxsize=64)
+def id_prefix(kind, when):
+    return struct.pack('>IB', calendar.timegm(when.utctimetuple()), kind)
+
+
+def object_id(kind, index, when):
+    """A deterministic ObjectId: creation time, then the id kind and index"""
+    return ObjectId(id_prefix(kind, when) + index.to_bytes(7, 'big'))
+
+
+def user_id(index, until):
+    return object_id(USER_ID, index, until)
+
+
+def pending_request_pairs(num_users, graph, count, seed):
+    """Sender/receiver index pairs of users who are not friends, each pair at most once"""
+    rng = random.Random(f"{seed}-requests")
+    pairs, seen = [], set()
+    attempts = 0
+    while len(pairs) < count and attempts < count * 10:
+        attempts += 1
+        sender, receiver = rng.randrange(num_users), rng.randrange(num_users)
+        key = (min(sender, receiver), max(sender, receiver))
+        if sender == receiver or receiver in graph[sender] or key in seen:
             continue
-        
-        friend_request = FriendRequest(
-            sender=sender,
-            receiver=receiver,
-            status='pending'
-        )
-        friend_request.save()
-        created_requests.append(friend_request)
-        print(f"   ✓ {sender.username} → {receiver.username} (pending)")
-    
-    print(f"Created {len(created_requests)} pending requests!\n")
-    return created_requests
-
-
-def create_activities(users):
-    """Create sample activities"""
-    print("Creating activities...")
-    
-    activity_types = ['running', 'cycling', 'walking', 'swimming', 'gym']
-    activity_names = {
-        'running': ['Morning Run', 'Evening Jog', '5K Training', 'Park Run', 'Trail Run'],
-        'cycling': ['City Ride', 'Mountain Biking', 'Evening Cycle', 'Weekend Tour', 'Speed Training'],
-        'walking': ['Morning Walk', 'Park Stroll', 'City Walk', 'Evening Walk', 'Nature Walk'],
-        'swimming': ['Pool Session', 'Open Water Swim', 'Lap Swimming', 'Beach Swim', 'Training Session'],
-        'gym': ['Strength Training', 'Cardio Session', 'Full Body Workout', 'Leg Day', 'Upper Body']
-    }
-    
-    created_activities = []
-    
-    # Create activities for each user
-    for user in users:
-        num_activities = random.randint(2, 5)
-        
-        for i in range(num_activities):
-            activity_type = random.choice(activity_types)
-            activity_name = random.choice(activity_names[activity_type])
-            
-            # Random date in the last 30 days
-            days_ago = random.randint(1, 30)
-            start_time = datetime.utcnow() - timedelta(days=days_ago, hours=random.randint(6, 20))
-            duration_minutes = random.randint(20, 120)
-            end_time = start_time + timedelta(minutes=duration_minutes)
-            
-            # Calculate stats based on activity type and duration
-            if activity_type == 'running':
-                distance = round(random.uniform(3.0, 15.0), 2)
-                calories = round(distance * 65, 1)
-                avg_time = round(duration_minutes / distance, 2)
-            elif activity_type == 'cycling':
-                distance = round(random.uniform(10.0, 50.0), 2)
-                calories = round(distance * 35, 1)
-                avg_time = round(duration_minutes / distance, 2)
-            elif activity_type == 'walking':
-                distance = round(random.uniform(2.0, 10.0), 2)
-                calories = round(distance * 45, 1)
-                avg_time = round(duration_minutes / distance, 2)
-            elif activity_type == 'swimming':
-                distance = round(random.uniform(0.5, 3.0), 2)
-                calories = round(distance * 400, 1)
-                avg_time = round(duration_minutes / distance, 2)
-            else:  # gym
-                distance = 0
-                calories = round(random.uniform(200, 600), 1)
-                avg_time = duration_minutes
-            
-            # Decide status (70% completed, 20% in_progress, 10% planned)
-            status_choice = random.random()
-            if status_choice < 0.7:
-                status = 'completed'
-            elif status_choice < 0.9:
-                status = 'in_progress'
-                end_time = None
-            else:
-                status = 'planned'
-                start_time = datetime.utcnow() + timedelta(days=random.randint(1, 7))
-                end_time = None
-                distance = 0
-                calories = 0
-            
-            # Create activity
-            activity = Activity(
-                activity_name=activity_name,
-                user_id=user,
-                calories=calories,
-                status=status,
-                start_time=start_time,
-                end_time=end_time,
-                distance=distance,
-                type=activity_type,
-                avg_time=avg_time
-            )
-            
-            # Add live data for completed activities (some of them)
-            if status == 'completed' and random.random() > 0.6:
-                num_points = random.randint(3, 8)
-                for point_idx in range(num_points):
-                    timestamp = start_time + timedelta(minutes=duration_minutes * point_idx / num_points)
-                    live_point = LiveDataPoint(
-                        timestamp=timestamp,
-                        latitude=40.7128 + random.uniform(-0.05, 0.05),
-                        longitude=-74.0060 + random.uniform(-0.05, 0.05),
-                        speed=random.uniform(5.0, 25.0),
-                        heart_rate=random.randint(100, 170),
-                        calories=calories * point_idx / num_points
-                    )
-                    activity.live_data.append(live_point)
-            
-            # Add participants (some activities are group activities with friends)
-            if status == 'completed' and random.random() > 0.7 and len(user.friends) > 0:
-                num_participants = min(random.randint(1, 2), len(user.friends))
-                participants = random.sample(user.friends, num_participants)
-                for participant in participants:
-                    activity.participants.append(participant)
-            
-            activity.save()
-            created_activities.append(activity)
-            
-            participants_str = f" (with {len(activity.participants)} friends)" if activity.participants else ""
-            live_data_str = f" [{len(activity.live_data)} data points]" if activity.live_data else ""
-            print(f"   ✓ {user.username}: {activity_name} - {status}{participants_str}{live_data_str}")
-    
-    print(f"Created {len(created_activities)} activities!\n")
-    return created_activities
+        seen.add(key)
+        pairs.append((sender, receiver))
+    return pairs
+
+
+def user_documents(graph, inbox_sizes, password_hash, until, seed):
+    rng = random.Random(f"{seed}-users")
+    for index, friends in enumerate(graph):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {
+            '_id': user_id(index, until),
+            'auth0_id': f"auth0|seed{index:08d}",
+            'username': f"{first.lower()}_{rng.choice(NICKNAMES)}{index}",
+            'email': f"user{index}@example.com",
+            'full_name': f"{first} {last}",
+            'password': password_hash,
+            'age': rng.randint(16, 70),
+            'gender': rng.choice(['M', 'F', 'Other']),
+            'join_date': until - timedelta(days=rng.uniform(30, 1000)),
+            'friends': [user_id(friend, until) for friend in sorted(friends)],
+            'challenges': [],
+            'version': 0,
+            'notification_seq': inbox_sizes.get(index, 0),
+        }
+
+
+def request_documents(pairs, until, seed):
+    """Pending friend requests, and the notification each one left in its receiver's inbox"""
+    rng = random.Random(f"{seed}-request-times")
+    inbox_sizes = {}
+    requests, notifications = [], []
+    for index, (sender, receiver) in enumerate(pairs):
+        created_at = until - timedelta(days=rng.uniform(0, 30))
+        request_id = object_id(REQUEST_ID, index, created_at)
+        requests.append({
+            '_id': request_id,
+            'sender': user_id(sender, until),
+            'receiver': user_id(receiver, until),
+            'status': 'pending',
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+
+        inbox_sizes[receiver] = inbox_sizes.get(receiver, 0) + 1
+        notifications.append({
+            '_id': object_id(NOTIFICATION_ID, index, created_at),
+            'user': user_id(receiver, until),
+            'seq': inbox_sizes[receiver],
+            'type': 'friend_request',
+            'actor': user_id(sender, until),
+            'friend_request': request_id,
+            'created_at': created_at,
+        })
+    return requests, notifications, inbox_sizes
+
+
+def live_trace(rng, activity_type, start, seconds, interval):
+    """A GPS random walk with drifting heading and a heart rate settling on the type's target zone.
+
+    Returns the points and the distance covered, in km.
+    """
+    speed_kmh, target_hr, _, kcal_rate = PROFILES[activity_type]
+    lat, lon = rng.choice(CITIES)
+    lat += rng.uniform(-0.05, 0.05)
+    lon += rng.uniform(-0.05, 0.05)
+    heading = rng.uniform(0, 2 * math.pi)
+    heart_rate = rng.uniform(70, 95)
+    distance = 0.0
+
+    points = []
+    for elapsed in range(0, int(seconds) + 1, interval):
+        heart_rate += (target_hr - heart_rate) * 0.2 + rng.gauss(0, 2)
+        point = {
+            'timestamp': start + timedelta(seconds=elapsed),
+            'heart_rate': int(min(heart_rate, 200)),
+        }
+
+        if speed_kmh:
+            speed = max(rng.gauss(speed_kmh, speed_kmh * 0.15), 0.0)
+            if elapsed:
+                step = speed / 3.6 * interval
+                heading += rng.gauss(0, 0.3)
+                lat += step * math.cos(heading) / METERS_PER_DEGREE
+                lon += step * math.sin(heading) / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+                distance += step / 1000
+            point.update(latitude=round(lat, 6), longitude=round(lon, 6), speed=round(speed, 2))
+            point['calories'] = round(distance * kcal_rate, 1)
+        else:
+            point['calories'] = round(elapsed / 60 * kcal_rate, 1)
+
+        points.append(point)
+    return points, distance
+
+
+def activity_documents(chunk, options):
+    """Activities of one chunk; each chunk has its own random stream, so any worker count gives the same data"""
+    rng = random.Random(f"{options['seed']}-activities-{chunk}")
+    graph, until = options['graph'], options['until']
+    num_users = len(graph)
+    types, weights = list(ACTIVITY_WEIGHTS), list(ACTIVITY_WEIGHTS.values())
+    first = chunk * options['batch_size']
+    last = min(first + options['batch_size'], options['activities'])
+
+    for index in range(first, last):
+        owner = int(num_users * rng.random() ** ACTIVITY_SKEW)
+        activity_type = rng.choices(types, weights)[0]
+        speed_kmh, _, (shortest, longest), kcal_rate = PROFILES[activity_type]
+        duration = rng.uniform(shortest, longest) * 60
+
+        roll = rng.random()
+        if roll < 0.85:
+            status = 'completed'
+            start_time = until - timedelta(days=rng.uniform(0, options['history_days']))
+            elapsed = duration
+        elif roll < 0.9:
+            status = 'in_progress'
+            elapsed = rng.uniform(0, duration)
+            start_time = until - timedelta(seconds=elapsed)
+        else:
+            status = 'planned'
+            start_time = until + timedelta(days=rng.uniform(1, 7))
+            elapsed = 0
+
+        created_at = start_time if status != 'planned' else until - timedelta(days=rng.uniform(0, 3))
+        live_data, distance = [], 0.0
+        if elapsed and options['trace_interval']:
+            live_data, distance = live_trace(rng, activity_type, start_time, elapsed, options['trace_interval'])
+        elif elapsed and speed_kmh:
+            distance = speed_kmh * elapsed / 3600
+
+        participants = []
+        if status == 'completed' and graph[owner] and rng.random() < 0.15:
+            friends = sorted(graph[owner])
+            participants = [user_id(friend, until) for friend in rng.sample(friends, min(len(friends), rng.randint(1, 2)))]
+
+        minutes = elapsed / 60
+        document = {
+            '_id': object_id(ACTIVITY_ID, index, created_at),
+            'activity_name': rng.choice(ACTIVITY_NAMES[activity_type]),
+            'user_id': user_id(owner, until),
+            'calories': round(minutes * kcal_rate if not speed_kmh else distance * kcal_rate, 1),
+            'status': status,
+            'start_time': start_time,
+            'end_time': start_time + timedelta(seconds=duration) if status == 'completed' else None,
+            'distance': round(distance, 2),
+            'type': activity_type,
+            'avg_time': round(minutes / distance, 2) if distance else round(minutes, 2),
+            'live_data': live_data,
+            'participants': participants,
+            'public': rng.random() < PUBLIC_SHARE,
+            'created_at': created_at,
+            'updated_at': created_at + timedelta(seconds=elapsed),
+        }
+
+        # as the views store it: the start from the first point, bounding box and route once completed
+        geometry = track_geometry(live_data)
+        if geometry['start_point']:
+            document['start_point'] = geometry['start_point']
+        if geometry['bbox'] and status == 'completed':
+            document['bbox'] = geometry['bbox']
+            document['route'] = route_polyline(live_data)
+        yield document
+
+
+def insert_batches(collection, documents, batch_size):
+    inserted = 0
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == batch_size:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+            batch = []
+    if batch:
+        inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+    return inserted
+
+
+_worker = {}
+
+
+def init_worker(options):
+    # a MongoClient must not cross a fork, every worker opens its own
+    _worker['options'] = options
+    _worker['collection'] = MongoClient(settings.MONGO_DB_HOST)[settings.MONGO_DB_NAME][Activity._meta['collection']]
+
+
+def insert_activity_chunk(chunk):
+    options = _worker['options']
+    return insert_batches(_worker['collection'], activity_documents(chunk, options), options['batch_size'])
+
+
+def create_activities(db, options, workers):
+    chunks = range(math.ceil(options['activities'] / options['batch_size']))
+    if workers <= 1:
+        _worker['options'] = options
+        _worker['collection'] = db[Activity._meta['collection']]
+        results = map(insert_activity_chunk, chunks)
+        return report_progress(results, options['activities'])
+
+    with Pool(workers, initializer=init_worker, initargs=(options,)) as pool:
+        return report_progress(pool.imap_unordered(insert_activity_chunk, chunks), options['activities'])
+
+
+def report_progress(results, total):
+    inserted = 0
+    started = time.perf_counter()
+    next_report = time.perf_counter() + 5
+    for count in results:
+        inserted += count
+        if time.perf_counter() >= next_report:
+            rate = inserted / (time.perf_counter() - started)
+            print(f"   {inserted}/{total} activities ({rate:,.0f}/s)")
+            next_report += 5
+    return inserted
+
+
+def clear_database(db):
+    """Drop the collections, with their indexes, so the load runs without index maintenance"""
+    print("Clearing existing data...")
+    for document in (Activity, FriendRequest, Notification, FriendSuggestion, UserProfile, WeeklyRollup, UserStats, HeatmapTile):
+        db.drop_collection(document._meta['collection'])
+        print(f"   ✓ {document._meta['collection']} dropped")
+    print()
+
+
+def build_indexes():
+    print("Building indexes...")
+    for document in (UserProfile, FriendRequest, Notification, FriendSuggestion, Activity, WeeklyRollup, UserStats, HeatmapTile):
+        started = time.perf_counter()
+        document.ensure_indexes()
+        print(f"   ✓ {document._meta['collection']} ({time.perf_counter() - started:.1f}s)")
+    print()
 
 
 def main():
-    """Main execution function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--activities', type=int, help="default: 10 per user")
+    parser.add_argument('--edges-per-user', type=int, default=5, help="friendships each new user makes")
+    parser.add_argument('--pending-requests', type=int, help="default: one per 4 users")
+    parser.add_argument('--history-days', type=float, default=90)
+    parser.add_argument(
+        '--trace-interval', type=int, default=30, help="seconds between live_data points, 0 for no traces"
+    )
+    parser.add_argument('--password', default='password123', help="password of every generated user")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument(
+        '--until', type=date.fromisoformat, help="date the data ends at (default: today), fix it to reproduce a dataset"
+    )
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=1, help="processes generating activities")
+    args = parser.parse_args()
+
+    # naive UTC, like the models' datetime.utcnow defaults
+    until = datetime.combine(args.until or datetime.now(timezone.utc).date(), datetime.min.time())
+    activities = args.activities if args.activities is not None else args.users * 10
+    pending_requests = args.pending_requests if args.pending_requests is not None else args.users // 4
+
     print("\n" + "="*60)
     print("SYNCACTIVITY DATABASE POPULATION")
     print("="*60 + "\n")
-    
-    try:
-        # Drop indexes first to avoid conflicts
-        drop_indexes()
-        
-        # Clear existing data
-        clear_database()
-        
-        # Create new data
-        users = create_users()
-        friendships = create_friendships(users)
-        friend_requests = create_friend_requests(users)
-        activities = create_activities(users)
-        
-        # Print summary
-        print("\n" + "="*60)
-        print("📊 DATABASE SUMMARY")
-        print("="*60)
-        
-        print(f"\n👥 Users: {len(users)}")
-        for user in users:
-            print(f"   • {user.username} ({user.full_name}) - {len(user.friends)} friends")
-        
-        print(f"\n🤝 Friendships: {len(friendships)}")
-        
-        print(f"\n📬 Friend Requests: {len(friend_requests)} pending")
-        
-        print(f"\n🏃 Activities: {len(activities)}")
-        status_counts = {}
-        type_counts = {}
-        for activity in activities:
-            status_counts[activity.status] = status_counts.get(activity.status, 0) + 1
-            type_counts[activity.type] = type_counts.get(activity.type, 0) + 1
-        
-        print("   By Status:")
-        for status, count in status_counts.items():
-            print(f"      • {status}: {count}")
-        
-        print("   By Type:")
-        for activity_type, count in type_counts.items():
-            print(f"      • {activity_type}: {count}")
-        
-        print("\n" + "="*60)
-        print("✅ Database populated successfully!")
-        print("="*60)
-        
-        print("\n💡 Test Users:")
-        for user in users:
-            print(f"   • Username: {user.username}")
-        
-        print("\n📝 To get user IDs for testing:")
-        print("   curl http://localhost:8000/api/users/search/?q=john")
-        print("\n🔑 Use X-User-ID header for authenticated endpoints")
-        print("="*60 + "\n")
-        
-    except Exception as e:
-        print(f"\n❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
+
+    db = get_db()
+    clear_database(db)
+    started = time.perf_counter()
+
+    print(f"Building friendship graph ({args.users} users, m={args.edges_per_user})...")
+    graph = power_law_graph(args.users, args.edges_per_user, args.seed)
+    friendships = sum(len(friends) for friends in graph) // 2
+    print(f"   ✓ {friendships} friendships\n")
+
+    print("Creating friend requests and notifications...")
+    pairs = pending_request_pairs(args.users, graph, pending_requests, args.seed)
+    requests, notifications, inbox_sizes = request_documents(pairs, until, args.seed)
+    insert_batches(db[FriendRequest._meta['collection']], requests, args.batch_size)
+    insert_batches(db[Notification._meta['collection']], notifications, args.batch_size)
+    print(f"   ✓ {len(requests)} pending requests\n")
+
+    print("Creating users...")
+    # hashed once: the hasher is deliberately slow, and every user shares the password
+    password_hash = make_password(args.password)
+    users = insert_batches(
+        db[UserProfile._meta['collection']],
+        user_documents(graph, inbox_sizes, password_hash, until, args.seed),
+        args.batch_size
+    )
+    print(f"   ✓ {users} users\n")
+
+    print(f"Creating activities ({args.workers} workers)...")
+    created = create_activities(db, {
+        'graph': graph,
+        'until': until,
+        'seed': args.seed,
+        'activities': activities,
+        'batch_size': args.batch_size,
+        'history_days': args.history_days,
+        'trace_interval': args.trace_interval,
+    }, args.workers)
+    print(f"   ✓ {created} activities\n")
+
+    build_indexes()
+
+    print("Computing weekly rollups...")
+    print(f"   ✓ {rebuild_rollups()} rollups\n")
+
+    print("Computing user stats...")
+    checked, written = check_stats(args.batch_size, fix=True)
+    print(f"   ✓ {len(written)} of {checked} users have stats\n")
+
+    print("="*60)
+    print(f"✅ Database populated in {time.perf_counter() - started:.0f}s")
+    print("="*60)
+    print(f"\n🔑 Log in as user0@example.com ... user{args.users - 1}@example.com, password {args.password!r}")
+    print("💡 Run `python manage.py compute_friend_suggestions` to fill friend suggestions")
+    print("💡 Run `python manage.py rebuild_heatmaps` to rasterize the tracks into heatmap tiles")
+    print("="*60 + "\n")
 
 
 if __name__ == "__main__":